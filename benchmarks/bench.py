@@ -0,0 +1,398 @@
+"""
+Benchmarks for soxbindings, run on synthetic audio so they need no data.
+
+    python benchmarks/bench.py -o before.json
+    python benchmarks/bench.py -o after.json
+    python benchmarks/bench.py compare before.json after.json
+
+Groups (pick some with --only):
+    io       read and write throughput per format
+    effects  build_flow_effects latency per chain and clip length
+    cli      sox command line parsing overhead
+    memory   peak resident memory of single calls
+    threads  effects throughput against the number of threads
+    import   startup time of a fresh interpreter importing soxbindings
+
+Timings are the median (and min) of repeated calls, after a warm-up call.
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from multiprocessing.dummy import Pool as ThreadPool
+
+import numpy as np
+
+import soxbindings as sox
+from soxbindings import sox_cli
+
+SAMPLE_RATE = 44100
+CHANNELS = 2
+
+# format name: (file extension, write keyword arguments)
+FORMATS = {
+    'wav16': ('wav', {'precision': 16}),
+    'wav24': ('wav', {'precision': 24}),
+    'flac': ('flac', {}),
+    'ogg': ('ogg', {}),
+    'mp3': ('mp3', {}),
+}
+
+CHAINS = {
+    'rate': [('rate', ['-h', '16000'])],
+    'pitch': [('pitch', ['200'])],
+    'reverb': [('reverb', ['50'])],
+    'compand': [('compand', ['0.3,1', '6:-70,-60,-20', '-5', '-90', '0.2'])],
+    'rate+reverb+compand': [
+        ('rate', ['-h', '16000']),
+        ('reverb', ['50']),
+        ('compand', ['0.3,1', '6:-70,-60,-20', '-5', '-90', '0.2']),
+    ],
+}
+
+
+def synthetic_audio(seconds, sample_rate=SAMPLE_RATE, channels=CHANNELS,
+                    seed=0):
+    """Sines plus a little noise, so encoders and effects do real work."""
+    rng = np.random.RandomState(seed)
+    t = np.arange(int(seconds * sample_rate)) / sample_rate
+    audio = [
+        0.3 * np.sin(2 * np.pi * 220 * (c + 1) * t) +
+        0.05 * rng.randn(t.size)
+        for c in range(channels)
+    ]
+    return np.stack(audio, axis=1)
+
+
+def effects_chain(chain):
+    effects = []
+    for name, args in chain:
+        effect = sox.SoxEffect()
+        effect.effect_name = name
+        effect.effect_args = args
+        effects.append(effect)
+    return effects
+
+
+def timeit(fn, min_time, max_repeats=1000):
+    """Calls fn once to warm up, then until min_time has passed."""
+    fn()
+    times = []
+    total = 0.0
+    while (total < min_time or len(times) < 3) and len(times) < max_repeats:
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+        total += times[-1]
+    return {
+        'median_s': float(np.median(times)),
+        'min_s': float(np.min(times)),
+        'repeats': len(times),
+    }
+
+
+def bench_io(args, tmpdir):
+    results = {}
+    seconds = 5 if args.quick else 30
+    audio = synthetic_audio(seconds)
+    for name, (extension, kwargs) in FORMATS.items():
+        path = os.path.join(tmpdir, f'io_{name}.{extension}')
+        try:
+            write = timeit(
+                lambda: sox.write(path, audio, SAMPLE_RATE, **kwargs),
+                args.min_time)
+        except Exception as e:
+            # formats missing from the libsox build
+            results[f'io.{name}'] = {'error': str(e)}
+            continue
+        read = timeit(lambda: sox.read(path, dtype=np.float32), args.min_time)
+        for kind, timing in [('write', write), ('read', read)]:
+            timing['audio_seconds_per_s'] = seconds / timing['median_s']
+            timing['file_bytes'] = os.path.getsize(path)
+            results[f'io.{kind}.{name}'] = timing
+    return results
+
+
+def bench_effects(args, tmpdir):
+    results = {}
+    lengths = [0.5, 5] if args.quick else [0.5, 5, 30]
+    for seconds in lengths:
+        audio = synthetic_audio(seconds)
+        for name, chain in CHAINS.items():
+            effects = effects_chain(chain)
+            with sox.sox_context():
+                timing = timeit(
+                    lambda: sox.build_flow_effects(
+                        audio, SAMPLE_RATE, effects, in_precision=32),
+                    args.min_time)
+            timing['audio_seconds_per_s'] = seconds / timing['median_s']
+            results[f'effects.{name}.{seconds:g}s'] = timing
+
+        # float32 (channels, frames), the way model pipelines hand it over
+        planar = np.ascontiguousarray(audio.T, dtype=np.float32)
+        effects = effects_chain(CHAINS['rate'])
+        with sox.sox_context():
+            timing = timeit(
+                lambda: sox.build_flow_effects(
+                    planar, SAMPLE_RATE, effects, in_precision=32,
+                    layout='channels_first'),
+                args.min_time)
+        timing['audio_seconds_per_s'] = seconds / timing['median_s']
+        results[f'effects.rate_channels_first.{seconds:g}s'] = timing
+    return results
+
+
+def bench_cli(args, tmpdir):
+    command = ['-', '-r', '16000', '-', 'vol', '0.5', 'reverb', '50',
+               'compand', '0.3,1', '6:-70,-60,-20', '-5', '-90', '0.2']
+    audio = synthetic_audio(0.01)
+    results = {}
+
+    def parse():
+        input_flags, output_flags, _, _, fx_groups = sox_cli._parse_args(
+            command)
+        rate, _, precision = sox_cli._input_format(input_flags, SAMPLE_RATE)
+        sox_cli._effects_chain(
+            output_flags, fx_groups, rate, CHANNELS, precision)
+
+    with sox.sox_context():
+        results['cli.parse'] = timeit(parse, args.min_time)
+        results['cli.sox_tiny_clip'] = timeit(
+            lambda: sox.sox(command, audio, SAMPLE_RATE), args.min_time)
+        chain = sox.EffectsChain.compile(command)
+        results['cli.compiled_chain_tiny_clip'] = timeit(
+            lambda: chain.apply(audio, SAMPLE_RATE), args.min_time)
+    return results
+
+
+def _status_bytes(field):
+    with open('/proc/self/status') as f:
+        for line in f:
+            if line.startswith(field + ':'):
+                return int(line.split()[1]) * 1024
+    raise KeyError(field)
+
+
+def _measure_peak(fn, queue):
+    # reset the peak resident size to the current one
+    with open('/proc/self/clear_refs', 'w') as f:
+        f.write('5')
+    before = _status_bytes('VmRSS')
+    fn()
+    queue.put(_status_bytes('VmHWM') - before)
+
+
+def peak_memory(fn, runs=3):
+    """Peak resident memory fn adds, measured in forked processes so native
+    allocations count too and earlier calls don't hide it. The median of a
+    few runs."""
+    context = multiprocessing.get_context('fork')
+    peaks = []
+    for _ in range(runs):
+        queue = context.Queue()
+        process = context.Process(target=_measure_peak, args=(fn, queue))
+        process.start()
+        peaks.append(queue.get())
+        process.join()
+    return int(np.median(peaks))
+
+
+def bench_memory(args, tmpdir):
+    if not os.path.exists('/proc/self/clear_refs'):
+        return {'memory': {'error': 'needs Linux /proc/self/clear_refs'}}
+    seconds = 10 if args.quick else 60
+    audio = synthetic_audio(seconds)
+    wav_path = os.path.join(tmpdir, 'memory.wav')
+    out_path = os.path.join(tmpdir, 'memory_out.wav')
+    sox.write(wav_path, audio, SAMPLE_RATE)
+    reverb = effects_chain(CHAINS['reverb'])
+    tfm = sox.Transformer()
+    tfm.reverb(50)
+    calls = {
+        'read.float32': lambda: sox.read(wav_path, dtype=np.float32),
+        'read.float64': lambda: sox.read(wav_path),
+        'write': lambda: sox.write(out_path, audio, SAMPLE_RATE),
+        'effects.reverb': lambda: sox.build_flow_effects(
+            audio, SAMPLE_RATE, reverb, in_precision=32),
+        'transformer.build_file.reverb': lambda: tfm.build_file(
+            wav_path, out_path),
+    }
+    results = {}
+    for name, fn in calls.items():
+        peak = peak_memory(fn)
+        results[f'memory.{name}'] = {
+            'peak_bytes': peak,
+            'peak_bytes_per_audio_second': peak / seconds,
+        }
+    return results
+
+
+def bench_threads(args, tmpdir):
+    max_threads = os.cpu_count() or 1
+    counts = sorted({1, 2, 4, 8, max_threads} & set(range(1, max_threads + 1)))
+    clips = [synthetic_audio(2, seed=i) for i in range(max(counts) * 2)]
+    effects = effects_chain(CHAINS['rate+reverb+compand'])
+    total_seconds = 2 * len(clips)
+
+    def process(clip):
+        return sox.build_flow_effects(
+            clip, SAMPLE_RATE, effects, in_precision=32)
+
+    results = {}
+    with sox.sox_context():
+        base = None
+        for count in counts:
+            with ThreadPool(count) as pool:
+                timing = timeit(
+                    lambda: pool.map(process, clips), args.min_time,
+                    max_repeats=20)
+            timing['audio_seconds_per_s'] = total_seconds / timing['median_s']
+            base = base or timing['median_s']
+            timing['speedup'] = base / timing['median_s']
+            results[f'threads.pool.{count}'] = timing
+
+            timing = timeit(
+                lambda: sox.build_flow_effects_batch(
+                    clips, SAMPLE_RATE, effects, in_precision=32,
+                    num_threads=count),
+                args.min_time, max_repeats=20)
+            timing['audio_seconds_per_s'] = total_seconds / timing['median_s']
+            results[f'threads.batch.{count}'] = timing
+    return results
+
+
+def _interpreter_time(code, runs):
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.check_call(
+            [sys.executable, '-c', code], stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL)
+        times.append(time.perf_counter() - start)
+    return {
+        'median_s': float(np.median(times)),
+        'min_s': float(np.min(times)),
+        'repeats': runs,
+    }
+
+
+def bench_import(args, tmpdir):
+    runs = 5 if args.quick else 20
+    wav_path = os.path.join(tmpdir, 'import.wav')
+    sox.write(wav_path, synthetic_audio(0.1), SAMPLE_RATE)
+    snippets = {
+        # the floor everything else pays too
+        'python_numpy': 'import numpy',
+        'soxbindings': 'import soxbindings',
+        'soxbindings_read': (
+            f'import soxbindings; soxbindings.read({wav_path!r})'),
+        'soxbindings_transformer': (
+            'import soxbindings; soxbindings.Transformer'),
+    }
+    return {
+        f'import.{name}': _interpreter_time(code, runs)
+        for name, code in snippets.items()
+    }
+
+
+GROUPS = {
+    'io': bench_io,
+    'effects': bench_effects,
+    'cli': bench_cli,
+    'memory': bench_memory,
+    'threads': bench_threads,
+    'import': bench_import,
+}
+
+
+def metadata():
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    try:
+        commit = subprocess.check_output(
+            ['git', 'rev-parse', 'HEAD'], cwd=root,
+            stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        'commit': commit,
+        'time': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'platform': platform.platform(),
+        'machine': platform.machine(),
+        'cpu_count': os.cpu_count(),
+    }
+
+
+def run(args):
+    groups = args.only.split(',') if args.only else list(GROUPS)
+    unknown = set(groups) - set(GROUPS)
+    if unknown:
+        raise SystemExit(f"unknown groups: {', '.join(sorted(unknown))}")
+    results = {}
+    with tempfile.TemporaryDirectory() as tmpdir:
+        for group in groups:
+            print(f'running {group}...', file=sys.stderr)
+            results.update(GROUPS[group](args, tmpdir))
+    report = {'meta': metadata(), 'results': results}
+    text = json.dumps(report, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text + '\n')
+    else:
+        print(text)
+
+
+def compare(args):
+    with open(args.base) as f:
+        base = json.load(f)['results']
+    with open(args.new) as f:
+        new = json.load(f)['results']
+    print(f"{'benchmark':48} {'base':>12} {'new':>12} {'change':>8}")
+    for name in sorted(set(base) & set(new)):
+        for key in ('median_s', 'peak_bytes'):
+            if key in base[name] and key in new[name]:
+                old_value, new_value = base[name][key], new[name][key]
+                change = (new_value / old_value - 1) * 100 if old_value else 0
+                flag = ''
+                if abs(change) >= args.threshold:
+                    flag = ' slower' if change > 0 else ' faster'
+                    if key == 'peak_bytes':
+                        flag = ' more' if change > 0 else ' less'
+                print(f'{name:48} {old_value:12.4g} {new_value:12.4g} '
+                      f'{change:+7.1f}%{flag}')
+    for name in sorted(set(base) ^ set(new)):
+        print(f"{name:48} only in {'base' if name in base else 'new'}")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawTextHelpFormatter)
+    subparsers = parser.add_subparsers(dest='command')
+    parser.add_argument('-o', '--output', help='JSON file for the results')
+    parser.add_argument('--only', help='comma separated groups to run')
+    parser.add_argument('--quick', action='store_true',
+                        help='shorter clips, for a fast check')
+    parser.add_argument('--min-time', type=float, default=0.5,
+                        help='seconds to spend timing each call')
+    compare_parser = subparsers.add_parser(
+        'compare', help='compare two JSON results')
+    compare_parser.add_argument('base')
+    compare_parser.add_argument('new')
+    compare_parser.add_argument('--threshold', type=float, default=5,
+                                help='percent change to flag')
+    args = parser.parse_args()
+    if args.command == 'compare':
+        compare(args)
+    else:
+        run(args)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,7 +1,14 @@
+import sys as _sys
+
 from .audio import (
     read, 
     write, 
-    get_info
+    get_info,
+    stream,
+    SoxWriter,
+    read_bytes,
+    write_bytes,
+    get_info_bytes
 )
 from .effects import (
     get_available_effects, 
@@ -9,8 +16,45 @@ from .effects import (
     quit_sox,
     SoxEffect,
     build_flow_effects,
-    sox_context
+    build_flow_effects_batch,
+    build_flow_effects_sweep,
+    combine,
+    sox_context,
+    open_session,
+    close_session,
+    StreamingEffects,
+    enable_profiling,
+    get_profile
 )
 
-from .sox_cli import sox
-from .transform import Transformer
\ No newline at end of file
+# loaded on first use: Transformer imports pysox, which looks for a sox
+# binary, and short-lived workers often only need read and write
+_LAZY = {
+    'sox': ('.sox_cli', 'sox'),
+    'Transformer': ('.transform', 'Transformer'),
+    'EffectsChain': ('.chain', 'EffectsChain'),
+    'sweep': ('.chain', 'sweep'),
+    'process_files': ('.batch', 'process_files'),
+    'get_info_many': ('.info', 'get_info_many'),
+    'InfoCache': ('.info', 'InfoCache'),
+    'get_seek_index': ('.seek_index', 'get_seek_index'),
+    'TransformCache': ('.cache', 'TransformCache'),
+}
+
+def __getattr__(name):
+    if name not in _LAZY:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    import importlib
+    module, attr = _LAZY[name]
+    value = getattr(importlib.import_module(module, __name__), attr)
+    globals()[name] = value
+    return value
+
+def __dir__():
+    return sorted(set(globals()) | set(_LAZY))
+
+if _sys.version_info < (3, 7):
+    # module __getattr__ needs Python 3.7, import everything up front
+    for _name in _LAZY:
+        __getattr__(_name)
+    del _name
@@ -0,0 +1,213 @@
+"""
+asyncio versions of read, write, get_info and build_flow_effects.
+
+The calls run on a bounded pool of threads. The native code releases the
+GIL while it decodes, encodes or runs effects, so the event loop keeps
+serving other tasks and several calls run in parallel. An optional limit
+on the bytes of audio held by in-flight calls makes callers wait for
+earlier calls to finish instead of piling work up in memory.
+"""
+
+import asyncio
+import collections
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+
+from . import audio
+from . import effects
+
+
+class _ByteBudget:
+    # FIFO limit on the bytes held by in-flight calls, shared by every event
+    # loop using the executor. A call larger than the limit runs alone.
+    def __init__(self, limit):
+        self.limit = limit
+        self.inflight = 0
+        self._waiters = collections.deque()
+        self._lock = threading.Lock()
+
+    def _fits(self, nbytes):
+        return self.inflight == 0 or self.inflight + nbytes <= self.limit
+
+    async def acquire(self, nbytes):
+        if self.limit is None:
+            return
+        with self._lock:
+            if not self._waiters and self._fits(nbytes):
+                self.inflight += nbytes
+                return
+            # get_event_loop returns the running loop inside a coroutine,
+            # get_running_loop needs Python 3.7
+            loop = asyncio.get_event_loop()
+            future = loop.create_future()
+            waiter = (nbytes, future, loop)
+            self._waiters.append(waiter)
+        try:
+            await future
+        except asyncio.CancelledError:
+            with self._lock:
+                if waiter in self._waiters:
+                    self._waiters.remove(waiter)
+                    granted = False
+                else:
+                    granted = future.done() and not future.cancelled()
+            if granted:
+                self.release(nbytes)
+            raise
+
+    def release(self, nbytes):
+        # called from the worker threads
+        if self.limit is None:
+            return
+        with self._lock:
+            self.inflight -= nbytes
+            while self._waiters and self._fits(self._waiters[0][0]):
+                waiter_bytes, future, loop = self._waiters.popleft()
+                self.inflight += waiter_bytes
+                try:
+                    loop.call_soon_threadsafe(
+                        self._grant, waiter_bytes, future)
+                except RuntimeError:
+                    # the waiter's loop is closed
+                    self.inflight -= waiter_bytes
+
+    def _grant(self, nbytes, future):
+        if future.cancelled():
+            self.release(nbytes)
+        else:
+            future.set_result(None)
+
+
+class SoxExecutor:
+    """
+    Runs soxbindings calls on a pool of threads for asyncio code.
+
+    Cancelling a call that hasn't started yet removes it from the queue. A
+    call that is already running finishes in the background, and its bytes
+    count against the limit until it does.
+
+    Args:
+        max_workers (int): Number of threads, defaults to the number of
+            cores.
+        max_inflight_bytes (int): Limit on the bytes of audio held by the
+            calls that are queued or running, i.e. the decoded size for
+            read and the input array for write and build_flow_effects.
+            Further calls wait until enough of them finish. None for no
+            limit.
+    """
+    def __init__(self, max_workers=None, max_inflight_bytes=None):
+        if max_workers is None:
+            max_workers = os.cpu_count() or 1
+        self._executor = ThreadPoolExecutor(
+            max_workers, thread_name_prefix='soxbindings')
+        self._budget = _ByteBudget(max_inflight_bytes)
+        effects._warm_up()
+
+    @property
+    def inflight_bytes(self):
+        return self._budget.inflight
+
+    async def _run(self, nbytes, fn, *args, **kwargs):
+        await self._budget.acquire(nbytes)
+        try:
+            future = self._executor.submit(fn, *args, **kwargs)
+        except BaseException:
+            self._budget.release(nbytes)
+            raise
+        future.add_done_callback(lambda _: self._budget.release(nbytes))
+        return await asyncio.wrap_future(future)
+
+    async def get_info(self, audio_path):
+        """Same as soxbindings.get_info."""
+        return await self._run(0, audio.get_info, audio_path)
+
+    async def read(self, audio_path, nframes=0, offset=0, dtype=None,
+                   **kwargs):
+        """Same as soxbindings.read."""
+        nbytes = 0
+        if self._budget.limit is not None:
+            signal, _ = await self.get_info(audio_path)
+            length = signal.length
+            if length:
+                length = max(length - offset * signal.channels, 0)
+            else:
+                # unknown length, e.g. some MP3s
+                length = os.path.getsize(audio_path)
+            if nframes > 0:
+                length = min(length, nframes * signal.channels)
+            nbytes = length * np.dtype(dtype).itemsize
+        return await self._run(
+            nbytes, audio.read, audio_path, nframes=nframes, offset=offset,
+            dtype=dtype, **kwargs)
+
+    async def write(self, audio_path, audio_data, sample_rate, **kwargs):
+        """Same as soxbindings.write."""
+        return await self._run(
+            audio_data.nbytes, audio.write, audio_path, audio_data,
+            sample_rate, **kwargs)
+
+    async def build_flow_effects(self, input_data, sample_rate_in,
+                                 sox_effects_chain, **kwargs):
+        """Same as soxbindings.build_flow_effects."""
+        return await self._run(
+            input_data.nbytes, effects.build_flow_effects, input_data,
+            sample_rate_in, sox_effects_chain, **kwargs)
+
+    def close(self, wait=True):
+        self._executor.shutdown(wait=wait)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        # don't block the loop while the running calls finish
+        await asyncio.get_event_loop().run_in_executor(None, self.close)
+
+
+_default_executor = None
+_default_lock = threading.Lock()
+
+
+def get_executor():
+    """Returns the executor used by the module level functions, creating one
+    with the default settings on first use."""
+    global _default_executor
+    with _default_lock:
+        if _default_executor is None:
+            _default_executor = SoxExecutor()
+        return _default_executor
+
+
+def set_executor(executor):
+    """Replaces the executor used by the module level functions, e.g. with
+    one that limits the bytes in flight. The previous one is not closed."""
+    global _default_executor
+    with _default_lock:
+        previous, _default_executor = _default_executor, executor
+    return previous
+
+
+async def get_info(audio_path):
+    """soxbindings.get_info on the default executor."""
+    return await get_executor().get_info(audio_path)
+
+
+async def read(audio_path, nframes=0, offset=0, dtype=None, **kwargs):
+    """soxbindings.read on the default executor."""
+    return await get_executor().read(
+        audio_path, nframes=nframes, offset=offset, dtype=dtype, **kwargs)
+
+
+async def write(audio_path, audio_data, sample_rate, **kwargs):
+    """soxbindings.write on the default executor."""
+    return await get_executor().write(
+        audio_path, audio_data, sample_rate, **kwargs)
+
+
+async def build_flow_effects(input_data, sample_rate_in, sox_effects_chain,
+                             **kwargs):
+    """soxbindings.build_flow_effects on the default executor."""
+    return await get_executor().build_flow_effects(
+        input_data, sample_rate_in, sox_effects_chain, **kwargs)
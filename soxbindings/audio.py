@@ -1,43 +1,306 @@
+import os
+import sys
 import numpy as np
 
+from .effects import _using_sox
+
+def _pcm_dtype(encoding):
+    # dtype of the samples as they are stored, None unless they can be used
+    # as they are
+    from . import _soxbindings
+    if (encoding.reverse_nibbles == _soxbindings.sox_option_yes or
+            encoding.reverse_bits == _soxbindings.sox_option_yes):
+        return None
+    kinds = {
+        _soxbindings.SOX_ENCODING_SIGN2: 'i',
+        _soxbindings.SOX_ENCODING_UNSIGNED: 'u',
+        _soxbindings.SOX_ENCODING_FLOAT: 'f',
+    }
+    kind = kinds.get(encoding.encoding)
+    bits = encoding.bits_per_sample
+    if kind is None or bits not in (8, 16, 32, 64) or (kind == 'f' and bits < 32):
+        return None
+    dtype = np.dtype('%s%d' % (kind, bits // 8))
+    if encoding.reverse_bytes == _soxbindings.sox_option_yes:
+        dtype = dtype.newbyteorder()
+    return dtype
+
+def _memmap(audio_path, nframes, offset, signal_info, encoding_info, 
+            file_type, requested_dtype):
+    from . import _soxbindings
+    with _using_sox():
+        reader = _soxbindings.SoxReader(
+            audio_path, signal_info, encoding_info, file_type)
+        try:
+            signal = reader.signal
+            dtype = _pcm_dtype(reader.encoding)
+            data_start = reader.data_start
+            seekable = reader.seekable
+        finally:
+            reader.close()
+    if dtype is None or not seekable:
+        raise ValueError(
+            f"{audio_path} is not an uncompressed PCM file, read it with "
+            "mmap=False")
+    # the samples are mapped as they are stored, so no other dtype can be
+    # honoured
+    if (requested_dtype is not None and
+            np.dtype(requested_dtype) != dtype.newbyteorder('=')):
+        raise ValueError(
+            f"{audio_path} stores {dtype} samples, mmap=True can't return "
+            f"{np.dtype(requested_dtype)}")
+
+    channels = signal.channels
+    available = (os.path.getsize(audio_path) - data_start) // dtype.itemsize
+    length = min(signal.length, available) if signal.length else available
+    data = np.memmap(audio_path, dtype, mode='r', offset=data_start,
+                     shape=(length // channels, channels))
+    if offset > data.shape[0]:
+        raise RuntimeError("Offset past EOF")
+    stop = offset + nframes if nframes > 0 else None
+    return data[offset:stop], int(signal.rate)
+
+def _is_mp3(audio_path, file_type):
+    if file_type is not None:
+        return file_type.lower() == 'mp3'
+    return os.fspath(audio_path).lower().endswith('.mp3')
+
 def read(audio_path, nframes=0, offset=0, signal_info=None, 
-         encoding_info=None, file_type=None):
+         encoding_info=None, file_type=None, dtype=None, mmap=False,
+         seek_index=None):
+    """
+    Reads an audio file into an array of shape (frames, channels), of
+    float64 unless dtype says otherwise.
+
+    With mmap=True an uncompressed PCM file (e.g. wav, aiff, au or raw 
+    with 8, 16, 32 or 64 bit samples) is memory-mapped instead of decoded,
+    so slicing it only touches the pages that are used. The samples then
+    keep the dtype they are stored with, e.g. int16, so dtype has to be
+    left out or be that dtype, otherwise a ValueError is raised. A 
+    ValueError is also raised for other files.
+
+    seek_index='memory' or 'sidecar' reads MP3 files through a seek index
+    (see soxbindings.seek_index), built on first use and kept in memory, 
+    or also saved next to the file. Only the frames around the requested 
+    window are decoded. It is ignored for other formats, which libsox 
+    seeks in exactly, and on macOS, where the window can't be decoded 
+    from memory.
+    """
+    if mmap:
+        return _memmap(audio_path, nframes, offset, signal_info, 
+                       encoding_info, file_type, dtype)
+    if dtype is None:
+        dtype = np.float64
+    if (seek_index is not None and sys.platform != 'darwin' and
+            _is_mp3(audio_path, file_type)):
+        from .seek_index import get_seek_index
+        if seek_index not in ('memory', 'sidecar'):
+            raise ValueError("seek_index must be None, 'memory' or 'sidecar'")
+        index = get_seek_index(audio_path, sidecar=seek_index == 'sidecar')
+        return index.read(audio_path, nframes, offset, dtype)
     from . import _soxbindings
-    sample_rate, num_channels, data = _soxbindings.read_audio_file(
-        audio_path, nframes, offset, signal_info, 
-        encoding_info, file_type)
+    with _using_sox():
+        sample_rate, num_channels, data = _soxbindings.read_audio_file(
+            audio_path, nframes, offset, signal_info, 
+            encoding_info, file_type, np.dtype(dtype))
     data = data.reshape(-1, num_channels)
-    data = data / (1 << 31)
     return data, sample_rate
 
+def read_bytes(buffer, nframes=0, offset=0, signal_info=None, 
+               encoding_info=None, file_type=None, dtype=np.float64):
+    """
+    Same as read, for an encoded file held in memory, e.g. downloaded from
+    object storage. buffer can be bytes or any other object supporting the
+    buffer protocol, it is decoded in place without being copied. 
+    file_type (e.g. 'mp3') is needed for formats without a header that 
+    identifies them. Not available on macOS, where it raises a 
+    RuntimeError.
+    """
+    from . import _soxbindings
+    with _using_sox():
+        sample_rate, num_channels, data = _soxbindings.read_audio_bytes(
+            buffer, nframes, offset, signal_info, 
+            encoding_info, file_type, np.dtype(dtype))
+    data = data.reshape(-1, num_channels)
+    return data, sample_rate
+
+def stream(audio_path, block_frames, offset=0, nframes=0, signal_info=None,
+           encoding_info=None, file_type=None, dtype=np.float64, out=None):
+    """
+    Reads an audio file block by block, keeping a single decoding session
+    open, so memory stays bounded no matter how long the file is.
+
+    Args:
+        audio_path (str): Path to the audio file.
+        block_frames (int): Number of frames in each block. Every block
+            except the last one is full.
+        offset (int): Frame to start reading at.
+        nframes (int): Maximum number of frames to read, 0 reads to the
+            end of the file.
+        dtype (np.dtype): dtype of the blocks, one of float64, float32,
+            int32 or int16.
+        out (np.ndarray): Optional C-contiguous (block_frames, channels) 
+            array that is filled and yielded (as a view) for every block 
+            instead of allocating a new one. Its dtype overrides `dtype`.
+
+    Yields:
+        np.ndarray: Blocks of shape (frames, channels).
+    """
+    from . import _soxbindings
+    # libsox stays referenced for as long as the generator is alive
+    with _using_sox():
+        reader = _soxbindings.SoxReader(
+            audio_path, signal_info, encoding_info, file_type)
+        try:
+            channels = reader.channels
+            if out is not None and out.shape != (block_frames, channels):
+                raise ValueError(
+                    f"out must have shape {(block_frames, channels)}, "
+                    f"got {out.shape}")
+            if offset > 0:
+                reader.seek(offset)
+
+            remaining = nframes
+            dtype = np.dtype(dtype)
+            while nframes <= 0 or remaining > 0:
+                n = (block_frames if nframes <= 0
+                     else min(block_frames, remaining))
+                if out is None:
+                    block = reader.read(n, dtype).reshape(-1, channels)
+                else:
+                    block = out[:reader.read_into(out[:n])]
+                if block.shape[0] == 0:
+                    break
+                remaining -= block.shape[0]
+                yield block
+                if block.shape[0] < n:
+                    break
+        finally:
+            reader.close()
+
+def _encoding_info(precision):
+    from . import _soxbindings
+    encoding_info = _soxbindings.sox_encodinginfo_t()
+    encoding_info.encoding = _soxbindings.SOX_ENCODING_SIGN2
+    encoding_info.bits_per_sample = precision
+    encoding_info.compression = 0.0
+    encoding_info.reverse_bytes = _soxbindings.sox_option_default
+    encoding_info.reverse_nibbles = _soxbindings.sox_option_default
+    encoding_info.reverse_bits = _soxbindings.sox_option_default
+    encoding_info.opposite_endian = _soxbindings.sox_false
+    return encoding_info
+
+class SoxWriter:
+    """
+    Keeps an audio file open for writing so it can be encoded chunk by
+    chunk, with memory bounded by the chunk size. Chunks of float64, 
+    float32, int32 or int16 are converted to sox samples natively, without
+    an intermediate copy of the whole chunk.
+
+    Args:
+        audio_path (str): Path of the file to write, its type is taken 
+            from the extension unless file_type is given.
+        sample_rate (float): Sample rate of the audio.
+        channels (int): Number of channels.
+        precision (int): Bits per sample in the file, defaults to 16.
+        encoding_info (sox_encodinginfo_t): Encoding of the file, defaults
+            to signed integers of `precision` bits.
+        file_type (str): Type of the file, e.g. 'wav' or 'flac'.
+        length (int): Number of frames that will be written, if known up
+            front. Only needed for outputs whose header can't be updated 
+            when the file is closed.
+    """
+    def __init__(self, audio_path, sample_rate, channels, precision=16,
+                 encoding_info=None, file_type=None, length=0):
+        from . import _soxbindings
+        si = _soxbindings.sox_signalinfo_t()
+        si.rate = float(sample_rate)
+        si.channels = channels
+        si.length = length * channels
+        si.precision = precision
+        if encoding_info is None:
+            encoding_info = _encoding_info(precision)
+        self.channels = channels
+        # the writer holds a reference to libsox until it is closed
+        self._writer = None
+        self._sox = _using_sox()
+        self._sox.__enter__()
+        try:
+            self._writer = _soxbindings.SoxWriter(
+                audio_path, si, encoding_info, file_type)
+        except Exception:
+            self.close()
+            raise
+
+    @property
+    def frames_written(self):
+        return self._writer.frames_written
+
+    def write(self, chunk):
+        """
+        Writes a chunk of shape (frames, channels), or (frames,) for mono.
+        Floats are expected in [-1, 1) and clipped, int16 and int32 use 
+        their full range.
+        """
+        if chunk.ndim > 1 and chunk.shape[-1] != self.channels:
+            raise ValueError(
+                f"chunk has {chunk.shape[-1]} channels, the file has "
+                f"{self.channels}")
+        if chunk.dtype not in (np.float64, np.float32, np.int32, np.int16):
+            chunk = chunk.astype(np.float64)
+        return self._writer.write(np.ascontiguousarray(chunk).reshape(-1))
+
+    def close(self):
+        try:
+            if self._writer is not None:
+                self._writer.close()
+        finally:
+            if self._sox is not None:
+                self._sox.__exit__(None, None, None)
+                self._sox = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
 def write(audio_path, data, sample_rate, 
           precision=16, encoding_info=None):
+    channels = 1 if len(data.shape) == 1 else data.shape[-1]
+    with SoxWriter(audio_path, sample_rate, channels, precision, 
+                   encoding_info, length=data.size // channels) as writer:
+        writer.write(data)
+
+def write_bytes(data, sample_rate, file_type, precision=16, 
+                encoding_info=None):
+    """
+    Same as write, but returns the encoded file as bytes instead of 
+    writing it to disk. file_type (e.g. 'wav', 'flac') picks the format.
+    Not available on macOS, where it raises a RuntimeError.
+    """
     from . import _soxbindings
     si = _soxbindings.sox_signalinfo_t()
-
     si.rate = float(sample_rate)
     si.channels = 1 if len(data.shape) == 1 else data.shape[-1]
     si.length = data.size
     si.precision = precision
-    file_type = None
-
     if encoding_info is None:
-        encoding_info = _soxbindings.sox_encodinginfo_t()
-        encoding_info.encoding = _soxbindings.SOX_ENCODING_SIGN2
-        encoding_info.bits_per_sample = precision
-        encoding_info.compression = 0.0
-        encoding_info.reverse_bytes = _soxbindings.sox_option_default
-        encoding_info.reverse_nibbles = _soxbindings.sox_option_default
-        encoding_info.reverse_bits = _soxbindings.sox_option_default
-        encoding_info.opposite_endian = _soxbindings.sox_false
-
-    data = data * (1 << 31)
-    data = data.astype(np.int32)
-
-    _soxbindings.write_audio_file(
-        audio_path, data, si, encoding_info, file_type
-    )
+        encoding_info = _encoding_info(precision)
+
+    if data.dtype not in (np.float64, np.float32, np.int32, np.int16):
+        data = data.astype(np.float64)
+    data = np.ascontiguousarray(data)
+    with _using_sox():
+        return _soxbindings.write_audio_bytes(
+            data, si, encoding_info, file_type)
 
 def get_info(audio_path):
     from . import _soxbindings
-    return _soxbindings.get_info(audio_path)
\ No newline at end of file
+    with _using_sox():
+        return _soxbindings.get_info(audio_path)
+
+def get_info_bytes(buffer, file_type=None):
+    from . import _soxbindings
+    with _using_sox():
+        return _soxbindings.get_info_bytes(buffer, file_type)
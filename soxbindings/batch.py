@@ -0,0 +1,225 @@
+"""
+Runs a sox command over many files on a pool of processes.
+"""
+
+import multiprocessing
+import os
+import secrets
+import time
+import numpy as np
+
+from . import effects
+from .chain import _is_transformer
+from .sox_cli import _sox, PIPE_CHAR
+
+try:
+    from multiprocessing import shared_memory, resource_tracker
+except ImportError:  # Python < 3.8
+    shared_memory = None
+
+
+class BatchCounters:
+    r"""Progress of a ``process_files`` run.
+
+    Attributes:
+        total (int): Number of files in the batch.
+        done (int): Number of files processed, including failures.
+        failed (int): Number of files that raised an error.
+        frames (int): Output frames produced so far.
+        audio_seconds (float): Seconds of output audio produced so far.
+        elapsed (float): Wall clock seconds since the batch started.
+    """
+    def __init__(self, total):
+        self.total = total
+        self.done = 0
+        self.failed = 0
+        self.frames = 0
+        self.audio_seconds = 0.0
+        self.elapsed = 0.0
+        self._start = time.perf_counter()
+
+    def _update(self, frames, sample_rate, failed):
+        self.done += 1
+        self.failed += int(failed)
+        self.frames += frames
+        if sample_rate:
+            self.audio_seconds += frames / sample_rate
+        self.elapsed = time.perf_counter() - self._start
+
+    @property
+    def files_per_second(self):
+        return self.done / self.elapsed if self.elapsed else 0.0
+
+    @property
+    def realtime_factor(self):
+        """Seconds of audio produced per second of wall clock time."""
+        return self.audio_seconds / self.elapsed if self.elapsed else 0.0
+
+    def __repr__(self):
+        return (
+            "BatchCounters(done=%d/%d, failed=%d, %.1f files/s, %.1fx realtime)"
+            % (self.done, self.total, self.failed, self.files_per_second,
+               self.realtime_factor)
+        )
+
+
+class BatchResult:
+    r"""Outcome of a ``process_files`` run.
+
+    Attributes:
+        outputs (list): One entry per pair, the output array for pairs
+            without an output path, else None. None as well for failures.
+        sample_rates (list): Output sample rate per pair, None for failures.
+        errors (dict): Maps the index of each failed pair to its error.
+        counters (BatchCounters): Final progress and throughput counters.
+    """
+    def __init__(self, total):
+        self.outputs = [None] * total
+        self.sample_rates = [None] * total
+        self.errors = {}
+        self.counters = BatchCounters(total)
+
+
+def _command_template(transformer_or_args):
+    # the arguments that go before the input file, between the files and
+    # after the output file
+    if _is_transformer(transformer_or_args):
+        tfm = transformer_or_args
+        before_input = list(tfm.globals)
+        before_input.extend(tfm._input_format_args(tfm.input_format))
+        before_output = tfm._output_format_args(tfm.output_format)
+        return before_input, before_output, list(tfm.effects)
+    if isinstance(transformer_or_args, str):
+        transformer_or_args = transformer_or_args.split()
+    return [], [], list(transformer_or_args)
+
+
+def _init_worker():
+    # a forked worker inherits the parent's libsox state, a spawned one
+    # starts fresh; either way initialize once per worker instead of once
+    # per file
+    effects.open_session()
+
+
+def _to_shared_memory(array, name):
+    shm = shared_memory.SharedMemory(
+        name=name, create=True, size=max(array.nbytes, 1))
+    np.ndarray(array.shape, array.dtype, buffer=shm.buf)[...] = array
+    name = shm.name
+    shm.close()
+    return name
+
+
+def _from_shared_memory(name, shape, dtype):
+    shm = shared_memory.SharedMemory(name=name)
+    try:
+        return np.array(np.ndarray(shape, dtype, buffer=shm.buf))
+    finally:
+        shm.close()
+        shm.unlink()
+
+
+def _unlink_shared_memory(name):
+    try:
+        shm = shared_memory.SharedMemory(name=name)
+    except FileNotFoundError:
+        return
+    shm.close()
+    shm.unlink()
+
+
+def _process_file(task):
+    index, input_path, output_path, template, segment, dtype = task
+    before_input, before_output, fx_args = template
+    args = before_input + [input_path] + before_output
+    args += [PIPE_CHAR if output_path is None else output_path] + fx_args
+    try:
+        # files written to disk are streamed with constant memory
+        output_audio, sample_rate, frames = _sox(
+            args, dtype=dtype, return_output=output_path is None)
+    except Exception as e:
+        return index, None, None, 0, "%s: %s" % (type(e).__name__, e)
+
+    if output_path is not None:
+        output = None
+    elif segment is not None:
+        output = (
+            _to_shared_memory(output_audio, segment), output_audio.shape,
+            output_audio.dtype.str
+        )
+    else:
+        output = output_audio
+    return index, output, sample_rate, frames, None
+
+
+def process_files(pairs, transformer_or_args, workers=None,
+                  use_shared_memory=True, dtype=np.float64, chunksize=1,
+                  callback=None):
+    r"""Runs a Transformer or sox effects over many files in parallel.
+
+    Each pair is processed in a pool of worker processes, libsox is
+    initialized once per worker. A file that fails is recorded in the
+    result and the rest of the batch carries on.
+
+    Args:
+        pairs (list): (input_path, output_path) tuples. If output_path is
+            None the output is returned as an array instead of written.
+        transformer_or_args (Transformer, str or list): A Transformer, or
+            the effects and their arguments as they follow the output file
+            on the sox command line.
+        workers (int): Number of processes, defaults to the number of cores.
+        use_shared_memory (bool): Return arrays from the workers through
+            shared memory rather than pickling them through the pool.
+        dtype (np.dtype): dtype of the returned arrays.
+        chunksize (int): Number of pairs sent to a worker at a time.
+        callback (callable): Called with the BatchCounters after each file.
+
+    Returns:
+        BatchResult: Outputs, per-file errors and throughput counters.
+    """
+    pairs = list(pairs)
+    template = _command_template(transformer_or_args)
+    use_shared_memory = use_shared_memory and shared_memory is not None
+    result = BatchResult(len(pairs))
+    # segments are named after the batch and the file, so the ones whose
+    # results never got read can be found and unlinked
+    prefix = 'sb%d_%s_' % (os.getpid(), secrets.token_hex(4))
+    tasks = [
+        (i, input_path, output_path, template,
+         prefix + str(i) if use_shared_memory else None, dtype)
+        for i, (input_path, output_path) in enumerate(pairs)
+    ]
+    unread = {
+        task[4] for task in tasks if task[4] is not None and task[2] is None
+    }
+
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if use_shared_memory and os.name == 'posix':
+        # workers register the segments they create with the resource
+        # tracker, start it here so they share ours instead of each forking
+        # one that would try to clean up segments we already unlinked
+        resource_tracker.ensure_running()
+    try:
+        with multiprocessing.Pool(workers, initializer=_init_worker) as pool:
+            for index, output, sample_rate, frames, error in (
+                    pool.imap_unordered(
+                        _process_file, tasks, chunksize=chunksize)):
+                if error is not None:
+                    result.errors[index] = error
+                elif isinstance(output, tuple):
+                    unread.discard(output[0])
+                    output = _from_shared_memory(*output)
+                result.outputs[index] = output
+                result.sample_rates[index] = sample_rate
+                result.counters._update(
+                    frames, sample_rate, error is not None)
+                if callback is not None:
+                    callback(result.counters)
+    finally:
+        # the pool is terminated by now; if the loop stopped early, e.g.
+        # because callback raised, the segments workers already created
+        # would otherwise stay in /dev/shm until the interpreter exits
+        for name in unread:
+            _unlink_shared_memory(name)
+    return result
@@ -0,0 +1,157 @@
+"""
+Cache for the output of deterministic Transformers, so a data loader that
+applies the same chain to the same files every epoch decodes and processes
+each file once.
+"""
+
+import collections
+import hashlib
+import json
+import os
+import threading
+import numpy as np
+
+# bump when the key or the file layout changes, so old entries are ignored
+_VERSION = 1
+
+
+def _save_atomically(path, write):
+    # write next to the destination and move it in place, so a reader
+    # never sees half a file. The temporary name is unique per thread, so
+    # writers racing for the same path don't share one
+    tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+    try:
+        with open(tmp_path, 'wb') as f:
+            write(f)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+def _source_id(input_filepath, input_array, sample_rate_in):
+    if input_filepath is not None:
+        path = os.path.abspath(os.fspath(input_filepath))
+        stat = os.stat(path)
+        return ['file', path, stat.st_size, stat.st_mtime_ns]
+    array = np.ascontiguousarray(input_array)
+    digest = hashlib.blake2b(array.data, digest_size=20).hexdigest()
+    return ['array', digest, array.dtype.str, list(array.shape),
+            None if sample_rate_in is None else float(sample_rate_in)]
+
+
+class TransformCache:
+    """
+    Cache of ``Transformer.build_array`` outputs, keyed by the source (path,
+    size and modification time of a file, or a hash of an array and its
+    sample rate) and the sox arguments of the Transformer. Use it for
+    chains that give the same output every time, i.e. not ones with dither
+    or random effects.
+
+    Outputs are kept in an in-memory LRU and, if a directory is given,
+    saved there as .npy files that are memory-mapped when read back, so
+    other processes and later runs share them. Returned arrays are
+    read-only.
+
+    Args:
+        directory (str): Where to save outputs, created if it doesn't
+            exist. None keeps them in memory only.
+        max_memory_bytes (int): Limit on the bytes of the outputs held in
+            memory, the least recently used are dropped first. 0 disables
+            the in-memory cache.
+    """
+    def __init__(self, directory=None, max_memory_bytes=256 * 2 ** 20):
+        self.directory = directory
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+        self.max_memory_bytes = max_memory_bytes
+        self.memory_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._memory = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def key(self, transformer, input_filepath=None, input_array=None,
+            sample_rate_in=None, extra_args=None, dtype=np.float64):
+        """The cache key of a build_array call."""
+        tfm = transformer
+        args = [
+            list(tfm.globals),
+            tfm._input_format_args(tfm.input_format),
+            tfm._output_format_args(tfm.output_format),
+            list(tfm.effects),
+            list(extra_args or []),
+        ]
+        description = json.dumps([
+            _VERSION, _source_id(input_filepath, input_array, sample_rate_in),
+            [[str(arg) for arg in group] for group in args],
+            np.dtype(dtype).str,
+        ])
+        return hashlib.blake2b(
+            description.encode(), digest_size=20).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + '.npy')
+
+    def get(self, key):
+        """Returns the cached output for key, or None."""
+        with self._lock:
+            data = self._memory.get(key)
+            if data is not None:
+                self._memory.move_to_end(key)
+                return data
+        if self.directory is None:
+            return None
+        try:
+            data = np.load(self._path(key), mmap_mode='r')
+        except (OSError, ValueError):
+            return None
+        self._remember(key, data)
+        return data
+
+    def put(self, key, data):
+        """Adds an output to the cache and returns it, read-only."""
+        data = np.ascontiguousarray(data)
+        data.flags.writeable = False
+        if self.directory is not None:
+            _save_atomically(self._path(key), lambda f: np.save(f, data))
+        self._remember(key, data)
+        return data
+
+    def _remember(self, key, data):
+        with self._lock:
+            if key in self._memory or data.nbytes > self.max_memory_bytes:
+                return
+            self._memory[key] = data
+            self.memory_bytes += data.nbytes
+            while self.memory_bytes > self.max_memory_bytes:
+                _, evicted = self._memory.popitem(last=False)
+                self.memory_bytes -= evicted.nbytes
+
+    def build_array(self, transformer, input_filepath=None, input_array=None,
+                    sample_rate_in=None, extra_args=None, dtype=np.float64):
+        """``transformer.build_array``, through the cache."""
+        key = self.key(transformer, input_filepath, input_array,
+                       sample_rate_in, extra_args, dtype)
+        data = self.get(key)
+        if data is not None:
+            self.hits += 1
+            return data
+        self.misses += 1
+        data = transformer.build_array(
+            input_filepath=input_filepath, input_array=input_array,
+            sample_rate_in=sample_rate_in, extra_args=extra_args, dtype=dtype)
+        return self.put(key, data)
+
+    def clear(self):
+        """Empties the in-memory cache and deletes the saved outputs."""
+        with self._lock:
+            self._memory.clear()
+            self.memory_bytes = 0
+        if self.directory is not None:
+            for name in os.listdir(self.directory):
+                if name.endswith('.npy'):
+                    os.remove(os.path.join(self.directory, name))
@@ -0,0 +1,181 @@
+import itertools
+import sys
+import numpy as np
+
+from .effects import build_flow_effects, build_flow_effects_sweep
+from .sox_cli import (
+    PIPE_CHAR,
+    _parse_args,
+    _input_format,
+    _effects_chain,
+)
+
+def _is_transformer(obj):
+    # pysox is slow to import, and obj can only be one of its Transformers
+    # if it was imported already
+    pysox = sys.modules.get('sox')
+    return pysox is not None and isinstance(obj, pysox.Transformer)
+
+class EffectsChain:
+    r"""An effects chain that is parsed once and applied to many arrays.
+
+    ``sox`` parses the command line and builds the SoxEffect objects on
+    every call. ``EffectsChain.compile`` does that work once, and the
+    chain built for a given input sample rate and channel count is kept,
+    so applying the same chain to many clips only runs the effects.
+
+    Use ``EffectsChain.compile`` rather than the constructor.
+    """
+    def __init__(self, input_flags, output_flags, fx_groups):
+        self._input_flags = input_flags
+        self._output_flags = output_flags
+        self._fx_groups = fx_groups
+        self._chains = {}
+
+    @classmethod
+    def compile(cls, args):
+        """Parses a chain from sox command line arguments or a Transformer.
+
+        Args:
+            args (str, list or Transformer): Arguments as passed to ``sox``,
+                both files must be '-'. A Transformer contributes its
+                globals, input and output formats and effects.
+
+        Returns:
+            EffectsChain: The compiled chain.
+        """
+        if _is_transformer(args):
+            tfm = args
+            args = []
+            args.extend(tfm.globals)
+            args.extend(tfm._input_format_args(tfm.input_format))
+            args.append(PIPE_CHAR)
+            args.extend(tfm._output_format_args(tfm.output_format))
+            args.append(PIPE_CHAR)
+            args.extend(tfm.effects)
+        input_flags, output_flags, input_file, output_file, fx_groups = (
+            _parse_args(args)
+        )
+        if input_file != PIPE_CHAR or output_file != PIPE_CHAR:
+            raise ValueError(
+                "EffectsChain works on arrays, input and output must be '-'")
+        return cls(input_flags, output_flags, fx_groups)
+
+    def _get(self, sample_rate_in, in_channels):
+        sample_rate_in, flag_channels, in_precision = _input_format(
+            self._input_flags, sample_rate_in)
+        if flag_channels is not None:
+            in_channels = flag_channels
+        key = (sample_rate_in, in_channels)
+        if key not in self._chains:
+            sox_effects_chain, flow_args = _effects_chain(
+                self._output_flags, self._fx_groups, sample_rate_in,
+                in_channels, in_precision)
+            self._chains[key] = (sample_rate_in, sox_effects_chain, flow_args)
+        return self._chains[key]
+
+    def output_format(self, sample_rate_in, in_channels):
+        """Returns the sample rate and number of channels the chain outputs
+        for input of the given sample rate and number of channels.
+        """
+        sample_rate_in, _, flow_args = self._get(sample_rate_in, in_channels)
+        sample_rate_out = flow_args['sample_rate_out']
+        out_channels = flow_args['out_channels']
+        return (
+            sample_rate_in if sample_rate_out is None else sample_rate_out,
+            flow_args['in_channels'] if out_channels is None else out_channels
+        )
+
+    def apply(self, input_audio, sample_rate_in, dtype=np.float64):
+        """Runs the chain on an array of shape (frames, channels).
+
+        Args:
+            input_audio (np.ndarray): Audio to process.
+            sample_rate_in (int): Sample rate of input_audio.
+            dtype (np.dtype): dtype of the returned audio.
+
+        Returns:
+            tuple: The output audio and its sample rate.
+        """
+        in_channels = 1 if input_audio.ndim == 1 else input_audio.shape[-1]
+        sample_rate_in, sox_effects_chain, flow_args = self._get(
+            sample_rate_in, in_channels)
+        return build_flow_effects(
+            input_audio,
+            sample_rate_in,
+            sox_effects_chain,
+            dtype=dtype,
+            **flow_args
+        )
+
+def _expand_grid(param_grid):
+    if isinstance(param_grid, dict):
+        names = list(param_grid)
+        return [
+            dict(zip(names, values))
+            for values in itertools.product(*param_grid.values())
+        ]
+    return [dict(params) for params in param_grid]
+
+def sweep(input_audio, sample_rate_in, chain_template, param_grid,
+          workers=None, pad=True, dtype=np.float64):
+    r"""Runs one effects chain with many sets of parameters over an array,
+    i.e. 16 pitch shifts or 8 reverb sizes of one clip for augmentation.
+
+    The input is converted once and shared by all variants, which run on
+    a pool of native threads.
+
+    Args:
+        input_audio (np.ndarray): Audio of shape (frames, channels).
+        sample_rate_in (int): Sample rate of input_audio.
+        chain_template (str or callable): Arguments as passed to ``sox``,
+            with ``{name}`` placeholders for the parameters, i.e. 
+            "- - pitch {shift} reverb {room}". Or a function that takes the 
+            parameters as keyword arguments and returns arguments or a 
+            Transformer.
+        param_grid (dict or list): Dict from parameter name to a list of
+            values, every combination of which is a variant (the last name
+            varying fastest), or a list of dicts, one per variant.
+        workers (int): Number of threads, defaults to the number of cores.
+        pad (bool): Stack the outputs into one array, zero padded to the
+            longest, instead of returning a list.
+        dtype (np.dtype): dtype of the returned audio.
+
+    Returns:
+        tuple: The outputs, as an array of shape (variants, frames, 
+        channels) or a list of (frames, channels) arrays, the number of
+        frames of each output and the output sample rate.
+    """
+    in_channels = 1 if input_audio.ndim == 1 else input_audio.shape[-1]
+    chains = []
+    flow = None
+    for params in _expand_grid(param_grid):
+        if callable(chain_template):
+            args = chain_template(**params)
+        else:
+            args = chain_template.format(**params)
+        chain_rate, sox_effects_chain, flow_args = EffectsChain.compile(
+            args)._get(sample_rate_in, in_channels)
+        if flow is None:
+            flow = (chain_rate, flow_args)
+        elif flow != (chain_rate, flow_args):
+            raise ValueError(
+                "every variant must have the same input and output format")
+        chains.append(sox_effects_chain)
+    if flow is None:
+        raise ValueError("param_grid has no variants")
+
+    chain_rate, flow_args = flow
+    outputs, sample_rate = build_flow_effects_sweep(
+        input_audio, chain_rate, chains, num_threads=workers, dtype=dtype,
+        **flow_args
+    )
+    lengths = np.array([output.shape[0] for output in outputs], np.int64)
+    if not pad:
+        return outputs, lengths, sample_rate
+    stacked = np.zeros(
+        (len(outputs), lengths.max(), outputs[0].shape[1]), dtype)
+    for stacked_output, output in zip(stacked, outputs):
+        stacked_output[:output.shape[0]] = output
+    return stacked, lengths, sample_rate
+
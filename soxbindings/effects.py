@@ -1,77 +1,518 @@
+import atexit
+import os
+import threading
 import numpy as np
 from contextlib import contextmanager
 
 MAX_NUM_EFFECTS_ARGS = 20
 SOX_UNSPEC = 0
+SOX_SUCCESS = 0
+# dtypes the bindings read directly, anything else goes through float64
+NATIVE_DTYPES = (np.float64, np.float32, np.int32, np.int16)
+# ways of combining several inputs, as in sox --combine
+COMBINE_METHODS = ('concatenate', 'merge', 'mix', 'mix-power', 'multiply')
+# how the axes of an array are ordered, (frames, channels) or
+# (channels, frames)
+LAYOUTS = ('channels_last', 'channels_first')
+# whether libsox is initialized, kept for code that checks it
 SOX_INITIALIZED = False
 
+# libsox is initialized while anything holds a reference to it: the global
+# session, sox_context blocks, initialize_sox calls and calls in flight
+_sox_lock = threading.RLock()
+_sox_refs = 0
+_session_open = False
+_atexit_registered = False
+
+def _reset_lock():
+    # a child forked while another thread held the lock would deadlock
+    global _sox_lock
+    _sox_lock = threading.RLock()
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_lock)
+
 def get_available_effects():
     from . import _soxbindings
     return _soxbindings.get_effect_names()
 
-def initialize_sox():
+def _acquire_sox():
+    global _sox_refs, SOX_INITIALIZED
     from . import _soxbindings
-    return _soxbindings.sox_init()
+    with _sox_lock:
+        val = SOX_SUCCESS
+        if _sox_refs == 0 and not _session_open:
+            val = _soxbindings.sox_init()
+            SOX_INITIALIZED = True
+        _sox_refs += 1
+        return val
 
-def quit_sox():
+def _release_sox():
+    global _sox_refs, SOX_INITIALIZED
+    from . import _soxbindings
+    with _sox_lock:
+        if _sox_refs == 0:
+            return
+        _sox_refs -= 1
+        if _sox_refs == 0 and not _session_open:
+            _soxbindings.sox_quit()
+            SOX_INITIALIZED = False
+
+def open_session():
+    """Initializes libsox for the rest of the process, if it isn't yet.
+    Every call that needs libsox does this, so format handlers and effects
+    are loaded once instead of once per call. The session is closed at
+    exit, or by ``close_session``."""
+    global _session_open, _atexit_registered, SOX_INITIALIZED
+    if _session_open:
+        return
+    from . import _soxbindings
+    with _sox_lock:
+        if _session_open:
+            return
+        if _sox_refs == 0:
+            _soxbindings.sox_init()
+            SOX_INITIALIZED = True
+        _session_open = True
+        if not _atexit_registered:
+            atexit.register(close_session)
+            _atexit_registered = True
+
+def close_session():
+    """Closes the global session. libsox is shut down once the sox_context
+    blocks and calls still using it are done."""
+    global _session_open, SOX_INITIALIZED
     from . import _soxbindings
-    return _soxbindings.sox_quit()
+    with _sox_lock:
+        if not _session_open:
+            return
+        _session_open = False
+        if _sox_refs == 0:
+            _soxbindings.sox_quit()
+            SOX_INITIALIZED = False
+
+def _warm_up():
+    # libsox loads the format handlers and effects when it is initialized,
+    # which has to happen before several threads look them up at once
+    open_session()
+
+class _using_sox:
+    # holds a reference to libsox for the length of a call, so closing the
+    # session from another thread can't shut it down underneath the call
+    def __enter__(self):
+        open_session()
+        _acquire_sox()
+
+    def __exit__(self, *exc):
+        _release_sox()
+
+def initialize_sox():
+    """Takes a reference to libsox, initializing it if needed. Each call
+    should be matched by a ``quit_sox``."""
+    return _acquire_sox()
+
+def quit_sox():
+    """Drops a reference taken by ``initialize_sox``. libsox is shut down
+    when no references are left and the global session is closed."""
+    _release_sox()
+    return SOX_SUCCESS
 
 @contextmanager
 def sox_context():
-    global SOX_INITIALIZED
+    """Keeps libsox initialized for the block (or decorated function).
+    Blocks can be nested and entered from several threads at once."""
+    val = _acquire_sox()
     try:
-        val = initialize_sox()
-        SOX_INITIALIZED = True
         yield val
     finally:
-        # Code to release resource, e.g.:
-        quit_sox()
-        SOX_INITIALIZED = False
+        _release_sox()
+
+def enable_profiling(enabled=True):
+    """Starts (or stops) adding the time, samples and clips of every effect
+    of every chain run in this process, on any thread, to the profile 
+    returned by ``get_profile``. Effects are timed around each call into 
+    libsox, which costs little next to the effects themselves.
+    """
+    from . import _soxbindings
+    _soxbindings.set_profiling(enabled)
+
+def get_profile(reset=False):
+    """Returns the process-wide profile as a dict from effect name to an
+    EffectStats holding the totals over every chain run since profiling
+    was enabled (or last reset). ``chains`` is the number of runs that
+    used the effect.
+    """
+    from . import _soxbindings
+    return {stats.name: stats for stats in _soxbindings.get_profile(reset)}
+
+def _as_frames(data, layout):
+    # (frames, channels) or (frames,) view of an array in the given layout.
+    # The bindings read the samples through the strides, so an array of a
+    # native dtype is never copied
+    if layout not in LAYOUTS:
+        raise ValueError(f"layout must be one of {', '.join(LAYOUTS)}")
+    if data.dtype not in NATIVE_DTYPES:
+        data = data.astype(np.float64)
+    if data.ndim > 2:
+        # batches go through build_flow_effects_batch, one chain per item
+        raise ValueError("expected a 1D or 2D array")
+    if data.ndim == 2 and layout == 'channels_first':
+        data = data.T
+    return data
+
+def _to_layout(data, channels, layout):
+    # the interleaved output, a transposed view for channels_first
+    data = data.reshape(-1, channels)
+    return data.T if layout == 'channels_first' else data
 
 def build_flow_effects(input_data, sample_rate_in, sox_effects_chain, 
                        in_channels=None, in_precision=16, out_channels=None,
-                       sample_rate_out=None, out_precision=None):
-    global SOX_INITIALIZED
-
-    if not SOX_INITIALIZED:
-        with sox_context():
-            data, sample_rate = _build_flow_effects(
-                input_data, sample_rate_in, sox_effects_chain, 
-                in_channels=in_channels, in_precision=in_precision, 
-                out_channels=out_channels, sample_rate_out=sample_rate_out, 
-                out_precision=out_precision
-            )
-    else:
-        data, sample_rate = _build_flow_effects(
+                       sample_rate_out=None, out_precision=None,
+                       dtype=np.float64, return_stats=False,
+                       layout='channels_last'):
+    """
+    Runs an effects chain over an array of shape (frames, channels), or
+    (channels, frames) with layout='channels_first'. The array can have
+    any strides, the samples are interleaved while they are read. The
+    output has the same layout as the input; a channels_first output is
+    the transposed view of the interleaved samples, so it isn't
+    C-contiguous.
+
+    With return_stats=True a FlowStats is returned after the sample rate.
+    Its ``effects`` list has the wall time, samples in and out, number of
+    calls, largest block and clips of every effect of the chain, including
+    the ones feeding the input and collecting the output. ``buffer_size``
+    is the size of the buffers between effects, in samples.
+    """
+    with _using_sox():
+        return _build_flow_effects(
             input_data, sample_rate_in, sox_effects_chain, 
             in_channels=in_channels, in_precision=in_precision, 
             out_channels=out_channels, sample_rate_out=sample_rate_out, 
-            out_precision=out_precision
+            out_precision=out_precision, dtype=dtype,
+            return_stats=return_stats, layout=layout
         )
-    return data, sample_rate
 
-def _build_flow_effects(input_data, sample_rate_in, sox_effects_chain, 
-                       in_channels=None, in_precision=16, out_channels=None,
-                       sample_rate_out=None, out_precision=None):
-    from . import _soxbindings        
+def build_flow_effects_file(reader, sox_effects_chain, in_precision=16,
+                            out_channels=None, sample_rate_out=None,
+                            out_precision=None, dtype=np.float64,
+                            output_file=None, file_type=None,
+                            return_stats=False):
+    r"""Runs an effects chain over the rest of an open file.
 
-    input_signal_info = _soxbindings.sox_signalinfo_t()
-    input_signal_info.rate = float(sample_rate_in)
+    The chain decodes straight from the file, without reading it into an
+    array first. A leading trim on a file that has not been read from is
+    turned into a seek. If output_file is given the output is encoded
+    straight into it, so memory use does not grow with the file.
+
+    Args:
+        reader (SoxReader): The open file.
+        output_file (str): File to write the output to instead of
+            returning it.
+        file_type (str): Type of output_file, by default taken from its
+            extension.
+        return_stats (bool): Also return a FlowStats, see
+            ``build_flow_effects``.
+
+    The remaining arguments are the same as for ``build_flow_effects``.
+
+    Returns:
+        tuple: The output array, or the number of frames written if
+        output_file is given, and the output sample rate.
+    """
+    with _using_sox():
+        return _build_flow_effects_file(
+            reader, sox_effects_chain, in_precision=in_precision,
+            out_channels=out_channels, sample_rate_out=sample_rate_out,
+            out_precision=out_precision, dtype=dtype,
+            output_file=output_file, file_type=file_type,
+            return_stats=return_stats
+        )
+
+def _build_flow_effects_file(reader, sox_effects_chain, in_precision=16,
+                             out_channels=None, sample_rate_out=None,
+                             out_precision=None, dtype=np.float64,
+                             output_file=None, file_type=None,
+                             return_stats=False):
+    from . import _soxbindings
+    stats = _soxbindings.FlowStats() if return_stats else None
+    in_channels = reader.channels
+    if out_channels is None:
+        out_channels = in_channels
+    input_signal_info, target_signal_info, target_encoding = _signal_infos(
+        reader.sample_rate, in_channels, reader.signal.length, in_precision,
+        out_channels, sample_rate_out, out_precision
+    )
+    if output_file is not None:
+        sample_rate, num_channels, frames = reader.flow_effects_to_file(
+            output_file, input_signal_info, target_signal_info,
+            target_encoding, file_type, sox_effects_chain,
+            MAX_NUM_EFFECTS_ARGS, stats
+        )
+        return (frames, sample_rate, stats) if return_stats else (
+            frames, sample_rate)
+    sample_rate, num_channels, data = reader.flow_effects(
+        input_signal_info, target_signal_info, target_encoding,
+        sox_effects_chain, MAX_NUM_EFFECTS_ARGS, np.dtype(dtype), stats
+    )
+    data = data.reshape(-1, out_channels)
+    return (data, sample_rate, stats) if return_stats else (data, sample_rate)
+
+def build_flow_effects_batch(input_data, sample_rate_in, sox_effects_chain,
+                             in_channels=None, in_precision=16,
+                             out_channels=None, sample_rate_out=None,
+                             out_precision=None, num_threads=None,
+                             dtype=np.float64, layout='channels_last'):
+    r"""Applies one effects chain to every array in a list.
+
+    Each array is processed by its own chain on a pool of native threads,
+    so the whole batch runs without the GIL. All arrays must have the same
+    sample rate and number of channels.
+
+    Args:
+        input_data (list): Arrays of shape (frames, channels), or an array
+            of shape (batch, frames, channels). With 
+            layout='channels_first' the channels come before the frames.
+        num_threads (int): Number of threads, defaults to the number of cores.
+
+    The remaining arguments are the same as for ``build_flow_effects``.
+
+    Returns:
+        tuple: List of output arrays, in the input's layout, and the output
+        sample rate.
+    """
+    with _using_sox():
+        return _build_flow_effects_batch(
+            input_data, sample_rate_in, sox_effects_chain,
+            in_channels=in_channels, in_precision=in_precision,
+            out_channels=out_channels, sample_rate_out=sample_rate_out,
+            out_precision=out_precision, num_threads=num_threads, dtype=dtype,
+            layout=layout
+        )
+
+def _build_flow_effects_batch(input_data, sample_rate_in, sox_effects_chain,
+                              in_channels=None, in_precision=16,
+                              out_channels=None, sample_rate_out=None,
+                              out_precision=None, num_threads=None,
+                              dtype=np.float64, layout='channels_last'):
+    from . import _soxbindings
+
+    if len(input_data) == 0:
+        return [], sample_rate_out or sample_rate_in
+    # the items of a batched array are views, nothing is copied
+    arrays = [_as_frames(array, layout) for array in input_data]
+    if in_channels is None:
+        in_channels = 1 if arrays[0].ndim == 1 else arrays[0].shape[1]
+    if out_channels is None:
+        out_channels = in_channels
+    input_signal_info, target_signal_info, target_encoding = _signal_infos(
+        sample_rate_in, in_channels, SOX_UNSPEC, in_precision,
+        out_channels, sample_rate_out, out_precision
+    )
+
+    for array in arrays:
+        if array.size % in_channels != 0:
+            raise ValueError(
+                "every array must have %d channels" % in_channels)
+
+    sample_rate, num_channels, outputs = _soxbindings.build_flow_effects_batch(
+        arrays, input_signal_info, target_signal_info, target_encoding,
+        sox_effects_chain, MAX_NUM_EFFECTS_ARGS, num_threads or 0,
+        np.dtype(dtype)
+    )
+    outputs = [_to_layout(data, num_channels, layout) for data in outputs]
+    return outputs, sample_rate
+
+def build_flow_effects_sweep(input_data, sample_rate_in, sox_effects_chains,
+                             in_channels=None, in_precision=16,
+                             out_channels=None, sample_rate_out=None,
+                             out_precision=None, num_threads=None,
+                             dtype=np.float64, layout='channels_last'):
+    r"""Applies every effects chain in a list to the same array.
+
+    The array is converted to sox samples once and shared read-only by
+    the chains, which run on a pool of native threads without the GIL.
+
+    Args:
+        input_data (np.ndarray): Array of shape (frames, channels), or
+            (channels, frames) with layout='channels_first'.
+        sox_effects_chains (list): Lists of SoxEffect objects.
+        num_threads (int): Number of threads, defaults to the number of cores.
+
+    The remaining arguments are the same as for ``build_flow_effects``.
+
+    Returns:
+        tuple: List of output arrays, one per chain, and the output sample
+        rate.
+    """
+    from . import _soxbindings
+
+    input_data = _as_frames(input_data, layout)
     if in_channels is None:
-        in_channels = (
-            1 if len(input_data.shape) == 1 else input_data.shape[-1]
+        in_channels = 1 if input_data.ndim == 1 else input_data.shape[1]
+    if out_channels is None:
+        out_channels = in_channels
+    input_signal_info, target_signal_info, target_encoding = _signal_infos(
+        sample_rate_in, in_channels, input_data.size, in_precision,
+        out_channels, sample_rate_out, out_precision
+    )
+    if len(sox_effects_chains) == 0:
+        return [], target_signal_info.rate
+
+    with _using_sox():
+        rates, channels, outputs = _soxbindings.build_flow_effects_sweep(
+            input_data, input_signal_info, target_signal_info,
+            target_encoding, sox_effects_chains, MAX_NUM_EFFECTS_ARGS,
+            num_threads or 0, np.dtype(dtype)
         )
+    if len(set(rates)) > 1 or len(set(channels)) > 1:
+        raise ValueError(
+            "the chains must all output the same sample rate and channels")
+    outputs = [_to_layout(data, channels[0], layout) for data in outputs]
+    return outputs, rates[0]
+
+def _combined_channels(method, channels):
+    # channels of the signal combining inputs with the given channels
+    if method == 'merge':
+        return sum(channels)
+    if method == 'concatenate' and len(set(channels)) > 1:
+        raise ValueError("concatenated inputs must have the same channels")
+    return max(channels)
+
+def combine(inputs, sample_rate_in=None, method='mix', volumes=None,
+            sox_effects_chain=None, in_precision=16, out_channels=None,
+            sample_rate_out=None, out_precision=None, dtype=np.float64,
+            output_file=None, file_type=None, layout='channels_last'):
+    r"""Combines several arrays or files into one signal the way sox does
+    with several input files, and runs an effects chain over the result.
+
+    The inputs are decoded and combined block by block inside the chain,
+    so no input is held whole in memory and nothing but the output is
+    allocated.
+
+    Args:
+        inputs (list): Arrays of shape (frames, channels), or (channels,
+            frames) with layout='channels_first', and paths of audio
+            files, in any mix. Files can also be given as SoxReaders 
+            that have not been read from yet, they are left open. The 
+            inputs must all have the same sample rate.
+        sample_rate_in (float): Sample rate of the arrays.
+        method (str): One of COMBINE_METHODS. 'concatenate' plays the 
+            inputs one after the other, 'mix' adds them up, 'mix-power' 
+            too but with other default volumes, 'merge' puts their 
+            channels side by side and 'multiply' multiplies them. Inputs 
+            shorter than the longest are padded with silence.
+        volumes (list): Factor to scale each input by. By default 1, 
+            except that 'mix' scales by 1/n and 'mix-power' by 1/sqrt(n),
+            same as sox, so n inputs don't clip.
+        sox_effects_chain (list): List of SoxEffect objects to run over 
+            the combined signal.
+        in_precision (int): Precision of the arrays. The combined signal 
+            has the highest precision of the inputs.
+        output_file (str): Encode the output to this file instead of
+            returning it, file_type is its type.
+
+    The remaining arguments are the same as for ``build_flow_effects``.
+
+    Returns:
+        tuple: The output array, or the number of frames written if
+        output_file is given, and the output sample rate.
+    """
+    from . import _soxbindings
+
+    if method not in COMBINE_METHODS:
+        raise ValueError(
+            f"method must be one of {', '.join(COMBINE_METHODS)}")
+    if len(inputs) == 0:
+        raise ValueError("combine needs at least one input")
+    if volumes is None:
+        volumes = [1.0] * len(inputs)
+        if method == 'mix':
+            volumes = [1.0 / len(inputs)] * len(inputs)
+        elif method == 'mix-power':
+            volumes = [1.0 / np.sqrt(len(inputs))] * len(inputs)
+    if len(volumes) != len(inputs):
+        raise ValueError("volumes must have one entry per input")
+
+    with _using_sox():
+        native_inputs = []
+        readers = []
+        try:
+            rates, channels, lengths, precisions = [], [], [], []
+            for audio in inputs:
+                if isinstance(audio, np.ndarray):
+                    audio = _as_frames(audio, layout)
+                    audio_channels = 1 if audio.ndim == 1 else audio.shape[1]
+                    if sample_rate_in is None:
+                        raise ValueError("arrays need a sample_rate_in")
+                    rates.append(float(sample_rate_in))
+                    channels.append(audio_channels)
+                    lengths.append(audio.size // max(audio_channels, 1))
+                    precisions.append(in_precision)
+                    native_inputs.append(audio)
+                else:
+                    if isinstance(audio, _soxbindings.SoxReader):
+                        reader = audio
+                    else:
+                        reader = _soxbindings.SoxReader(
+                            os.fspath(audio), None, None, None)
+                        readers.append(reader)
+                    rates.append(float(reader.sample_rate))
+                    channels.append(reader.channels)
+                    # libsox only estimates the length of an MP3
+                    mp3 = (reader.encoding.encoding ==
+                           _soxbindings.SOX_ENCODING_MP3)
+                    lengths.append(0 if mp3 else reader.length)
+                    precisions.append(reader.signal.precision)
+                    native_inputs.append(reader)
+            if len(set(rates)) > 1:
+                raise ValueError("inputs must have the same sample rate")
+
+            in_channels = _combined_channels(method, channels)
+            frames = 0
+            if all(lengths):
+                frames = (sum(lengths) if method == 'concatenate' 
+                          else max(lengths))
+            if out_channels is None:
+                out_channels = in_channels
+            input_signal_info, target_signal_info, target_encoding = (
+                _signal_infos(
+                    rates[0], in_channels, frames * in_channels,
+                    max(precisions), out_channels, sample_rate_out,
+                    out_precision
+                )
+            )
+            sample_rate, num_channels, output = (
+                _soxbindings.build_flow_effects_combine(
+                    native_inputs, channels, [float(v) for v in volumes],
+                    method, input_signal_info, target_signal_info,
+                    target_encoding, sox_effects_chain or [],
+                    MAX_NUM_EFFECTS_ARGS, np.dtype(dtype),
+                    '' if output_file is None else os.fspath(output_file),
+                    file_type, None
+                )
+            )
+        finally:
+            for reader in readers:
+                reader.close()
+    if output_file is not None:
+        return output, sample_rate
+    return _to_layout(output, num_channels, layout), sample_rate
+
+def _signal_infos(sample_rate_in, in_channels, length, in_precision,
+                  out_channels, sample_rate_out=None, out_precision=None):
+    from . import _soxbindings
+
+    input_signal_info = _soxbindings.sox_signalinfo_t()
+    input_signal_info.rate = float(sample_rate_in)
     input_signal_info.channels = in_channels
-    input_signal_info.length = input_data.size
+    input_signal_info.length = length
     input_signal_info.precision = in_precision
 
     if sample_rate_out is None:
         sample_rate_out = sample_rate_in
     if out_precision is None:
         out_precision = in_precision
-    if out_channels is None:
-        out_channels = in_channels
 
     target_signal_info = _soxbindings.sox_signalinfo_t()
     target_signal_info.rate = float(sample_rate_out)
@@ -87,19 +528,122 @@ def _build_flow_effects(input_data, sample_rate_in, sox_effects_chain,
     target_encoding.reverse_nibbles = _soxbindings.sox_option_default
     target_encoding.reverse_bits = _soxbindings.sox_option_default
     target_encoding.opposite_endian = _soxbindings.sox_false
-    
-    input_data = input_data.reshape(-1)
-    input_data = input_data * (1 << 31)
-    input_data = input_data.astype(np.int32)
+    return input_signal_info, target_signal_info, target_encoding
+
+def _build_flow_effects(input_data, sample_rate_in, sox_effects_chain, 
+                       in_channels=None, in_precision=16, out_channels=None,
+                       sample_rate_out=None, out_precision=None,
+                       dtype=np.float64, return_stats=False,
+                       layout='channels_last'):
+    from . import _soxbindings        
+
+    # floats are scaled and ints shifted into sox samples natively, straight
+    # from the array's memory whatever its strides, so an array of a native
+    # dtype is passed through without a copy
+    input_data = _as_frames(input_data, layout)
+    if in_channels is None:
+        in_channels = 1 if input_data.ndim == 1 else input_data.shape[1]
+    if out_channels is None:
+        out_channels = in_channels
+    input_signal_info, target_signal_info, target_encoding = _signal_infos(
+        sample_rate_in, in_channels, input_data.size, in_precision,
+        out_channels, sample_rate_out, out_precision
+    )
 
+    stats = _soxbindings.FlowStats() if return_stats else None
     sample_rate, num_channels, data = _soxbindings.build_flow_effects(
         input_data, input_signal_info,
         target_signal_info, target_encoding, 
-        sox_effects_chain, MAX_NUM_EFFECTS_ARGS
+        sox_effects_chain, MAX_NUM_EFFECTS_ARGS, np.dtype(dtype), stats
     )
-    data = data.reshape(-1, out_channels)
-    data = data / (1 << 31)
-    return data, sample_rate
+    data = _to_layout(data, out_channels, layout)
+    return (data, sample_rate, stats) if return_stats else (data, sample_rate)
+
+class StreamingEffects:
+    r"""Runs an effects chain over audio that arrives in chunks.
+
+    The chain is built once and kept alive between chunks, so effects with
+    state (resampling, filters, reverb, compand) carry it across chunk
+    boundaries. Concatenating the outputs of every ``push`` followed by
+    ``flush`` gives the same samples as ``build_flow_effects`` on the whole
+    signal.
+
+    Args:
+        sample_rate_in (float): Sample rate of the chunks.
+        sox_effects_chain (list): List of SoxEffect objects.
+        in_channels (int): Number of channels in each chunk.
+        in_precision (int): Precision of the input, defaults to 16.
+        out_channels (int): Number of output channels, defaults to in_channels.
+        sample_rate_out (float): Output sample rate, defaults to sample_rate_in.
+        out_precision (int): Output precision, defaults to in_precision.
+        dtype (np.dtype): dtype of the returned arrays.
+        layout (str): 'channels_first' for chunks of shape (channels,
+            frames), the outputs are returned the same way.
+    """
+    def __init__(self, sample_rate_in, sox_effects_chain, in_channels=1,
+                 in_precision=16, out_channels=None, sample_rate_out=None,
+                 out_precision=None, dtype=np.float64,
+                 layout='channels_last'):
+        from . import _soxbindings
+
+        if layout not in LAYOUTS:
+            raise ValueError(f"layout must be one of {', '.join(LAYOUTS)}")
+        # the chain holds a reference to libsox until it is closed
+        self._sox = _using_sox()
+        self._sox.__enter__()
+
+        if out_channels is None:
+            out_channels = in_channels
+        input_signal_info, target_signal_info, target_encoding = _signal_infos(
+            sample_rate_in, in_channels, SOX_UNSPEC, in_precision,
+            out_channels, sample_rate_out, out_precision
+        )
+        try:
+            self._chain = _soxbindings.StreamingEffects(
+                input_signal_info, target_signal_info, target_encoding,
+                sox_effects_chain, MAX_NUM_EFFECTS_ARGS, np.dtype(dtype)
+            )
+        except Exception:
+            self.close()
+            raise
+        self.in_channels = in_channels
+        self.layout = layout
+        self.out_channels = self._chain.channels
+        self.sample_rate = self._chain.sample_rate
+
+    def push(self, chunk):
+        """Processes a chunk of shape (frames, channels) and returns the
+        output it produced. Effects with latency may return fewer frames
+        than they were given, the rest comes out of later calls.
+        """
+        if self._chain is None:
+            raise RuntimeError("StreamingEffects is closed")
+        chunk = _as_frames(chunk, self.layout)
+        return _to_layout(
+            self._chain.push(chunk), self.out_channels, self.layout)
+
+    def flush(self):
+        """Ends the input, drains the tails of the effects and closes the
+        chain. Returns the remaining output.
+        """
+        if self._chain is None:
+            raise RuntimeError("StreamingEffects is closed")
+        data = _to_layout(
+            self._chain.flush(), self.out_channels, self.layout)
+        self.close()
+        return data
+
+    def close(self):
+        self._chain = None
+        if self._sox is not None:
+            self._sox.__exit__(None, None, None)
+            self._sox = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
 
 def SoxEffect():
     r"""Create an object for passing sox effect information between python and c++
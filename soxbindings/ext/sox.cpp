@@ -2,6 +2,18 @@
 #include <pybind11/stl.h>
 #include <pybind11/numpy.h>
 #include <sox.h>
+#include <algorithm>
+#include <atomic>
+#include <chrono>
+#include <condition_variable>
+#include <cstdio>
+#include <cstring>
+#include <exception>
+#include <limits>
+#include <map>
+#include <memory>
+#include <mutex>
+#include <thread>
 #include <sstream>
 
 namespace py = pybind11;
@@ -37,13 +49,377 @@ struct SoxEffect {
   std::vector<std::string> effect_args;
 };
 
-int64_t write_audio(SoxDescriptor& fd, py::array data) {
-  std::vector<sox_sample_t> buffer(data.size());
-  const sox_sample_t* data_ptr = static_cast<const sox_sample_t*>(data.data());
-  std::copy(data_ptr, data_ptr + data.size(), buffer.begin());
+/// Sample formats that can be exchanged with numpy without going through
+/// an intermediate array.
+enum class SampleType { Int16, Int32, Float32, Float64 };
+
+/// Same as dtype == other in numpy. Equal dtypes aren't always the same
+/// object, e.g. after pickling or with metadata attached.
+bool same_dtype(const py::dtype& dtype, const py::dtype& other) {
+  const int equal = PyObject_RichCompareBool(dtype.ptr(), other.ptr(), Py_EQ);
+  if (equal < 0) {
+    throw py::error_already_set();
+  }
+  return equal == 1;
+}
+
+SampleType get_sample_type(const py::dtype& dtype) {
+  if (same_dtype(dtype, py::dtype::of<int16_t>())) return SampleType::Int16;
+  if (same_dtype(dtype, py::dtype::of<int32_t>())) return SampleType::Int32;
+  if (same_dtype(dtype, py::dtype::of<float>())) return SampleType::Float32;
+  if (same_dtype(dtype, py::dtype::of<double>())) return SampleType::Float64;
+  throw std::invalid_argument(
+    "Unsupported dtype, expected one of int16, int32, float32, float64");
+}
+
+/// Converts a float in [-1, 1) to a sox sample, truncating like numpy's
+/// astype(np.int32) but clipping instead of wrapping around.
+template <typename T>
+inline sox_sample_t float_to_sample(T value) {
+  const double scaled = static_cast<double>(value) * 2147483648.0;
+  if (scaled >= 2147483647.0) return SOX_SAMPLE_MAX;
+  if (scaled <= -2147483648.0) return SOX_SAMPLE_MIN;
+  if (scaled != scaled) return 0;
+  return static_cast<sox_sample_t>(scaled);
+}
+
+/// Converts `length` samples of type `type` starting at `data` to sox samples.
+void to_sox_samples(
+    const void* data, SampleType type, size_t length, sox_sample_t* out) {
+  switch (type) {
+    case SampleType::Int16: {
+      const int16_t* in = static_cast<const int16_t*>(data);
+      for (size_t i = 0; i < length; ++i) {
+        out[i] = static_cast<sox_sample_t>(in[i]) * (1 << 16);
+      }
+      break;
+    }
+    case SampleType::Int32: {
+      const sox_sample_t* in = static_cast<const sox_sample_t*>(data);
+      std::copy(in, in + length, out);
+      break;
+    }
+    case SampleType::Float32: {
+      const float* in = static_cast<const float*>(data);
+      for (size_t i = 0; i < length; ++i) out[i] = float_to_sample(in[i]);
+      break;
+    }
+    case SampleType::Float64: {
+      const double* in = static_cast<const double*>(data);
+      for (size_t i = 0; i < length; ++i) out[i] = float_to_sample(in[i]);
+      break;
+    }
+  }
+}
+
+size_t sample_size(SampleType type) {
+  switch (type) {
+    case SampleType::Int16: return sizeof(int16_t);
+    case SampleType::Int32: return sizeof(int32_t);
+    case SampleType::Float32: return sizeof(float);
+    case SampleType::Float64: return sizeof(double);
+  }
+  return 0;
+}
+
+/// Converts `length` sox samples to `type`, writing them to `out`. Integer
+/// outputs are rounded and clipped like the sox encoders do.
+void from_sox_samples(
+    const sox_sample_t* in, size_t length, SampleType type, void* out) {
+  switch (type) {
+    case SampleType::Int16: {
+      int16_t* o = static_cast<int16_t*>(out);
+      for (size_t i = 0; i < length; ++i) {
+        o[i] = in[i] > SOX_SAMPLE_MAX - (1 << 15) ?
+          INT16_MAX : static_cast<int16_t>((in[i] + (1 << 15)) >> 16);
+      }
+      break;
+    }
+    case SampleType::Int32: {
+      std::copy(in, in + length, static_cast<sox_sample_t*>(out));
+      break;
+    }
+    case SampleType::Float32: {
+      float* o = static_cast<float*>(out);
+      for (size_t i = 0; i < length; ++i) {
+        o[i] = static_cast<float>(in[i] / 2147483648.0);
+      }
+      break;
+    }
+    case SampleType::Float64: {
+      double* o = static_cast<double*>(out);
+      for (size_t i = 0; i < length; ++i) o[i] = in[i] / 2147483648.0;
+      break;
+    }
+  }
+}
+
+py::dtype get_dtype(SampleType type) {
+  switch (type) {
+    case SampleType::Int16: return py::dtype::of<int16_t>();
+    case SampleType::Int32: return py::dtype::of<int32_t>();
+    case SampleType::Float32: return py::dtype::of<float>();
+    case SampleType::Float64: return py::dtype::of<double>();
+  }
+  return py::dtype::of<double>();
+}
+
+/// Growable buffer holding samples in the dtype requested from Python.
+/// Samples are converted once as they are appended and the memory is
+/// handed to numpy without a copy.
+class SampleBuffer {
+ public:
+  explicit SampleBuffer(SampleType type) : type_(type), size_(0) {}
+
+  void reserve(size_t length) {
+    bytes_.reserve(length * sample_size(type_));
+  }
+
+  void append(const sox_sample_t* samples, size_t length) {
+    // convert through a small block so the buffer only grows, it is never
+    // zero-filled first
+    alignas(8) char block[kBlockSize * sizeof(double)];
+    const size_t item_size = sample_size(type_);
+    while (length > 0) {
+      const size_t n = std::min(length, kBlockSize);
+      from_sox_samples(samples, n, type_, block);
+      bytes_.insert(bytes_.end(), block, block + n * item_size);
+      samples += n;
+      length -= n;
+      size_ += n;
+    }
+  }
+
+  size_t size() const { return size_; }
+  SampleType type() const { return type_; }
+
+  /// Moves the samples into a 1D numpy array. Needs the GIL.
+  py::array release() {
+    auto* owned = new std::vector<char>(std::move(bytes_));
+    py::capsule free_when_done(owned, [](void* ptr) {
+      delete static_cast<std::vector<char>*>(ptr);
+    });
+    const size_t length = size_;
+    size_ = 0;
+    return py::array(
+      get_dtype(type_), {length}, {sample_size(type_)},
+      owned->data(), free_when_done);
+  }
+
+ private:
+  static constexpr size_t kBlockSize = 4096;
+  SampleType type_;
+  std::vector<char> bytes_;
+  size_t size_;
+};
+
+/// Interleaved samples owned by the caller (usually a pinned numpy array)
+/// that are fed to the start of an effects chain. With columns set the
+/// samples aren't contiguous: sample i is at row i / columns and column
+/// i % columns of a 2D array with the given byte strides, e.g. the
+/// transposed view of a channel-first array.
+struct InputSource {
+  const void* data;
+  SampleType type;
+  size_t length;
+  size_t position;
+  size_t columns;
+  ptrdiff_t row_stride;
+  ptrdiff_t column_stride;
+};
+
+/// Describes the samples of a 1D or 2D array of any strides, in C order.
+/// Needs the GIL.
+InputSource input_source(const py::array& array) {
+  InputSource source = {
+    array.data(), get_sample_type(array.dtype()),
+    static_cast<size_t>(array.size()), 0, 0, 0, 0};
+  if (array.ndim() > 2) {
+    throw std::invalid_argument("Expected a 1D or 2D array");
+  }
+  if (!(array.flags() & py::array::c_style)) {
+    source.columns = array.ndim() == 2 ? array.shape(1) : 1;
+    source.row_stride = array.strides(0);
+    source.column_stride = array.ndim() == 2 ? array.strides(1) : 0;
+  }
+  return source;
+}
+
+template <typename T>
+inline sox_sample_t to_sox_sample(T value) { return float_to_sample(value); }
+inline sox_sample_t to_sox_sample(int16_t value) {
+  return static_cast<sox_sample_t>(value) * (1 << 16);
+}
+inline sox_sample_t to_sox_sample(int32_t value) { return value; }
+
+template <typename T>
+void strided_to_sox_samples(
+    const InputSource& source, size_t length, sox_sample_t* out) {
+  const char* data = static_cast<const char*>(source.data);
+  size_t row = source.position / source.columns;
+  size_t column = source.position % source.columns;
+  for (size_t i = 0; i < length; ++i) {
+    T value;
+    std::memcpy(&value,
+                data + static_cast<ptrdiff_t>(row) * source.row_stride +
+                  static_cast<ptrdiff_t>(column) * source.column_stride,
+                sizeof(T));
+    out[i] = to_sox_sample(value);
+    if (++column == source.columns) {
+      column = 0;
+      ++row;
+    }
+  }
+}
+
+/// Converts up to `length` of the next samples of source to sox samples
+/// and returns how many were converted.
+size_t read_input(InputSource& source, size_t length, sox_sample_t* out) {
+  length = std::min(length, source.length - source.position);
+  if (source.columns == 0) {
+    const char* start = static_cast<const char*>(source.data) +
+      source.position * sample_size(source.type);
+    to_sox_samples(start, source.type, length, out);
+  } else {
+    switch (source.type) {
+      case SampleType::Int16:
+        strided_to_sox_samples<int16_t>(source, length, out);
+        break;
+      case SampleType::Int32:
+        strided_to_sox_samples<int32_t>(source, length, out);
+        break;
+      case SampleType::Float32:
+        strided_to_sox_samples<float>(source, length, out);
+        break;
+      case SampleType::Float64:
+        strided_to_sox_samples<double>(source, length, out);
+        break;
+    }
+  }
+  source.position += length;
+  return length;
+}
+
+static int input_source_drain(
+    sox_effect_t* effp,
+    sox_sample_t* obuf,
+    size_t* osamp) {
+  InputSource* source = static_cast<InputSource*>(effp->priv);
+  // only hand out whole frames
+  size_t n = *osamp - *osamp % effp->out_signal.channels;
+  n = read_input(*source, n, obuf);
+  *osamp = n;
+  return n ? SOX_SUCCESS : SOX_EOF;
+}
+
+static const sox_effect_handler_t* input_source_handler() {
+  static sox_effect_handler_t handler = {
+    /*name=*/"input_source",
+    /*usage=*/nullptr,
+    /*flags=*/SOX_EFF_MCHAN | SOX_EFF_MODIFY,
+    /*getopts=*/nullptr,
+    /*start=*/nullptr,
+    /*flow=*/nullptr,
+    /*drain=*/input_source_drain,
+    /*stop=*/nullptr,
+    /*kill=*/nullptr,
+    /*priv_size=*/sizeof(InputSource)
+  };
+  return &handler;
+}
+
+/// In-memory destination for the samples leaving an effects chain.
+/// Samples are quantized to `precision` bits the same way an encoder with
+/// that bit depth would, so results match writing to and re-reading a file.
+struct OutputSink {
+  SampleBuffer* buffer;
+  unsigned precision;
+  sox_uint64_t clips;
+};
+
+static int output_sink_flow(
+    sox_effect_t* effp,
+    const sox_sample_t* ibuf,
+    sox_sample_t* obuf,
+    size_t* isamp,
+    size_t* osamp) {
+  OutputSink* sink = static_cast<OutputSink*>(effp->priv);
+
+  if (sink->precision > 0 && sink->precision < 32) {
+    const unsigned shift = 32 - sink->precision;
+    const sox_sample_t half = 1u << (shift - 1);
+    const sox_sample_t mask = ~((1u << shift) - 1);
+    const sox_sample_t max_value = SOX_SAMPLE_MAX & mask;
+    sox_sample_t block[4096];
+    for (size_t start = 0; start < *isamp; start += 4096) {
+      const size_t n = std::min<size_t>(*isamp - start, 4096);
+      for (size_t i = 0; i < n; ++i) {
+        sox_sample_t d = ibuf[start + i];
+        if (d > SOX_SAMPLE_MAX - half) {
+          block[i] = max_value;
+          if (d != max_value) ++sink->clips;
+        } else {
+          block[i] = (d + half) & mask;
+        }
+      }
+      sink->buffer->append(block, n);
+    }
+  } else {
+    sink->buffer->append(ibuf, *isamp);
+  }
+  // the sink is always the last effect, nothing is passed on
+  *osamp = 0;
+  return SOX_SUCCESS;
+}
+
+static const sox_effect_handler_t* output_sink_handler() {
+  static sox_effect_handler_t handler = {
+    /*name=*/"output_sink",
+    /*usage=*/nullptr,
+    /*flags=*/SOX_EFF_MCHAN,
+    /*getopts=*/nullptr,
+    /*start=*/nullptr,
+    /*flow=*/output_sink_flow,
+    /*drain=*/nullptr,
+    /*stop=*/nullptr,
+    /*kill=*/nullptr,
+    /*priv_size=*/sizeof(OutputSink)
+  };
+  return &handler;
+}
 
-  const auto samples_written =
-      sox_write(fd.get(), buffer.data(), buffer.size());
+/// Estimates the number of output samples of an effects chain from the
+/// effects that change the length of the signal in a predictable way.
+/// Only used to size the output buffer up front, so it may be off.
+int64_t estimate_output_length(
+    int64_t input_length,
+    const sox_signalinfo_t* input_signal,
+    const sox_signalinfo_t* target_signal,
+    const std::vector<SoxEffect>& effects) {
+  double estimate = static_cast<double>(input_length);
+  if (input_signal->rate > 0 && target_signal->rate > 0) {
+    estimate *= target_signal->rate / input_signal->rate;
+  }
+  if (input_signal->channels > 0 && target_signal->channels > 0) {
+    estimate *= static_cast<double>(target_signal->channels) / input_signal->channels;
+  }
+  for (const SoxEffect& effect : effects) {
+    if (effect.effect_name != "speed" || effect.effect_args.empty()) continue;
+    try {
+      double factor = std::stod(effect.effect_args[0]);
+      if (factor > 0) estimate /= factor;
+    } catch (const std::exception&) {
+      // speed given in cents, length change is not worth parsing for
+    }
+  }
+  return static_cast<int64_t>(estimate) + 1;
+}
+
+int64_t write_audio(
+    SoxDescriptor& fd,
+    const sox_sample_t* data,
+    size_t length) {
+  const auto samples_written = sox_write(fd.get(), data, length);
   return samples_written;
 }
 
@@ -58,6 +434,12 @@ void write_audio_file(
   si->mult = nullptr;
 #endif
 
+  // pin the samples while holding the GIL, sox only sees the raw pointer
+  const sox_sample_t* data_ptr = static_cast<const sox_sample_t*>(data.data());
+  const size_t length = data.size();
+
+  py::gil_scoped_release release;
+
   SoxDescriptor fd(sox_open_write(
       file_name.c_str(),
       si,
@@ -71,58 +453,162 @@ void write_audio_file(
         "Error writing audio file: could not open file for writing");
   }
 
-  const auto samples_written = write_audio(fd, data);
+  const auto samples_written = write_audio(fd, data_ptr, length);
 
-  if (samples_written != data.size()) {
+  if (static_cast<size_t>(samples_written) != length) {
     throw std::runtime_error(
         "Error writing audio file: could not write entire buffer");
   }
 }
 
-py::array read_audio(
+/// Decodes up to `length` samples into `out` (of type `type`), going through
+/// `block` unless the samples can be decoded in place. Returns the number of
+/// samples read, which is only short of `length` at the end of the file.
+size_t read_samples(
+    sox_format_t* fd,
+    void* out,
+    SampleType type,
+    size_t length,
+    std::vector<sox_sample_t>& block) {
+  size_t samples_read = 0;
+  while (samples_read < length) {
+    size_t got;
+    if (type == SampleType::Int32) {
+      got = sox_read(
+        fd, static_cast<sox_sample_t*>(out) + samples_read,
+        length - samples_read);
+    } else {
+      const size_t n = std::min(block.size(), length - samples_read);
+      got = sox_read(fd, block.data(), n);
+      from_sox_samples(
+        block.data(), got, type,
+        static_cast<char*>(out) + samples_read * sample_size(type));
+    }
+    if (got == 0) break;
+    samples_read += got;
+  }
+  return samples_read;
+}
+
+/// Encodes `length` samples of type `type` from `data`, converting them
+/// through `block` unless they already are sox samples. Returns the number
+/// of samples written, which is only short of `length` on an error.
+size_t write_samples(
+    sox_format_t* fd,
+    const void* data,
+    SampleType type,
+    size_t length,
+    std::vector<sox_sample_t>& block) {
+  if (type == SampleType::Int32) {
+    return sox_write(fd, static_cast<const sox_sample_t*>(data), length);
+  }
+  const char* in = static_cast<const char*>(data);
+  size_t samples_written = 0;
+  while (samples_written < length) {
+    const size_t n = std::min(block.size(), length - samples_written);
+    to_sox_samples(in + samples_written * sample_size(type), type, n,
+                   block.data());
+    const size_t written = sox_write(fd, block.data(), n);
+    samples_written += written;
+    if (written != n) break;
+  }
+  return samples_written;
+}
+
+/// Same as read_samples above, appending to a growable buffer.
+size_t read_samples(
+    sox_format_t* fd,
+    SampleBuffer& buffer,
+    size_t length,
+    std::vector<sox_sample_t>& block) {
+  size_t samples_read = 0;
+  while (samples_read < length) {
+    const size_t n = std::min(block.size(), length - samples_read);
+    const size_t got = sox_read(fd, block.data(), n);
+    if (got == 0) break;
+    buffer.append(block.data(), got);
+    samples_read += got;
+  }
+  return samples_read;
+}
+
+void read_audio(
     SoxDescriptor& fd,
-    int64_t buffer_length) {
-  std::vector<sox_sample_t> buffer(buffer_length);
+    int64_t buffer_length,
+    SampleBuffer& buffer) {
+  // decode in blocks of whole frames, converting each block to the
+  // requested dtype as it arrives
+  const size_t channels = std::max<size_t>(fd->signal.channels, 1);
+  std::vector<sox_sample_t> block(channels * 4096);
+  buffer.reserve(buffer_length);
 
-  int number_of_channels = fd->signal.channels;
-  const int64_t samples_read = sox_read(fd.get(), buffer.data(), buffer_length);
+  int64_t samples_read = read_samples(fd.get(), buffer, buffer_length, block);
   if (samples_read == 0) {
     throw std::runtime_error(
         "Error reading audio file: empty file or read failed in sox_read");
   }
-  return py::array(buffer.size(), buffer.data());
+  // keep the promised length if the decoder came up short
+  std::fill(block.begin(), block.end(), 0);
+  while (samples_read < buffer_length) {
+    const size_t n = std::min<int64_t>(block.size(), buffer_length - samples_read);
+    buffer.append(block.data(), n);
+    samples_read += n;
+  }
 }
 
-std::tuple<int, int, py::array> read_audio_file(
-    const std::string& file_name,
+/// Reads up to nframes frames (all of them if 0) from offset into buffer.
+/// Touches no Python objects.
+void read_frames(
+    SoxDescriptor& fd,
     int64_t nframes,
     int64_t offset,
-    sox_signalinfo_t* si,
-    sox_encodinginfo_t* ei,
-    const char* ft) {
-
-  SoxDescriptor fd(sox_open_read(file_name.c_str(), si, ei, ft));
-  if (fd.get() == nullptr) {
-    throw std::runtime_error("Error opening audio file");
-  }
-
-  // signal info
-
+    SampleBuffer& buffer) {
   const int number_of_channels = fd->signal.channels;
-  const int sample_rate = fd->signal.rate;
+  if (fd->encoding.encoding == SOX_ENCODING_MP3) {
+    // libsox rounds the length of an MP3 down to whole milliseconds (or
+    // guesses it from the bitrate), decode it to the end instead
+    fd->signal.length = SOX_UNSPEC;
+  }
   const int64_t total_length = fd->signal.length;
 
   // multiply offset and number of frames by number of channels
   offset *= number_of_channels;
   nframes *= number_of_channels;
 
-  if (total_length == 0) {
-    throw std::runtime_error("Error reading audio file: unknown length");
-  }
-  if (offset > total_length) {
+  if (total_length > 0 && offset > total_length) {
     throw std::runtime_error("Offset past EOF");
   }
 
+  // seek to offset point before reading data, in-memory streams can't
+  // seek so decode up to the offset instead
+  if (offset > 0 && sox_seek(fd.get(), offset, SOX_SEEK_SET) == SOX_EOF) {
+    if (fd->seekable) {
+      throw std::runtime_error("sox_seek reached EOF, try reducing offset or num_samples");
+    }
+    std::vector<sox_sample_t> skipped(std::min<int64_t>(offset, 1 << 16));
+    while (offset > 0) {
+      const size_t n = sox_read(
+        fd.get(), skipped.data(), std::min<int64_t>(offset, skipped.size()));
+      if (n == 0) {
+        throw std::runtime_error("Offset past EOF");
+      }
+      offset -= n;
+    }
+  }
+
+  if (total_length == 0) {
+    // unknown length (e.g. an MP3 in memory), decode up to nframes or the
+    // end of the stream, whichever comes first
+    std::vector<sox_sample_t> block(
+      std::max<size_t>(number_of_channels, 1) * 4096);
+    const size_t length = nframes > 0 ? nframes : std::numeric_limits<size_t>::max();
+    if (read_samples(fd.get(), buffer, length, block) == 0) {
+      throw std::runtime_error(
+          "Error reading audio file: empty file or offset past EOF");
+    }
+    return;
+  }
+
   // calculate buffer length
   int64_t buffer_length = total_length;
   if (offset > 0) {
@@ -131,15 +617,312 @@ std::tuple<int, int, py::array> read_audio_file(
   if (nframes > 0 && buffer_length > nframes) {
       buffer_length = nframes;
   }
+  read_audio(fd, buffer_length, buffer);
+}
 
-  // seek to offset point before reading data
-  if (sox_seek(fd.get(), offset, 0) == SOX_EOF) {
-    throw std::runtime_error("sox_seek reached EOF, try reducing offset or num_samples");
+std::tuple<int, int, py::array> read_audio_file(
+    const std::string& file_name,
+    int64_t nframes,
+    int64_t offset,
+    sox_signalinfo_t* si,
+    sox_encodinginfo_t* ei,
+    const char* ft,
+    const py::dtype& dtype) {
+
+  int number_of_channels;
+  int sample_rate;
+  SampleBuffer buffer(get_sample_type(dtype));
+  {
+    py::gil_scoped_release release;
+
+    SoxDescriptor fd(sox_open_read(file_name.c_str(), si, ei, ft));
+    if (fd.get() == nullptr) {
+      throw std::runtime_error("Error opening audio file");
+    }
+    number_of_channels = fd->signal.channels;
+    sample_rate = fd->signal.rate;
+    read_frames(fd, nframes, offset, buffer);
   }
 
-  return std::make_tuple(sample_rate, number_of_channels, read_audio(fd, buffer_length));
+  return std::make_tuple(sample_rate, number_of_channels, buffer.release());
+}
+
+/// libsox reads and writes memory through fmemopen and open_memstream,
+/// which can't be relied on in the macOS builds, so the in-memory
+/// functions aren't offered there.
+void require_memory_streams() {
+#ifdef __APPLE__
+  throw std::runtime_error(
+    "Reading and writing audio in memory is not supported on macOS");
+#endif
 }
 
+/// Pins the bytes of any buffer protocol object, without copying them.
+struct PinnedBytes {
+  explicit PinnedBytes(const py::buffer& buffer)
+      : info(buffer.request()) {
+    // the bytes are handed to libsox as one block, so every dimension has
+    // to be laid out in C order, 1D views like memoryview(b)[::2] included
+    ssize_t stride = info.itemsize;
+    for (ssize_t i = info.ndim - 1; i >= 0; --i) {
+      if (info.shape[i] > 1 && info.strides[i] != stride) {
+        throw std::invalid_argument("buffer must be contiguous");
+      }
+      stride *= info.shape[i];
+    }
+  }
+  void* data() const { return info.ptr; }
+  size_t size() const { return info.size * info.itemsize; }
+
+  py::buffer_info info;
+};
+
+/// Same as read_audio_file, for an encoded file held in memory.
+std::tuple<int, int, py::array> read_audio_bytes(
+    const py::buffer& data,
+    int64_t nframes,
+    int64_t offset,
+    sox_signalinfo_t* si,
+    sox_encodinginfo_t* ei,
+    const char* ft,
+    const py::dtype& dtype) {
+
+  require_memory_streams();
+  PinnedBytes bytes(data);
+  int number_of_channels;
+  int sample_rate;
+  SampleBuffer buffer(get_sample_type(dtype));
+  {
+    py::gil_scoped_release release;
+
+    SoxDescriptor fd(sox_open_mem_read(bytes.data(), bytes.size(), si, ei, ft));
+    if (fd.get() == nullptr) {
+      throw std::runtime_error("Error opening audio from memory");
+    }
+    number_of_channels = fd->signal.channels;
+    sample_rate = fd->signal.rate;
+    read_frames(fd, nframes, offset, buffer);
+  }
+
+  return std::make_tuple(sample_rate, number_of_channels, buffer.release());
+}
+
+struct FlowTarget;
+struct FlowStats;
+
+/// Decoding session that stays open between calls, so a file can be read
+/// block by block with bounded memory.
+class SoxReader {
+ public:
+  SoxReader(
+      const std::string& file_name,
+      sox_signalinfo_t* si,
+      sox_encodinginfo_t* ei,
+      const char* ft) {
+    py::gil_scoped_release release;
+    fd_.reset(new SoxDescriptor(sox_open_read(file_name.c_str(), si, ei, ft)));
+    if (fd_->get() == nullptr) {
+      throw std::runtime_error("Error opening audio file");
+    }
+    block_.resize(std::max<size_t>((*fd_)->signal.channels, 1) * 4096);
+    // not every handler sets data_start (or keeps tell_off up to date while
+    // skipping chunks), but opening a file leaves it at the first sample
+    data_start_ = (*fd_)->data_start;
+    if (data_start_ == 0 && (*fd_)->seekable && (*fd_)->fp != nullptr) {
+      data_start_ = std::ftell(static_cast<FILE*>((*fd_)->fp));
+    }
+  }
+
+  int sample_rate() { return get()->signal.rate; }
+  int channels() { return get()->signal.channels; }
+  /// Number of frames in the file, 0 if unknown.
+  int64_t length() {
+    sox_format_t* fd = get();
+    return fd->signal.channels ? fd->signal.length / fd->signal.channels : 0;
+  }
+  sox_signalinfo_t signal() { return get()->signal; }
+  sox_encodinginfo_t encoding() { return get()->encoding; }
+  /// Byte offset of the first sample in the file, for formats whose samples
+  /// are read as they are stored.
+  int64_t data_start() { get(); return data_start_; }
+  bool seekable() { return get()->seekable; }
+
+  void seek(int64_t offset) {
+    sox_format_t* fd = get();
+    py::gil_scoped_release release;
+    at_start_ = false;
+    offset *= fd->signal.channels;
+    // some handlers seek past the end without complaint, same check as
+    // read_frames (the length of an MP3 is only an estimate)
+    if (fd->encoding.encoding != SOX_ENCODING_MP3 &&
+        fd->signal.length > 0 && offset > int64_t(fd->signal.length)) {
+      throw std::runtime_error("Offset past EOF");
+    }
+    if (sox_seek(fd, offset, SOX_SEEK_SET) == SOX_EOF) {
+      throw std::runtime_error("sox_seek reached EOF, try reducing offset");
+    }
+  }
+
+  /// Reads up to `nframes` frames into a new array of type `dtype`.
+  py::array read(int64_t nframes, const py::dtype& dtype) {
+    sox_format_t* fd = get();
+    SampleBuffer buffer(get_sample_type(dtype));
+    at_start_ = false;
+    {
+      py::gil_scoped_release release;
+      const size_t length = nframes * fd->signal.channels;
+      buffer.reserve(length);
+      read_samples(fd, buffer, length, block_);
+    }
+    return buffer.release();
+  }
+
+  /// Reads as many whole frames as fit into `out`, a C-contiguous array,
+  /// and returns how many frames were read.
+  int64_t read_into(py::array out) {
+    sox_format_t* fd = get();
+    if (!(out.flags() & py::array::c_style) || !out.writeable()) {
+      throw std::invalid_argument("out must be a writeable C-contiguous array");
+    }
+    const SampleType type = get_sample_type(out.dtype());
+    const size_t channels = std::max<size_t>(fd->signal.channels, 1);
+    const size_t length = out.size() - out.size() % channels;
+    void* data = out.mutable_data();
+    at_start_ = false;
+
+    size_t samples_read;
+    {
+      py::gil_scoped_release release;
+      samples_read = read_samples(fd, data, type, length, block_);
+    }
+    return samples_read / channels;
+  }
+
+  /// Runs an effects chain over the rest of the file, see the definitions.
+  std::tuple<int, int, py::array> flow_effects(
+      sox_signalinfo_t* input_signal,
+      sox_signalinfo_t* target_signal,
+      sox_encodinginfo_t* target_encoding,
+      std::vector<SoxEffect> effects,
+      int max_num_effect_args,
+      const py::dtype& output_dtype,
+      FlowStats* stats);
+  std::tuple<int, int, int64_t> flow_effects_to_file(
+      const std::string& output_file,
+      sox_signalinfo_t* input_signal,
+      sox_signalinfo_t* target_signal,
+      sox_encodinginfo_t* target_encoding,
+      const char* file_type,
+      std::vector<SoxEffect> effects,
+      int max_num_effect_args,
+      FlowStats* stats);
+
+  void close() { fd_.reset(); }
+
+  /// The open file, for combining it with other inputs from where it is.
+  sox_format_t* format() {
+    at_start_ = false;
+    return get();
+  }
+
+ private:
+  sox_format_t* get() {
+    if (!fd_) {
+      throw std::runtime_error("Reading from a closed file");
+    }
+    return fd_->get();
+  }
+
+  template <typename AddOutput>
+  FlowTarget flow_from_file(
+      const sox_signalinfo_t* input_signal,
+      const sox_signalinfo_t* target_signal,
+      const sox_encodinginfo_t* target_encoding,
+      const std::vector<SoxEffect>& effects,
+      int max_num_effect_args,
+      FlowStats* stats,
+      AddOutput add_output);
+
+  std::unique_ptr<SoxDescriptor> fd_;
+  std::vector<sox_sample_t> block_;
+  // nothing has been read or seeked yet, see flow_effects
+  bool at_start_ = true;
+  int64_t data_start_ = 0;
+};
+
+/// Encoding session that stays open between calls, so audio can be written
+/// chunk by chunk with bounded memory.
+class SoxWriter {
+ public:
+  SoxWriter(
+      const std::string& file_name,
+      sox_signalinfo_t* si,
+      sox_encodinginfo_t* ei,
+      const char* ft) {
+#if SOX_LIB_VERSION_CODE >= 918272 // >= 14.3.0
+    si->mult = nullptr;
+#endif
+    py::gil_scoped_release release;
+    fd_.reset(new SoxDescriptor(sox_open_write(
+        file_name.c_str(), si, ei, ft, /*oob=*/nullptr, /*overwrite=*/nullptr)));
+    if (fd_->get() == nullptr) {
+      throw std::runtime_error(
+          "Error writing audio file: could not open file for writing");
+    }
+    channels_ = std::max<unsigned>((*fd_)->signal.channels, 1);
+    block_.resize(channels_ * 4096);
+  }
+
+  /// Encodes a C-contiguous chunk of interleaved samples of any of the
+  /// native dtypes, converting through a small block rather than a full
+  /// copy. Returns the number of frames written.
+  int64_t write(py::array chunk) {
+    sox_format_t* fd = get();
+    if (!(chunk.flags() & py::array::c_style)) {
+      throw std::invalid_argument("chunk must be C-contiguous");
+    }
+    if (chunk.size() % channels_ != 0) {
+      throw std::invalid_argument("chunk must hold whole frames");
+    }
+    const SampleType type = get_sample_type(chunk.dtype());
+    const void* data = chunk.data();
+    const size_t length = chunk.size();
+
+    size_t samples_written = 0;
+    {
+      py::gil_scoped_release release;
+      samples_written = write_samples(fd, data, type, length, block_);
+    }
+    frames_written_ += samples_written / channels_;
+    if (samples_written != length) {
+      throw std::runtime_error(
+          "Error writing audio file: could not write entire buffer");
+    }
+    return length / channels_;
+  }
+
+  int64_t frames_written() const { return frames_written_; }
+
+  /// Closes the file, which finishes its header.
+  void close() {
+    py::gil_scoped_release release;
+    fd_.reset();
+  }
+
+ private:
+  sox_format_t* get() {
+    if (!fd_) {
+      throw std::runtime_error("Writing to a closed file");
+    }
+    return fd_->get();
+  }
+
+  std::unique_ptr<SoxDescriptor> fd_;
+  std::vector<sox_sample_t> block_;
+  unsigned channels_ = 1;
+  int64_t frames_written_ = 0;
+};
+
 std::vector<std::string> get_effect_names() {
   sox_effect_fn_t const * fns = sox_get_effect_fns();
   std::vector<std::string> sv;
@@ -154,6 +937,7 @@ std::vector<std::string> get_effect_names() {
 std::tuple<sox_signalinfo_t, sox_encodinginfo_t> get_info(
     const std::string& file_name
   ) {
+  py::gil_scoped_release release;
   SoxDescriptor fd(sox_open_read(
       file_name.c_str(),
       /*signal=*/nullptr,
@@ -165,154 +949,1199 @@ std::tuple<sox_signalinfo_t, sox_encodinginfo_t> get_info(
   return std::make_tuple(fd->signal, fd->encoding);
 }
 
+/// Same as get_info, for an encoded file held in memory.
+std::tuple<sox_signalinfo_t, sox_encodinginfo_t> get_info_bytes(
+    const py::buffer& data,
+    const char* ft) {
+  require_memory_streams();
+  PinnedBytes bytes(data);
+  py::gil_scoped_release release;
+  SoxDescriptor fd(sox_open_mem_read(
+      bytes.data(), bytes.size(), /*signal=*/nullptr, /*encoding=*/nullptr, ft));
+  if (fd.get() == nullptr) {
+    throw std::runtime_error("Error opening audio from memory");
+  }
+  return std::make_tuple(fd->signal, fd->encoding);
+}
+
+/// Same as write_audio_file, but encodes into memory and returns the bytes.
+/// data can be of any of the native dtypes.
+py::bytes write_audio_bytes(
+    const py::array& data,
+    sox_signalinfo_t* si,
+    sox_encodinginfo_t* ei,
+    const char* file_type) {
+  require_memory_streams();
+
+#if SOX_LIB_VERSION_CODE >= 918272 // >= 14.3.0
+  si->mult = nullptr;
+#endif
+
+  const SampleType type = get_sample_type(data.dtype());
+  const void* data_ptr = data.data();
+  const size_t length = data.size();
+  // converted a block at a time while encoding, never the whole array
+  std::vector<sox_sample_t> block(std::max<size_t>(si->channels, 1) * 4096);
+  char* encoded = nullptr;
+  size_t encoded_size = 0;
+  // the stream allocates encoded and only settles it once closed, free it
+  // on the way out whatever happens
+  std::unique_ptr<char*, void (*)(char**)> free_encoded(
+      &encoded, [](char** ptr) { free(*ptr); });
+  {
+    py::gil_scoped_release release;
+    // the stream can't seek back to fix up headers, so si->length has to
+    // hold the full length up front
+    SoxDescriptor fd(sox_open_memstream_write(
+        &encoded, &encoded_size, si, ei, file_type, /*oob=*/nullptr));
+    if (fd.get() == nullptr) {
+      throw std::runtime_error(
+          "Error writing audio: could not open memory stream for writing");
+    }
+    // libsox guesses seekable from fstat, which a memory stream has no
+    // file for; a handler that seeks back to finish its header (e.g. flac)
+    // would leave the stream's size at the header
+    fd->seekable = sox_false;
+    if (write_samples(fd.get(), data_ptr, type, length, block) != length) {
+      throw std::runtime_error(
+          "Error writing audio: could not write entire buffer");
+    }
+  }
+  return py::bytes(encoded, encoded_size);
+}
+
+/// Helper struct to safely delete a sox_effects_chain_t.
+struct SoxEffectsChain {
+  SoxEffectsChain(
+      const sox_encodinginfo_t* in_enc,
+      const sox_encodinginfo_t* out_enc)
+      : chain_(sox_create_effects_chain(in_enc, out_enc)) {}
+  SoxEffectsChain(const SoxEffectsChain& other) = delete;
+  SoxEffectsChain& operator=(const SoxEffectsChain& other) = delete;
+  ~SoxEffectsChain() {
+    if (chain_ != nullptr) {
+      sox_delete_effects_chain(chain_);
+    }
+  }
+  sox_effects_chain_t* get() noexcept {
+    return chain_;
+  }
+
+ private:
+  sox_effects_chain_t* chain_;
+};
+
+/// Wall time, samples and clips of one effect, over one run of a chain or,
+/// in the process-wide profile, summed over every run.
+struct EffectStats {
+  std::string name;
+  /// Runs of a chain this covers.
+  uint64_t chains = 0;
+  /// Calls to the effect's flow and drain functions.
+  uint64_t calls = 0;
+  double seconds = 0;
+  uint64_t samples_in = 0;
+  uint64_t samples_out = 0;
+  uint64_t clips = 0;
+  /// Largest number of samples taken or produced in one call.
+  size_t max_block = 0;
+
+  void add(const EffectStats& other) {
+    chains += other.chains;
+    calls += other.calls;
+    seconds += other.seconds;
+    samples_in += other.samples_in;
+    samples_out += other.samples_out;
+    clips += other.clips;
+    max_block = std::max(max_block, other.max_block);
+  }
+};
+
+/// Per-effect stats of one run of a chain, in chain order including the
+/// effects that read the input and collect the output.
+struct FlowStats {
+  std::vector<EffectStats> effects;
+  /// Samples in the buffer between two effects.
+  size_t buffer_size = 0;
+};
+
+std::atomic<bool> profiling_enabled(false);
+std::mutex profile_mutex;
+std::map<std::string, EffectStats> profile_totals;
+
+/// Original handlers and stats of the chain being run on this thread, the
+/// timing trampolines below find their effect through it.
+struct ChainProfile {
+  sox_effects_chain_t* chain;
+  std::vector<sox_effect_handler_t> handlers;
+  std::vector<EffectStats> stats;
+
+  size_t index(const sox_effect_t* effp) const {
+    for (size_t i = 0; i < chain->length; ++i) {
+      const sox_effect_t* flows = chain->effects[i];
+      if (effp >= flows && effp < flows + flows[0].flows) {
+        return i;
+      }
+    }
+    return 0;
+  }
+};
+
+thread_local ChainProfile* active_profile = nullptr;
+
+void record_call(
+    EffectStats& stats,
+    std::chrono::steady_clock::time_point start,
+    size_t samples_in,
+    size_t samples_out) {
+  stats.seconds += std::chrono::duration<double>(
+    std::chrono::steady_clock::now() - start).count();
+  ++stats.calls;
+  stats.samples_in += samples_in;
+  stats.samples_out += samples_out;
+  stats.max_block = std::max({stats.max_block, samples_in, samples_out});
+}
+
+static int profiled_flow(
+    sox_effect_t* effp,
+    const sox_sample_t* ibuf,
+    sox_sample_t* obuf,
+    size_t* isamp,
+    size_t* osamp) {
+  const size_t i = active_profile->index(effp);
+  const auto start = std::chrono::steady_clock::now();
+  const int status = active_profile->handlers[i].flow(
+    effp, ibuf, obuf, isamp, osamp);
+  record_call(active_profile->stats[i], start, *isamp, *osamp);
+  return status;
+}
+
+static int profiled_drain(
+    sox_effect_t* effp,
+    sox_sample_t* obuf,
+    size_t* osamp) {
+  const size_t i = active_profile->index(effp);
+  const auto start = std::chrono::steady_clock::now();
+  const int status = active_profile->handlers[i].drain(effp, obuf, osamp);
+  record_call(active_profile->stats[i], start, 0, *osamp);
+  return status;
+}
+
+/// Runs a chain, timing every effect when stats is given or profiling is
+/// enabled. Touches no Python objects.
+void run_chain(sox_effects_chain_t* chain, FlowStats* stats) {
+  // with libsox's own threads the trampolines wouldn't find the profile
+  if ((stats == nullptr && !profiling_enabled) ||
+      sox_get_globals()->use_threads) {
+    sox_flow_effects(chain, nullptr, nullptr);
+    return;
+  }
+
+  ChainProfile profile;
+  profile.chain = chain;
+  for (size_t i = 0; i < chain->length; ++i) {
+    sox_effect_t* flows = chain->effects[i];
+    profile.handlers.push_back(flows[0].handler);
+    EffectStats effect_stats;
+    effect_stats.name = flows[0].handler.name;
+    effect_stats.chains = 1;
+    profile.stats.push_back(effect_stats);
+    for (size_t f = 0; f < flows[0].flows; ++f) {
+      if (flows[f].handler.flow != nullptr) {
+        flows[f].handler.flow = profiled_flow;
+      }
+      if (flows[f].handler.drain != nullptr) {
+        flows[f].handler.drain = profiled_drain;
+      }
+    }
+  }
+
+  ChainProfile* outer = active_profile;
+  active_profile = &profile;
+  sox_flow_effects(chain, nullptr, nullptr);
+  active_profile = outer;
+
+  for (size_t i = 0; i < chain->length; ++i) {
+    sox_effect_t* flows = chain->effects[i];
+    for (size_t f = 0; f < flows[0].flows; ++f) {
+      flows[f].handler = profile.handlers[i];
+      profile.stats[i].clips += flows[f].clips;
+      // the in-memory sink counts its own clips so libsox doesn't warn
+      if (flows[f].handler.flow == output_sink_flow) {
+        profile.stats[i].clips += static_cast<OutputSink*>(flows[f].priv)->clips;
+      }
+    }
+  }
+
+  if (profiling_enabled) {
+    std::lock_guard<std::mutex> lock(profile_mutex);
+    for (const EffectStats& effect_stats : profile.stats) {
+      EffectStats& total = profile_totals[effect_stats.name];
+      total.name = effect_stats.name;
+      total.add(effect_stats);
+    }
+  }
+  if (stats != nullptr) {
+    stats->effects = std::move(profile.stats);
+    stats->buffer_size = sox_get_globals()->bufsiz;
+  }
+}
+
+sox_encodinginfo_t signed_encoding(unsigned bits_per_sample) {
+  sox_encodinginfo_t encoding;
+  encoding.encoding = SOX_ENCODING_SIGN2; // Sample format
+  encoding.bits_per_sample = bits_per_sample; // Bits per sample
+  encoding.compression = 0.0; // Compression factor
+  encoding.reverse_bytes = sox_option_default; // Should bytes be reversed
+  encoding.reverse_nibbles = sox_option_default; // Should nibbles be reversed
+  encoding.reverse_bits = sox_option_default; // Should bits be reversed (pairs of bits?)
+  encoding.opposite_endian = sox_false; // Reverse endianness
+  return encoding;
+}
+
+/// Signal info for samples fed to a chain from memory.
+sox_signalinfo_t source_signal_info(
+    const sox_signalinfo_t* input_signal, size_t length) {
+  sox_signalinfo_t signal = *input_signal;
+  signal.length = length;
+  if (signal.precision == 0) {
+    signal.precision = SOX_SAMPLE_PRECISION;
+  }
+#if SOX_LIB_VERSION_CODE >= 918272 // >= 14.3.0
+  signal.mult = nullptr;
+#endif
+  return signal;
+}
+
+/// The signal and encoding at the end of an effects chain.
+struct FlowTarget {
+  sox_signalinfo_t signal;
+  sox_encodinginfo_t encoding;
+};
+
+/// Fills in blank target info from the input and picks up the output rate
+/// and channels from rate and channels effects in the chain.
+FlowTarget resolve_target(
+    const sox_signalinfo_t* input_signal,
+    const sox_signalinfo_t* target_signal,
+    const sox_encodinginfo_t* target_encoding,
+    const std::vector<SoxEffect>& effects) {
+  FlowTarget target;
+  // set signalinfo and encodinginfo if blank
+  if (target_signal == nullptr) {
+    target.signal.rate = input_signal->rate;
+    target.signal.channels = input_signal->channels;
+    target.signal.precision = input_signal->precision;
+  } else {
+    target.signal = *target_signal;
+  }
+  target.signal.length = SOX_UNSPEC;
+#if SOX_LIB_VERSION_CODE >= 918272 // >= 14.3.0
+  target.signal.mult = nullptr;
+#endif
+  if (target_encoding == nullptr) {
+    target.encoding = signed_encoding(target.signal.precision);
+  } else {
+    target.encoding = *target_encoding;
+  }
+
+  // check for rate or channels effect and change the output signalinfo accordingly
+  for (const SoxEffect& effect : effects) {
+    if (effect.effect_name == "rate") {
+      target.signal.rate = std::stod(effect.effect_args.back());
+    } else if (effect.effect_name == "channels") {
+      target.signal.channels = std::stoi(effect.effect_args[0]);
+    }
+  }
+  return target;
+}
+
+/// Adds `effect` to the chain, handing it `handler_data` in its private area.
+/// Used for the effects defined here that move samples in and out of memory.
+template <typename T>
+void add_io_effect(
+    sox_effects_chain_t* chain,
+    const sox_effect_handler_t* handler,
+    const T& handler_data,
+    sox_signalinfo_t* interm_signal,
+    const sox_signalinfo_t* out_signal) {
+  sox_effect_t* e = sox_create_effect(handler);
+  *static_cast<T*>(e->priv) = handler_data;
+  sox_add_effect(chain, e, interm_signal, out_signal);
+  free(e);
+}
+
+/// Parses and adds the user's effects to the chain.
+void add_effects(
+    sox_effects_chain_t* chain,
+    const std::vector<SoxEffect>& effects,
+    sox_signalinfo_t* interm_signal,
+    const sox_signalinfo_t* output_signal,
+    int max_num_effect_args) {
+  for (const SoxEffect& tae : effects) {
+    if (tae.effect_name == "no_effects") break;
+    const sox_effect_handler_t* handler = sox_find_effect(tae.effect_name.c_str());
+    if (handler == nullptr) {
+      throw std::runtime_error("unknown effect: " + tae.effect_name);
+    }
+    if (tae.effect_args.size() > static_cast<size_t>(max_num_effect_args)) {
+      throw std::runtime_error("too many options for effect: " + tae.effect_name);
+    }
+    sox_effect_t* e = sox_create_effect(handler);
+    e->global_info->global_info->verbosity = 1;
+    int result;
+    if (tae.effect_args.empty() || tae.effect_args[0] == "") {
+      result = sox_effect_options(e, 0, nullptr);
+    } else {
+      std::vector<char*> sox_args;
+      for (const std::string& arg : tae.effect_args) {
+        sox_args.push_back(const_cast<char*>(arg.c_str()));
+      }
+      result = sox_effect_options(e, sox_args.size(), sox_args.data());
+    }
+    if (result != SOX_SUCCESS) {
+      free(e);
+      throw std::runtime_error("invalid effect options, see SoX docs for details");
+    }
+    sox_add_effect(chain, e, interm_signal, output_signal);
+    free(e);
+  }
+}
+
+/// Runs an effects chain over samples that are already pinned, collecting the
+/// output in output_buffer. Touches no Python objects, so callers run it
+/// without the GIL.
+FlowTarget flow_effects(
+  const InputSource& source,
+  const sox_signalinfo_t* input_signal,
+  const sox_signalinfo_t* target_signal,
+  const sox_encodinginfo_t* target_encoding,
+  const std::vector<SoxEffect>& effects,
+  int max_num_effect_args,
+  SampleBuffer& output_buffer,
+  FlowStats* stats) {
+
+  // samples are converted straight from the numpy buffer, this is the
+  // signal and encoding the input effect hands to the rest of the chain
+  sox_signalinfo_t source_signal = source_signal_info(input_signal, source.length);
+  sox_encodinginfo_t source_encoding = signed_encoding(SOX_SAMPLE_PRECISION);
+  FlowTarget target = resolve_target(
+    input_signal, target_signal, target_encoding, effects);
+
+  // create interm_signal for effects, intermediate steps change this in-place
+  sox_signalinfo_t interm_signal = source_signal;
+
+  // Setup the effects chain to decode/resample
+  SoxEffectsChain chain(&source_encoding, &target.encoding);
+  add_io_effect(chain.get(), input_source_handler(), source,
+                &interm_signal, &source_signal);
+  add_effects(chain.get(), effects, &interm_signal, &target.signal,
+              max_num_effect_args);
+
+  // collect the output in memory instead of encoding it to a file
+  output_buffer.reserve(estimate_output_length(
+    source.length, input_signal, &target.signal, effects));
+  OutputSink sink = {&output_buffer, target.encoding.bits_per_sample, 0};
+  add_io_effect(chain.get(), output_sink_handler(), sink,
+                &interm_signal, &target.signal);
+
+  // Finally run the effects chain
+  run_chain(chain.get(), stats);
+  return target;
+}
+
 std::tuple<int, int, py::array> build_flow_effects(
   py::array input_data,
   sox_signalinfo_t* input_signal,
   sox_signalinfo_t* target_signal,
   sox_encodinginfo_t* target_encoding,
   std::vector<SoxEffect> effects,
-  int max_num_effect_args) {
+  int max_num_effect_args,
+  const py::dtype& output_dtype,
+  FlowStats* stats) {
 
   /* This function builds an effects flow and puts the results into a tensor.
      It can also be used to re-encode audio using any of the available encoding
      options in SoX including sample rate and channel re-encoding.              */
 
-  // open input
-  
-#ifdef __APPLE__
-  char tmp_in_name[] = "/tmp/fileXXXXXX.wav";
-  int tmp_in_fd = mkstemp(tmp_in_name);
-  close(tmp_in_fd);
+  // pin the input samples while holding the GIL, everything below only
+  // touches raw pointers so the flow can run without it
+  InputSource source = input_source(input_data);
+  source.length = std::min<size_t>(input_signal->length, source.length);
+  SampleBuffer output_buffer(get_sample_type(output_dtype));
+  FlowTarget target;
+  {
+    py::gil_scoped_release release;
+    target = flow_effects(source, input_signal, target_signal, target_encoding,
+                          effects, max_num_effect_args, output_buffer, stats);
+  }
 
-  write_audio_file(tmp_in_name, input_data, input_signal, NULL, NULL);
-  sox_format_t* input = sox_open_read(tmp_in_name, nullptr, nullptr, nullptr);
+  // return sample rate, channels and output samples
+  return std::make_tuple(
+    static_cast<int>(target.signal.rate),
+    static_cast<int>(target.signal.channels),
+    output_buffer.release());
+}
 
-#else
-  std::vector<sox_sample_t> input_buffer(input_signal->length);
+/// Builds a chain fed straight from the file through libsox's input effect,
+/// lets add_output append the last effect and runs it. Like the sox command
+/// line, a leading trim on a file that has not been read from yet becomes a
+/// seek and the skipped audio is never decoded. input_signal describes the
+/// file as the chain should see it. Touches no Python objects.
+template <typename AddOutput>
+FlowTarget SoxReader::flow_from_file(
+    const sox_signalinfo_t* input_signal,
+    const sox_signalinfo_t* target_signal,
+    const sox_encodinginfo_t* target_encoding,
+    const std::vector<SoxEffect>& effects,
+    int max_num_effect_args,
+    FlowStats* stats,
+    AddOutput add_output) {
+  sox_format_t* fd = fd_->get();
+  const bool at_start = at_start_;
+  at_start_ = false;
 
-  const sox_sample_t* data_ptr = static_cast<const sox_sample_t*>(input_data.data());
-  std::copy(data_ptr, data_ptr + input_signal->length, input_buffer.begin());
+  sox_signalinfo_t source_signal = source_signal_info(input_signal, input_signal->length);
+  sox_encodinginfo_t source_encoding = signed_encoding(SOX_SAMPLE_PRECISION);
+  FlowTarget target = resolve_target(
+    input_signal, target_signal, target_encoding, effects);
+  sox_signalinfo_t interm_signal = source_signal;
 
-  size_t buffer_size = sizeof(input_buffer[0]) * input_buffer.size();
+  SoxEffectsChain chain(&source_encoding, &target.encoding);
+  sox_effect_t* e = sox_create_effect(sox_find_effect("input"));
+  char* input_args[] = {reinterpret_cast<char*>(fd)};
+  if (sox_effect_options(e, 1, input_args) != SOX_SUCCESS) {
+    free(e);
+    throw std::runtime_error("Error reading from file");
+  }
+  sox_add_effect(chain.get(), e, &interm_signal, &source_signal);
+  free(e);
+  add_effects(chain.get(), effects, &interm_signal, &target.signal,
+              max_num_effect_args);
 
-  sox_format_t* input = sox_open_mem_read(input_buffer.data(), buffer_size, 
-                                          input_signal, NULL, "s32");
-#endif
-  if (input == nullptr) {
-    throw std::runtime_error("Error reading audio data.");
+  // trim works out its start when it is added to the chain, seek there
+  // and tell it not to skip anything itself
+  size_t skipped = 0;
+  sox_effects_chain_t* c = chain.get();
+  if (at_start && c->length > 1 &&
+      std::string(c->effects[1][0].handler.name) == "trim") {
+    sox_uint64_t offset = sox_trim_get_start(&c->effects[1][0]);
+    if (offset && sox_seek(fd, offset, SOX_SEEK_SET) == SOX_SUCCESS) {
+      sox_trim_clear_start(&c->effects[1][0]);
+      skipped = offset;
+    }
   }
 
-  // only used if target signal or encoding are null
-  sox_signalinfo_t empty_signal;
-  sox_encodinginfo_t empty_encoding;
+  const size_t length = source_signal.length > skipped ?
+    source_signal.length - skipped : 0;
+  add_output(chain.get(), &interm_signal, target, length);
+  run_chain(chain.get(), stats);
+  return target;
+}
 
-  // set signalinfo and encodinginfo if blank
-  if(target_signal == nullptr) {
-    target_signal = &empty_signal;
-    target_signal->rate = input_signal->rate;
-    target_signal->channels = input_signal->channels;
-    target_signal->length = SOX_UNSPEC;
-    target_signal->precision = input_signal->precision;
-#if SOX_LIB_VERSION_CODE >= 918272 // >= 14.3.0
-    target_signal->mult = nullptr;
-#endif
+/// Runs an effects chain over the rest of the file, collecting the output
+/// in memory. The file is decoded once with no intermediate array.
+std::tuple<int, int, py::array> SoxReader::flow_effects(
+    sox_signalinfo_t* input_signal,
+    sox_signalinfo_t* target_signal,
+    sox_encodinginfo_t* target_encoding,
+    std::vector<SoxEffect> effects,
+    int max_num_effect_args,
+    const py::dtype& output_dtype,
+    FlowStats* stats) {
+  get();
+  SampleBuffer output_buffer(get_sample_type(output_dtype));
+  FlowTarget target;
+  {
+    py::gil_scoped_release release;
+    target = flow_from_file(
+      input_signal, target_signal, target_encoding, effects,
+      max_num_effect_args, stats,
+      [&](sox_effects_chain_t* chain, sox_signalinfo_t* interm_signal,
+          FlowTarget& target, size_t length) {
+        output_buffer.reserve(estimate_output_length(
+          length, input_signal, &target.signal, effects));
+        OutputSink sink = {&output_buffer, target.encoding.bits_per_sample, 0};
+        add_io_effect(chain, output_sink_handler(), sink,
+                      interm_signal, &target.signal);
+      });
   }
-  if(target_encoding == nullptr) {
-    target_encoding = &empty_encoding;
-    target_encoding->encoding = SOX_ENCODING_SIGN2; // Sample format
-    target_encoding->bits_per_sample = target_signal->precision; // Bits per sample
-    target_encoding->compression = 0.0; // Compression factor
-    target_encoding->reverse_bytes = sox_option_default; // Should bytes be reversed
-    target_encoding->reverse_nibbles = sox_option_default; // Should nibbles be reversed
-    target_encoding->reverse_bits = sox_option_default; // Should bits be reversed (pairs of bits?)
-    target_encoding->opposite_endian = sox_false; // Reverse endianness
+
+  return std::make_tuple(
+    static_cast<int>(target.signal.rate),
+    static_cast<int>(target.signal.channels),
+    output_buffer.release());
+}
+
+/// Opens output_file and adds libsox's output effect encoding the end of the
+/// chain to it. The file has to be closed after the chain is deleted.
+std::unique_ptr<SoxDescriptor> add_file_output(
+    sox_effects_chain_t* chain,
+    sox_signalinfo_t* interm_signal,
+    FlowTarget& target,
+    const std::string& output_file,
+    const char* file_type) {
+  target.signal.precision = target.encoding.bits_per_sample;
+  std::unique_ptr<SoxDescriptor> out_fd(new SoxDescriptor(sox_open_write(
+    output_file.c_str(), &target.signal, &target.encoding, file_type,
+    /*oob=*/nullptr, /*overwrite=*/nullptr)));
+  if (out_fd->get() == nullptr) {
+    throw std::runtime_error(
+      "Error writing audio file: could not open file for writing");
   }
+  sox_effect_t* e = sox_create_effect(sox_find_effect("output"));
+  char* output_args[] = {reinterpret_cast<char*>(out_fd->get())};
+  if (sox_effect_options(e, 1, output_args) != SOX_SUCCESS) {
+    free(e);
+    throw std::runtime_error("Error writing audio file");
+  }
+  sox_add_effect(chain, e, interm_signal, &(*out_fd)->signal);
+  free(e);
+  return out_fd;
+}
 
-  // check for rate or channels effect and change the output signalinfo accordingly
-  for (SoxEffect effect : effects) {
-    if (effect.effect_name == "rate") {
-      target_signal->rate = std::stod(effect.effect_args.back());
-    } else if (effect.effect_name == "channels") {
-      target_signal->channels = std::stoi(effect.effect_args[0]);
+/// Runs an effects chain over the rest of the file and encodes the output
+/// straight to output_file through libsox's output effect, so memory stays
+/// constant however long the file is. Returns the sample rate, channels and
+/// number of frames written.
+std::tuple<int, int, int64_t> SoxReader::flow_effects_to_file(
+    const std::string& output_file,
+    sox_signalinfo_t* input_signal,
+    sox_signalinfo_t* target_signal,
+    sox_encodinginfo_t* target_encoding,
+    const char* file_type,
+    std::vector<SoxEffect> effects,
+    int max_num_effect_args,
+    FlowStats* stats) {
+  get();
+  // declared out here so the file is closed, and its header finished, only
+  // after the chain writing to it is gone
+  std::unique_ptr<SoxDescriptor> out_fd;
+  FlowTarget target;
+  {
+    py::gil_scoped_release release;
+    target = flow_from_file(
+      input_signal, target_signal, target_encoding, effects,
+      max_num_effect_args, stats,
+      [&](sox_effects_chain_t* chain, sox_signalinfo_t* interm_signal,
+          FlowTarget& target, size_t length) {
+        out_fd = add_file_output(
+          chain, interm_signal, target, output_file, file_type);
+      });
+  }
+
+  const int64_t channels = std::max<int64_t>(target.signal.channels, 1);
+  return std::make_tuple(
+    static_cast<int>(target.signal.rate),
+    static_cast<int>(target.signal.channels),
+    static_cast<int64_t>((*out_fd)->olength) / channels);
+}
+
+/// Calls f(i) for every i below num_items on num_threads threads (all cores
+/// if 0), the calling thread included. Items are handed out one at a time so
+/// uneven items balance out. f must not throw.
+template <typename F>
+void parallel_for(size_t num_items, unsigned num_threads, F f) {
+  if (num_threads == 0) {
+    num_threads = std::max(std::thread::hardware_concurrency(), 1u);
+  }
+  num_threads = std::min<size_t>(num_threads, num_items);
+
+  std::atomic<size_t> next_item(0);
+  auto worker = [&]() {
+    for (size_t i = next_item++; i < num_items; i = next_item++) {
+      f(i);
     }
+  };
+  std::vector<std::thread> threads;
+  for (unsigned t = 1; t < num_threads; ++t) {
+    threads.emplace_back(worker);
   }
-  // create interm_signal for effects, intermediate steps change this in-place
-  sox_signalinfo_t interm_signal = input->signal;
-
-  // According to Mozilla Deepspeech sox_open_memstream_write doesn't work
-  // with OSX
-  
-  char tmp_name[] = "/tmp/fileXXXXXX";
-  int tmp_fd = mkstemp(tmp_name);
-  close(tmp_fd);
-  sox_format_t* output = sox_open_write(tmp_name, target_signal,
-                                        target_encoding, "wav", nullptr, 
-                                        nullptr);
-  if (output == nullptr) {
-    throw std::runtime_error("Error opening output memstream/temporary file");
+  worker();
+  for (auto& thread : threads) {
+    thread.join();
   }
-  // Setup the effects chain to decode/resample
-  sox_effects_chain_t* chain =
-    sox_create_effects_chain(&input->encoding, &output->encoding);
+}
 
-  sox_effect_t* e = sox_create_effect(sox_find_effect("input"));
-  char* io_args[1];
-  io_args[0] = (char*)input;
-  sox_effect_options(e, 1, io_args);
-  sox_add_effect(chain, e, &interm_signal, &input->signal);
-  free(e);
+/// Runs the same effects chain over every array in input_data on a pool of
+/// native threads, each item gets its own chain. input_signal describes the
+/// rate, channels and precision shared by all items, the length of each item
+/// is taken from its array.
+std::tuple<int, int, std::vector<py::array>> build_flow_effects_batch(
+  std::vector<py::array> input_data,
+  sox_signalinfo_t* input_signal,
+  sox_signalinfo_t* target_signal,
+  sox_encodinginfo_t* target_encoding,
+  std::vector<SoxEffect> effects,
+  int max_num_effect_args,
+  unsigned num_threads,
+  const py::dtype& output_dtype) {
 
-  for(SoxEffect tae : effects) {
-    if(tae.effect_name == "no_effects") break;
-    e = sox_create_effect(sox_find_effect(tae.effect_name.c_str()));
-    e->global_info->global_info->verbosity = 1;
-    if(tae.effect_args[0] == "") {
-      sox_effect_options(e, 0, nullptr);
-    } else {
-      int num_opts = tae.effect_args.size();
-      char* sox_args[max_num_effect_args];
-      for(std::vector<std::string>::size_type i = 0; i != tae.effect_args.size(); i++) {
-        sox_args[i] = (char*) tae.effect_args[i].c_str();
+  SampleType output_type = get_sample_type(output_dtype);
+  size_t num_items = input_data.size();
+  std::vector<InputSource> sources(num_items);
+  std::vector<SampleBuffer> output_buffers;
+  output_buffers.reserve(num_items);
+  for (size_t i = 0; i < num_items; ++i) {
+    sources[i] = input_source(input_data[i]);
+    output_buffers.emplace_back(output_type);
+  }
+
+  FlowTarget target = resolve_target(
+    input_signal, target_signal, target_encoding, effects);
+  std::vector<std::exception_ptr> errors(num_items);
+  {
+    py::gil_scoped_release release;
+
+    parallel_for(num_items, num_threads, [&](size_t i) {
+      sox_signalinfo_t item_signal = *input_signal;
+      item_signal.length = sources[i].length;
+      try {
+        flow_effects(sources[i], &item_signal, target_signal, target_encoding,
+                     effects, max_num_effect_args, output_buffers[i], nullptr);
+      } catch (...) {
+        errors[i] = std::current_exception();
       }
-      if(sox_effect_options(e, num_opts, sox_args) != SOX_SUCCESS) {
-        unlink(tmp_name);
-        throw std::runtime_error("invalid effect options, see SoX docs for details");
+    });
+  }
+
+  for (auto& error : errors) {
+    if (error) {
+      std::rethrow_exception(error);
+    }
+  }
+  std::vector<py::array> outputs;
+  outputs.reserve(num_items);
+  for (auto& output_buffer : output_buffers) {
+    outputs.push_back(output_buffer.release());
+  }
+  return std::make_tuple(
+    static_cast<int>(target.signal.rate),
+    static_cast<int>(target.signal.channels),
+    std::move(outputs));
+}
+
+/// Runs a different effects chain over the same array for every entry of
+/// chains, on a pool of native threads. The input is converted to sox
+/// samples once and shared by all chains. Returns the sample rate, channels
+/// and output of every chain.
+std::tuple<std::vector<int>, std::vector<int>, std::vector<py::array>>
+build_flow_effects_sweep(
+  const py::array& input_data,
+  sox_signalinfo_t* input_signal,
+  sox_signalinfo_t* target_signal,
+  sox_encodinginfo_t* target_encoding,
+  std::vector<std::vector<SoxEffect>> chains,
+  int max_num_effect_args,
+  unsigned num_threads,
+  const py::dtype& output_dtype) {
+
+  SampleType output_type = get_sample_type(output_dtype);
+  InputSource shared = input_source(input_data);
+  const size_t length = shared.length;
+  size_t num_items = chains.size();
+  std::vector<SampleBuffer> output_buffers;
+  output_buffers.reserve(num_items);
+  for (size_t i = 0; i < num_items; ++i) {
+    output_buffers.emplace_back(output_type);
+  }
+
+  std::vector<sox_sample_t> converted;
+  std::vector<FlowTarget> targets(num_items);
+  std::vector<std::exception_ptr> errors(num_items);
+  {
+    py::gil_scoped_release release;
+    if ((shared.type != SampleType::Int32 || shared.columns) &&
+        num_items > 1) {
+      converted.resize(length);
+      read_input(shared, length, converted.data());
+      shared = {converted.data(), SampleType::Int32, length, 0, 0, 0, 0};
+    }
+
+    parallel_for(num_items, num_threads, [&](size_t i) {
+      InputSource source = shared;
+      sox_signalinfo_t item_signal = *input_signal;
+      item_signal.length = length;
+      try {
+        targets[i] = flow_effects(
+          source, &item_signal, target_signal, target_encoding, chains[i],
+          max_num_effect_args, output_buffers[i], nullptr);
+      } catch (...) {
+        errors[i] = std::current_exception();
       }
+    });
+  }
+
+  for (auto& error : errors) {
+    if (error) {
+      std::rethrow_exception(error);
     }
-    sox_add_effect(chain, e, &interm_signal, &output->signal);
-    free(e);
   }
+  std::vector<int> rates, channels;
+  std::vector<py::array> outputs;
+  outputs.reserve(num_items);
+  for (size_t i = 0; i < num_items; ++i) {
+    rates.push_back(static_cast<int>(targets[i].signal.rate));
+    channels.push_back(static_cast<int>(targets[i].signal.channels));
+    outputs.push_back(output_buffers[i].release());
+  }
+  return std::make_tuple(
+    std::move(rates), std::move(channels), std::move(outputs));
+}
 
-  e = sox_create_effect(sox_find_effect("output"));
-  io_args[0] = (char*)output;
-  sox_effect_options(e, 1, io_args);
-  sox_add_effect(chain, e, &interm_signal, &output->signal);
-  free(e);
-  // Finally run the effects chain
-  int err;
-  err = sox_flow_effects(chain, nullptr, nullptr);
-  sox_delete_effects_chain(chain);
-
-  // Close sox handles, buffer does not get properly sized until these are closed
-  sox_close(output);
-  sox_close(input);
-
-  std::tuple<int, int, py::array> output_audio_tuple;
-  // Read the in-memory audio buffer or temp file that we just wrote.
-  /*
-     Temporary filetype must have a valid header.  Wav seems to work here while
-     raw does not.  Certain effects like chorus caused strange behavior on the mac.
-  */
-  // read_audio_file reads the temporary file and returns the sr and otensor
-  output_audio_tuple = read_audio_file(tmp_name, 0, 0, target_signal, 
-                                       target_encoding, "wav");
-  // delete temporary audio file
-  unlink(tmp_name);
-
-  // return sample rate, output tensor modified in-place
-  return output_audio_tuple;
+/// Ways of combining several inputs, the same as sox's --combine.
+enum class CombineMethod { Concatenate, Merge, Mix, MixPower, Multiply };
+
+CombineMethod get_combine_method(const std::string& name) {
+  if (name == "concatenate") return CombineMethod::Concatenate;
+  if (name == "merge") return CombineMethod::Merge;
+  if (name == "mix") return CombineMethod::Mix;
+  if (name == "mix-power") return CombineMethod::MixPower;
+  if (name == "multiply") return CombineMethod::Multiply;
+  throw std::invalid_argument("unknown combine method: " + name);
+}
+
+/// Rounds to a sox sample, clipping and counting clips like libsox's
+/// SOX_ROUND_CLIP_COUNT.
+inline sox_sample_t round_clip(double d, sox_uint64_t& clips) {
+  if (d < 0) {
+    if (d <= SOX_SAMPLE_MIN - 0.5) {
+      ++clips;
+      return SOX_SAMPLE_MIN;
+    }
+    return static_cast<sox_sample_t>(d - 0.5);
+  }
+  if (d >= SOX_SAMPLE_MAX + 0.5) {
+    ++clips;
+    return SOX_SAMPLE_MAX;
+  }
+  return static_cast<sox_sample_t>(d + 0.5);
+}
+
+/// Several arrays or open files combined block by block into one signal, the
+/// same way sox combines its input files, so no input is ever held whole.
+class Combiner {
+ public:
+  struct Input {
+    // samples of an array input, used when file is null
+    InputSource array;
+    sox_format_t* file;
+    size_t channels;
+    double volume;
+    std::vector<sox_sample_t> block;
+    size_t frames;
+  };
+
+  Combiner(CombineMethod method, std::vector<Input> inputs, size_t channels)
+      : method_(method), inputs_(std::move(inputs)), channels_(channels) {}
+
+  /// Writes up to osamp samples (whole frames) of the combined signal to
+  /// obuf, returns the number written, 0 once every input has ended.
+  size_t drain(sox_sample_t* obuf, size_t osamp) {
+    const size_t frames = osamp / channels_;
+    if (method_ == CombineMethod::Concatenate) {
+      for (; current_ < inputs_.size(); ++current_) {
+        Input& input = inputs_[current_];
+        if (read(input, frames)) {
+          std::copy(input.block.begin(),
+                    input.block.begin() + input.frames * channels_, obuf);
+          return input.frames * channels_;
+        }
+      }
+      return 0;
+    }
+
+    size_t olen = 0;
+    for (Input& input : inputs_) {
+      olen = std::max(olen, read(input, frames));
+    }
+    sox_sample_t* p = obuf;
+    for (size_t ws = 0; ws < olen; ++ws) {
+      if (method_ == CombineMethod::Merge) {
+        // like a multi-track recorder, the channels of every input side
+        // by side
+        for (const Input& input : inputs_) {
+          for (size_t s = 0; s < input.channels; ++s) {
+            *p++ = sample(input, ws, s);
+          }
+        }
+      } else if (method_ == CombineMethod::Multiply) {
+        for (size_t s = 0; s < channels_; ++s, ++p) {
+          *p = sample(inputs_[0], ws, s);
+          for (size_t i = 1; i < inputs_.size(); ++i) {
+            double d = *p * (-1. / SOX_SAMPLE_MIN) * sample(inputs_[i], ws, s);
+            *p = round_clip(d, clips_);
+          }
+        }
+      } else {
+        for (size_t s = 0; s < channels_; ++s, ++p) {
+          *p = 0;
+          for (const Input& input : inputs_) {
+            if (ws < input.frames && s < input.channels) {
+              *p = round_clip(
+                static_cast<double>(*p) + sample(input, ws, s), clips_);
+            }
+          }
+        }
+      }
+    }
+    return olen * channels_;
+  }
+
+  /// Clips since the last call.
+  sox_uint64_t take_clips() {
+    sox_uint64_t clips = clips_;
+    clips_ = 0;
+    return clips;
+  }
+
+ private:
+  /// Reads the next frames of an input into its block, scaled by its
+  /// volume. Returns the number of frames read.
+  size_t read(Input& input, size_t frames) {
+    const size_t length = frames * input.channels;
+    input.block.resize(length);
+    size_t n = 0;
+    if (input.file != nullptr) {
+      while (n < length) {
+        const size_t got = sox_read(input.file, input.block.data() + n,
+                                    length - n);
+        if (got == 0) break;
+        n += got;
+      }
+    } else {
+      n = read_input(input.array, length, input.block.data());
+    }
+    n -= n % input.channels;
+    if (input.volume != 1) {
+      for (size_t i = 0; i < n; ++i) {
+        input.block[i] = round_clip(input.volume * input.block[i], clips_);
+      }
+    }
+    input.frames = n / input.channels;
+    return input.frames;
+  }
+
+  static sox_sample_t sample(const Input& input, size_t ws, size_t s) {
+    return ws < input.frames && s < input.channels ?
+      input.block[ws * input.channels + s] : 0;
+  }
+
+  CombineMethod method_;
+  std::vector<Input> inputs_;
+  size_t channels_;
+  size_t current_ = 0;
+  sox_uint64_t clips_ = 0;
+};
+
+struct CombinerSource {
+  Combiner* combiner;
+};
+
+static int combiner_drain(
+    sox_effect_t* effp,
+    sox_sample_t* obuf,
+    size_t* osamp) {
+  Combiner* combiner = static_cast<CombinerSource*>(effp->priv)->combiner;
+  *osamp = combiner->drain(obuf, *osamp);
+  effp->clips += combiner->take_clips();
+  return *osamp ? SOX_SUCCESS : SOX_EOF;
 }
 
+static const sox_effect_handler_t* combiner_handler() {
+  static sox_effect_handler_t handler = {
+    /*name=*/"combiner",
+    /*usage=*/nullptr,
+    /*flags=*/SOX_EFF_MCHAN | SOX_EFF_MODIFY,
+    /*getopts=*/nullptr,
+    /*start=*/nullptr,
+    /*flow=*/nullptr,
+    /*drain=*/combiner_drain,
+    /*stop=*/nullptr,
+    /*kill=*/nullptr,
+    /*priv_size=*/sizeof(CombinerSource)
+  };
+  return &handler;
+}
+
+/// Combines arrays and open files (SoxReaders) with method and runs an
+/// effects chain over the result, like sox given several input files.
+/// input_signal describes the combined signal. The output is collected in
+/// memory, or encoded to output_file if one is given, in which case the
+/// number of frames written is returned in place of the array.
+std::tuple<int, int, py::object> build_flow_effects_combine(
+  std::vector<py::object> inputs,
+  std::vector<unsigned> channels,
+  std::vector<double> volumes,
+  const std::string& method,
+  sox_signalinfo_t* input_signal,
+  sox_signalinfo_t* target_signal,
+  sox_encodinginfo_t* target_encoding,
+  std::vector<SoxEffect> effects,
+  int max_num_effect_args,
+  const py::dtype& output_dtype,
+  const std::string& output_file,
+  const char* file_type,
+  FlowStats* stats) {
+
+  if (inputs.empty() || volumes.size() != inputs.size() ||
+      channels.size() != inputs.size()) {
+    throw std::invalid_argument(
+      "needs at least one input, and the channels and volume of each");
+  }
+  std::vector<Combiner::Input> combine_inputs(inputs.size());
+  for (size_t i = 0; i < inputs.size(); ++i) {
+    Combiner::Input& input = combine_inputs[i];
+    input.volume = volumes[i];
+    input.frames = 0;
+    if (py::isinstance<py::array>(inputs[i])) {
+      // interleaved samples, kept alive by inputs
+      py::array array = inputs[i].cast<py::array>();
+      input.array = input_source(array);
+      input.file = nullptr;
+    } else {
+      input.file = inputs[i].cast<SoxReader&>().format();
+    }
+    input.channels = std::max<unsigned>(channels[i], 1);
+  }
+  Combiner combiner(
+    get_combine_method(method), std::move(combine_inputs),
+    std::max<size_t>(input_signal->channels, 1));
+
+  SampleBuffer output_buffer(get_sample_type(output_dtype));
+  // closed, finishing its header, after the chain writing to it is gone
+  std::unique_ptr<SoxDescriptor> out_fd;
+  FlowTarget target;
+  {
+    py::gil_scoped_release release;
+    sox_signalinfo_t source_signal = source_signal_info(
+      input_signal, input_signal->length);
+    sox_encodinginfo_t source_encoding = signed_encoding(SOX_SAMPLE_PRECISION);
+    target = resolve_target(
+      input_signal, target_signal, target_encoding, effects);
+    sox_signalinfo_t interm_signal = source_signal;
+
+    SoxEffectsChain chain(&source_encoding, &target.encoding);
+    CombinerSource source = {&combiner};
+    add_io_effect(chain.get(), combiner_handler(), source,
+                  &interm_signal, &source_signal);
+    add_effects(chain.get(), effects, &interm_signal, &target.signal,
+                max_num_effect_args);
+    if (output_file.empty()) {
+      output_buffer.reserve(estimate_output_length(
+        input_signal->length, input_signal, &target.signal, effects));
+      OutputSink sink = {&output_buffer, target.encoding.bits_per_sample, 0};
+      add_io_effect(chain.get(), output_sink_handler(), sink,
+                    &interm_signal, &target.signal);
+    } else {
+      out_fd = add_file_output(
+        chain.get(), &interm_signal, target, output_file, file_type);
+    }
+    run_chain(chain.get(), stats);
+  }
+
+  py::object output;
+  if (out_fd) {
+    const int64_t channels = std::max<int64_t>(target.signal.channels, 1);
+    output = py::int_(static_cast<int64_t>((*out_fd)->olength) / channels);
+  } else {
+    output = output_buffer.release();
+  }
+  return std::make_tuple(
+    static_cast<int>(target.signal.rate),
+    static_cast<int>(target.signal.channels),
+    output);
+}
+
+/// Reads the headers of many files on num_threads threads. Returns columns of
+/// rate, channels, precision, length (in samples), encoding, bits per sample
+/// and whether the file could be opened, zeros for files that couldn't.
+std::tuple<py::array_t<double>, py::array_t<int32_t>, py::array_t<int32_t>,
+           py::array_t<int64_t>, py::array_t<int32_t>, py::array_t<int32_t>,
+           py::array_t<bool>>
+get_info_many(const std::vector<std::string>& file_names, unsigned num_threads) {
+  const size_t n = file_names.size();
+  py::array_t<double> rate(n);
+  py::array_t<int32_t> channels(n), precision(n), encoding(n), bits(n);
+  py::array_t<int64_t> length(n);
+  py::array_t<bool> ok(n);
+  double* rate_ptr = rate.mutable_data();
+  int32_t* channels_ptr = channels.mutable_data();
+  int32_t* precision_ptr = precision.mutable_data();
+  int64_t* length_ptr = length.mutable_data();
+  int32_t* encoding_ptr = encoding.mutable_data();
+  int32_t* bits_ptr = bits.mutable_data();
+  bool* ok_ptr = ok.mutable_data();
+  {
+    py::gil_scoped_release release;
+    parallel_for(n, num_threads, [&](size_t i) {
+      SoxDescriptor fd(sox_open_read(
+          file_names[i].c_str(), /*signal=*/nullptr, /*encoding=*/nullptr,
+          /*filetype=*/nullptr));
+      ok_ptr[i] = fd.get() != nullptr;
+      rate_ptr[i] = ok_ptr[i] ? fd->signal.rate : 0;
+      channels_ptr[i] = ok_ptr[i] ? fd->signal.channels : 0;
+      precision_ptr[i] = ok_ptr[i] ? fd->signal.precision : 0;
+      length_ptr[i] = ok_ptr[i] ? fd->signal.length : 0;
+      encoding_ptr[i] = ok_ptr[i] ? fd->encoding.encoding : 0;
+      bits_ptr[i] = ok_ptr[i] ? fd->encoding.bits_per_sample : 0;
+    });
+  }
+  return std::make_tuple(rate, channels, precision, length, encoding, bits, ok);
+}
+
+/// Hand-off point between Python pushing chunks and the thread running a
+/// persistent effects chain. The chain pulls samples from here and blocks
+/// when it has consumed everything, which is also when all the samples it
+/// could produce so far have reached the output.
+struct StreamState {
+  std::mutex mutex;
+  std::condition_variable cv;
+  InputSource chunk = {nullptr, SampleType::Int32, 0, 0, 0, 0, 0};
+  bool idle = false;
+  bool eof = false;
+  bool finished = false;
+};
+
+static int stream_source_drain(
+    sox_effect_t* effp,
+    sox_sample_t* obuf,
+    size_t* osamp) {
+  StreamState* state = *static_cast<StreamState**>(effp->priv);
+  std::unique_lock<std::mutex> lock(state->mutex);
+  InputSource& chunk = state->chunk;
+  if (chunk.position >= chunk.length && !state->eof) {
+    state->idle = true;
+    state->cv.notify_all();
+    state->cv.wait(lock, [state] {
+      return state->chunk.position < state->chunk.length || state->eof;
+    });
+    state->idle = false;
+  }
+  if (chunk.position >= chunk.length) {
+    *osamp = 0;
+    return SOX_EOF;
+  }
+  size_t n = *osamp - *osamp % effp->out_signal.channels;
+  *osamp = read_input(chunk, n, obuf);
+  return SOX_SUCCESS;
+}
+
+static const sox_effect_handler_t* stream_source_handler() {
+  static sox_effect_handler_t handler = {
+    /*name=*/"stream_source",
+    /*usage=*/nullptr,
+    /*flags=*/SOX_EFF_MCHAN | SOX_EFF_MODIFY,
+    /*getopts=*/nullptr,
+    /*start=*/nullptr,
+    /*flow=*/nullptr,
+    /*drain=*/stream_source_drain,
+    /*stop=*/nullptr,
+    /*kill=*/nullptr,
+    /*priv_size=*/sizeof(StreamState*)
+  };
+  return &handler;
+}
+
+/// An effects chain that stays alive between chunks of audio, so filter
+/// state (resampler history, reverb tails, compander envelopes) carries
+/// across chunk boundaries. The chain runs on its own thread, push() hands
+/// it a chunk and returns whatever output that chunk produced.
+class StreamingEffects {
+ public:
+  StreamingEffects(
+      sox_signalinfo_t* input_signal,
+      sox_signalinfo_t* target_signal,
+      sox_encodinginfo_t* target_encoding,
+      std::vector<SoxEffect> effects,
+      int max_num_effect_args,
+      const py::dtype& output_dtype)
+      : output_buffer_(get_sample_type(output_dtype)) {
+    source_signal_ = source_signal_info(input_signal, SOX_UNSPEC);
+    source_encoding_ = signed_encoding(SOX_SAMPLE_PRECISION);
+    target_ = resolve_target(input_signal, target_signal, target_encoding, effects);
+    channels_ = std::max<unsigned>(source_signal_.channels, 1);
+
+    sox_signalinfo_t interm_signal = source_signal_;
+    chain_.reset(new SoxEffectsChain(&source_encoding_, &target_.encoding));
+    StreamState* state = &state_;
+    add_io_effect(chain_->get(), stream_source_handler(), state,
+                  &interm_signal, &source_signal_);
+    add_effects(chain_->get(), effects, &interm_signal, &target_.signal,
+                max_num_effect_args);
+    OutputSink sink = {&output_buffer_, target_.encoding.bits_per_sample, 0};
+    add_io_effect(chain_->get(), output_sink_handler(), sink,
+                  &interm_signal, &target_.signal);
+
+    worker_ = std::thread([this] {
+      run_chain(chain_->get(), nullptr);
+      std::lock_guard<std::mutex> lock(state_.mutex);
+      state_.finished = true;
+      state_.cv.notify_all();
+    });
+  }
+
+  ~StreamingEffects() {
+    stop();
+  }
+
+  /// Runs a chunk of interleaved samples (1D, or 2D of any strides)
+  /// through the chain and returns the output produced so far.
+  py::array push(py::array chunk) {
+    if (chunk.size() % channels_ != 0) {
+      throw std::invalid_argument("chunk must hold whole frames");
+    }
+    InputSource source = input_source(chunk);
+    {
+      py::gil_scoped_release release;
+      std::unique_lock<std::mutex> lock(state_.mutex);
+      if (state_.eof) {
+        throw std::runtime_error("push after flush");
+      }
+      state_.chunk = source;
+      state_.idle = false;
+      state_.cv.notify_all();
+      state_.cv.wait(lock, [this] { return state_.idle || state_.finished; });
+      state_.chunk = {nullptr, SampleType::Int32, 0, 0, 0, 0, 0};
+    }
+    return output_buffer_.release();
+  }
+
+  /// Signals the end of the input, lets the effects drain their tails and
+  /// returns the remaining output. The chain cannot be used afterwards.
+  py::array flush() {
+    {
+      py::gil_scoped_release release;
+      stop();
+    }
+    return output_buffer_.release();
+  }
+
+  int sample_rate() const { return static_cast<int>(target_.signal.rate); }
+  int channels() const { return static_cast<int>(target_.signal.channels); }
+
+ private:
+  void stop() {
+    {
+      std::lock_guard<std::mutex> lock(state_.mutex);
+      state_.eof = true;
+      state_.cv.notify_all();
+    }
+    if (worker_.joinable()) {
+      worker_.join();
+    }
+  }
+
+  sox_signalinfo_t source_signal_;
+  sox_encodinginfo_t source_encoding_;
+  FlowTarget target_;
+  unsigned channels_;
+  StreamState state_;
+  SampleBuffer output_buffer_;
+  std::unique_ptr<SoxEffectsChain> chain_;
+  std::thread worker_;
+};
+
 PYBIND11_MODULE(_soxbindings, m) {
     m.doc() = R"pbdoc(
         Pybind11 example plugin
@@ -347,6 +2176,26 @@ PYBIND11_MODULE(_soxbindings, m) {
       "Opens a decoding session for a file. Returned handle must be closed with " 
       "sox_close(). @returns The handle for the new session, or null on failure.");
 
+    m.def(
+      "read_audio_bytes",
+      &read_audio_bytes,
+      "Decodes audio from an encoded file held in a buffer.");
+
+    m.def(
+      "write_audio_bytes",
+      &write_audio_bytes,
+      "Encodes audio into the bytes of a file.");
+
+    m.def(
+      "get_info_bytes",
+      &get_info_bytes,
+      "Gets information about an encoded file held in a buffer.");
+
+    m.def(
+      "get_info_many",
+      &get_info_many,
+      "Reads the headers of many files on native threads, as columns.");
+
     m.def(
       "get_info",
       &get_info,
@@ -362,6 +2211,94 @@ PYBIND11_MODULE(_soxbindings, m) {
       &build_flow_effects,
       "Builds a flow of effects.");
 
+    py::class_<EffectStats>(m, "EffectStats")
+        .def_readonly("name", &EffectStats::name)
+        .def_readonly("chains", &EffectStats::chains)
+        .def_readonly("calls", &EffectStats::calls)
+        .def_readonly("seconds", &EffectStats::seconds)
+        .def_readonly("samples_in", &EffectStats::samples_in)
+        .def_readonly("samples_out", &EffectStats::samples_out)
+        .def_readonly("clips", &EffectStats::clips)
+        .def_readonly("max_block", &EffectStats::max_block)
+        .def("__repr__", [](const EffectStats& stats) {
+          std::ostringstream repr;
+          repr << "EffectStats(name='" << stats.name << "', seconds="
+               << stats.seconds << ", samples_in=" << stats.samples_in
+               << ", samples_out=" << stats.samples_out
+               << ", clips=" << stats.clips << ")";
+          return repr.str();
+        });
+
+    py::class_<FlowStats>(m, "FlowStats")
+        .def(py::init<>())
+        .def_readonly("effects", &FlowStats::effects)
+        .def_readonly("buffer_size", &FlowStats::buffer_size);
+
+    m.def("set_profiling", [](bool enabled) { profiling_enabled = enabled; });
+    m.def("get_profile", [](bool reset) {
+      std::lock_guard<std::mutex> lock(profile_mutex);
+      std::vector<EffectStats> totals;
+      for (const auto& item : profile_totals) {
+        totals.push_back(item.second);
+      }
+      if (reset) {
+        profile_totals.clear();
+      }
+      return totals;
+    });
+
+    py::class_<SoxReader>(m, "SoxReader")
+        .def(py::init<const std::string&, sox_signalinfo_t*,
+                      sox_encodinginfo_t*, const char*>())
+        .def_property_readonly("sample_rate", &SoxReader::sample_rate)
+        .def_property_readonly("channels", &SoxReader::channels)
+        .def_property_readonly("length", &SoxReader::length)
+        .def_property_readonly("signal", &SoxReader::signal)
+        .def_property_readonly("encoding", &SoxReader::encoding)
+        .def_property_readonly("data_start", &SoxReader::data_start)
+        .def_property_readonly("seekable", &SoxReader::seekable)
+        .def("seek", &SoxReader::seek, "Seeks to a frame offset.")
+        .def("read", &SoxReader::read, "Reads up to nframes frames.")
+        .def("read_into", &SoxReader::read_into,
+             "Reads into an existing array, returns the frames read.")
+        .def("flow_effects", &SoxReader::flow_effects,
+             "Runs an effects chain over the rest of the file.")
+        .def("flow_effects_to_file", &SoxReader::flow_effects_to_file,
+             "Runs an effects chain over the rest of the file into another file.")
+        .def("close", &SoxReader::close, "Closes the file.");
+
+    m.def(
+        "build_flow_effects_batch",
+        &build_flow_effects_batch,
+        "Applies one effects chain to a list of arrays on native threads.");
+
+    m.def(
+        "build_flow_effects_sweep",
+        &build_flow_effects_sweep,
+        "Applies many effects chains to one array on native threads.");
+
+    m.def(
+        "build_flow_effects_combine",
+        &build_flow_effects_combine,
+        "Combines several arrays or files and runs an effects chain over them.");
+
+    py::class_<SoxWriter>(m, "SoxWriter")
+        .def(py::init<const std::string&, sox_signalinfo_t*, sox_encodinginfo_t*,
+                      const char*>())
+        .def_property_readonly("frames_written", &SoxWriter::frames_written)
+        .def("write", &SoxWriter::write, "Encodes a chunk of samples.")
+        .def("close", &SoxWriter::close, "Closes the file.");
+
+    py::class_<StreamingEffects>(m, "StreamingEffects")
+        .def(py::init<sox_signalinfo_t*, sox_signalinfo_t*, sox_encodinginfo_t*,
+                      std::vector<SoxEffect>, int, const py::dtype&>())
+        .def_property_readonly("sample_rate", &StreamingEffects::sample_rate)
+        .def_property_readonly("channels", &StreamingEffects::channels)
+        .def("push", &StreamingEffects::push,
+             "Processes a chunk, returns the output it produced.")
+        .def("flush", &StreamingEffects::flush,
+             "Ends the input and returns the remaining output.");
+
     /*
     Class for holding effects.
     */
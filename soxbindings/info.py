@@ -0,0 +1,134 @@
+"""
+Reads the headers of many audio files at once, optionally remembering
+them in an on-disk cache so repeat scans skip the files that haven't
+changed.
+"""
+
+import os
+import sqlite3
+from collections import namedtuple
+import numpy as np
+
+from . import effects
+
+FileInfo = namedtuple('FileInfo', [
+    'rate', 'channels', 'precision', 'length', 'encoding',
+    'bits_per_sample', 'ok'
+])
+FileInfo.__doc__ = """
+Header fields of many files as NumPy arrays, one entry per file. length is
+in samples (frames times channels) like sox_signalinfo_t.length. ok is
+False for files that couldn't be opened, their other fields are 0.
+"""
+
+_COLUMN_DTYPES = [
+    np.float64, np.int32, np.int32, np.int64, np.int32, np.int32, bool
+]
+# sqlite limits the number of parameters in a query
+_QUERY_BATCH = 900
+
+
+class InfoCache:
+    """
+    On-disk cache of file headers, keyed by absolute path, size and 
+    modification time. A file whose size or modification time changed is read again.
+
+    Args:
+        path (str): Path of the cache, an SQLite database that is created
+            if it doesn't exist.
+    """
+    def __init__(self, path):
+        self._db = sqlite3.connect(path)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS info ("
+            "path TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER, "
+            "rate REAL, channels INTEGER, precision INTEGER, length INTEGER, "
+            "encoding INTEGER, bits_per_sample INTEGER)"
+        )
+
+    def _get(self, paths):
+        rows = {}
+        for i in range(0, len(paths), _QUERY_BATCH):
+            batch = paths[i:i + _QUERY_BATCH]
+            query = "SELECT * FROM info WHERE path IN (%s)" % (
+                ','.join('?' * len(batch)))
+            for row in self._db.execute(query, batch):
+                rows[row[0]] = row[1:]
+        return rows
+
+    def _put(self, rows):
+        with self._db:
+            self._db.executemany(
+                "INSERT OR REPLACE INTO info VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                rows
+            )
+
+    def close(self):
+        self._db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _scan(paths, workers):
+    from . import _soxbindings
+    effects._warm_up()
+    with effects._using_sox():
+        return _soxbindings.get_info_many(paths, workers or 0)
+
+
+def get_info_many(paths, workers=None, cache=None):
+    """
+    Reads the headers of many files on a pool of native threads.
+
+    Args:
+        paths (list): Paths of the audio files.
+        workers (int): Number of threads, defaults to the number of cores.
+        cache (InfoCache or str): Cache, or path of a cache, to look the
+            files up in first. Files that are missing from it or changed
+            since are read and added to it.
+
+    Returns:
+        FileInfo: The header fields as columns.
+    """
+    paths = [os.fspath(path) for path in paths]
+    if cache is None:
+        return FileInfo(*_scan(paths, workers))
+    if not isinstance(cache, InfoCache):
+        with InfoCache(cache) as cache:
+            return get_info_many(paths, workers=workers, cache=cache)
+
+    columns = [np.zeros(len(paths), dtype) for dtype in _COLUMN_DTYPES]
+    # same file, same entry, however the path is spelled
+    keys = [os.path.abspath(path) for path in paths]
+    cached = cache._get(keys)
+    stats = []
+    missing = []
+    for i, path in enumerate(paths):
+        try:
+            stat = os.stat(path)
+            stat = (stat.st_size, stat.st_mtime_ns)
+        except OSError:
+            stat = None
+        stats.append(stat)
+        row = cached.get(keys[i])
+        if stat is not None and row is not None and tuple(row[:2]) == stat:
+            for column, value in zip(columns, row[2:]):
+                column[i] = value
+            columns[-1][i] = True
+        else:
+            missing.append(i)
+
+    if missing:
+        scanned = _scan([paths[i] for i in missing], workers)
+        for column, values in zip(columns, scanned):
+            column[missing] = values
+        cache._put([
+            (keys[i], *stats[i]) + tuple(
+                column[i].item() for column in columns[:-1])
+            for i in missing if columns[-1][i] and stats[i] is not None
+        ])
+    return FileInfo(*columns)
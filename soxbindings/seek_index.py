@@ -0,0 +1,234 @@
+"""
+Seek index for MP3 files, so random windows of long files can be decoded
+without decoding them from the start.
+
+libsox seeks in an MP3 by skipping frame headers, which lands up to a
+frame away from the requested sample and garbles the first frame it
+decodes. The index holds the byte offset of every frame instead, and a
+read decodes only the frames around the window, starting early enough
+for the bit reservoir and the synthesis filters to be filled in.
+"""
+
+import functools
+import mmap
+import os
+import numpy as np
+
+from .cache import _save_atomically
+
+# kbit/s for MPEG-1 and for MPEG-2/2.5 layer III
+_BITRATES = {
+    3: [0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320],
+    2: [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+}
+_SAMPLE_RATES = {
+    3: [44100, 48000, 32000],
+    2: [22050, 24000, 16000],
+    0: [11025, 12000, 8000],
+}
+# libmad only decodes a frame followed by at least this many bytes, so a
+# stream that ends right after a frame loses that frame
+_MAD_BUFFER_GUARD = 8
+# furthest back the bit reservoir of a frame can reach
+_MAX_RESERVOIR = 511
+# frames decoded before the window so the decoder state matches a decode
+# from the start of the file
+_WARMUP_FRAMES = 2
+_SIDECAR_SUFFIX = '.seekidx.npz'
+
+
+def _parse_header(data, pos):
+    # (frame bytes, samples per frame, sample rate, channels) of a layer III
+    # frame header, or None
+    header = int.from_bytes(data[pos:pos + 4], 'big')
+    version = (header >> 19) & 3
+    layer = (header >> 17) & 3
+    bitrate = (header >> 12) & 15
+    rate = (header >> 10) & 3
+    if (header >> 21 != 0x7ff or version == 1 or layer != 1 or
+            bitrate in (0, 15) or rate == 3):
+        return None
+    sample_rate = _SAMPLE_RATES[version][rate]
+    samples_per_frame = 1152 if version == 3 else 576
+    bitrate = _BITRATES[3 if version == 3 else 2][bitrate] * 1000
+    frame_bytes = (samples_per_frame // 8 * bitrate // sample_rate +
+                   ((header >> 9) & 1))
+    channels = 1 if (header >> 6) & 3 == 3 else 2
+    return frame_bytes, samples_per_frame, sample_rate, channels
+
+
+def _id3v2_size(data):
+    if data[:3] != b'ID3' or len(data) < 10:
+        return 0
+    size = 0
+    for byte in data[6:10]:
+        size = size << 7 | (byte & 0x7f)
+    # footer flag
+    return 10 + size + (10 if data[5] & 0x10 else 0)
+
+
+class SeekIndex:
+    """
+    Byte offsets of the frames of an MP3 file.
+
+    Args:
+        offsets (np.ndarray): Byte offset of every frame.
+        samples_per_frame (int): Frames of audio decoded from each MP3 frame.
+        sample_rate (int): Sample rate of the file.
+        channels (int): Number of channels of the file.
+        length (int): Frames of audio in the file, as decoded by libsox.
+        size (int): Size of the file the index was built from.
+        mtime_ns (int): Modification time of that file.
+    """
+    def __init__(self, offsets, samples_per_frame, sample_rate, channels,
+                 length, size, mtime_ns):
+        self.offsets = offsets
+        self.samples_per_frame = samples_per_frame
+        self.sample_rate = sample_rate
+        self.channels = channels
+        self.length = length
+        self.size = size
+        self.mtime_ns = mtime_ns
+
+    @classmethod
+    def build(cls, audio_path):
+        """Scans the frame headers of an MP3 file, without decoding it."""
+        stat = os.stat(audio_path)
+        if stat.st_size == 0:
+            raise ValueError(f"{audio_path} is empty")
+        with open(audio_path, 'rb') as f, \
+                mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            offsets = []
+            first = None
+            pos = _id3v2_size(data)
+            end = pos
+            while pos + 4 <= len(data):
+                frame = _parse_header(data, pos)
+                if frame is not None and first is None:
+                    # only trust the first header if another one follows it
+                    following = _parse_header(data, pos + frame[0])
+                    if following is None or following[1:] != frame[1:]:
+                        frame = None
+                    else:
+                        first = frame
+                if frame is None or frame[1:] != first[1:]:
+                    pos += 1
+                    continue
+                offsets.append(pos)
+                pos += frame[0]
+                end = pos
+        if first is None:
+            raise ValueError(f"{audio_path} has no MP3 frames")
+
+        _, samples_per_frame, sample_rate, channels = first
+        frames = len(offsets)
+        if stat.st_size - end < _MAD_BUFFER_GUARD:
+            frames -= 1
+        return cls(
+            np.array(offsets, dtype=np.int64), samples_per_frame, sample_rate,
+            channels, frames * samples_per_frame, stat.st_size,
+            stat.st_mtime_ns
+        )
+
+    @classmethod
+    def load(cls, index_path):
+        with np.load(index_path) as f:
+            return cls(f['offsets'], *(int(x) for x in f['header']))
+
+    def save(self, index_path):
+        header = np.array([
+            self.samples_per_frame, self.sample_rate, self.channels,
+            self.length, self.size, self.mtime_ns
+        ], dtype=np.int64)
+        _save_atomically(index_path, lambda f: np.savez(
+            f, offsets=self.offsets, header=header))
+
+    def matches(self, audio_path):
+        """Whether the file is still the one the index was built from."""
+        stat = os.stat(audio_path)
+        return (stat.st_size, stat.st_mtime_ns) == (self.size, self.mtime_ns)
+
+    def read(self, audio_path, nframes=0, offset=0, dtype=np.float64):
+        """
+        Decodes nframes frames (to the end of the file if 0) from offset,
+        same as soxbindings.read(audio_path, nframes, offset).
+        """
+        from .audio import read_bytes
+        spf = self.samples_per_frame
+        total = len(self.offsets)
+        decoded = self.length // spf
+        if offset >= self.length or offset < 0:
+            raise RuntimeError("Offset past EOF")
+        stop = self.length if nframes <= 0 else min(
+            offset + nframes, self.length)
+
+        first = offset // spf
+        last = (stop - 1) // spf
+        # the frame after the window is lost to the missing guard bytes
+        end = min(last + 2, total)
+        dropped_at_end = 1 if end < total else total - decoded
+        start = int(np.searchsorted(
+            self.offsets, self.offsets[first] - _MAX_RESERVOIR, 'right')) - 1
+        start = max(0, start - _WARMUP_FRAMES)
+        with open(audio_path, 'rb') as f:
+            while True:
+                f.seek(self.offsets[start])
+                chunk = f.read(
+                    self.offsets[end] - self.offsets[start]
+                    if end < total else -1)
+                data, sample_rate = read_bytes(
+                    chunk, file_type='mp3', dtype=dtype)
+                # frames whose bit reservoir lies before the chunk can't
+                # be decoded and are skipped
+                skipped = end - start - dropped_at_end - len(data) // spf
+                if skipped < 0 or len(data) % spf:
+                    raise RuntimeError(
+                        f"{audio_path} doesn't match its seek index")
+                if start == 0 or start + skipped <= first - _WARMUP_FRAMES:
+                    break
+                start = max(0, start - _WARMUP_FRAMES)
+
+        begin = offset - (start + skipped) * spf
+        return data[begin:begin + stop - offset], sample_rate
+
+
+def _sidecar_path(audio_path):
+    return audio_path + _SIDECAR_SUFFIX
+
+
+@functools.lru_cache(maxsize=256)
+def _cached_index(audio_path, size, mtime_ns, sidecar):
+    if sidecar:
+        try:
+            index = SeekIndex.load(_sidecar_path(audio_path))
+            if (index.size, index.mtime_ns) == (size, mtime_ns):
+                return index
+        except (OSError, ValueError, KeyError):
+            pass
+    index = SeekIndex.build(audio_path)
+    if sidecar:
+        try:
+            index.save(_sidecar_path(audio_path))
+        except OSError:
+            # e.g. a read-only dataset, keep the index in memory only
+            pass
+    return index
+
+
+def get_seek_index(audio_path, sidecar=False):
+    """
+    Returns the seek index of an MP3 file, building it on first use. Indexes
+    are kept in an in-process LRU cache and rebuilt when the file changes.
+
+    Args:
+        audio_path (str): Path of the MP3 file.
+        sidecar (bool): Also persist the index next to the file, as
+            audio_path + '.seekidx.npz', so other processes and later runs
+            load it instead of scanning the file.
+
+    Returns:
+        SeekIndex: The index.
+    """
+    audio_path = os.fspath(audio_path)
+    stat = os.stat(audio_path)
+    return _cached_index(audio_path, stat.st_size, stat.st_mtime_ns, sidecar)
@@ -25,6 +25,8 @@ from . import (
     SoxEffect,
     build_flow_effects,
 )
+from . import effects
+from .effects import build_flow_effects_file, combine, COMBINE_METHODS
 
 PIPE_CHAR = '-'
 GLOBAL_OPTIONS = [
@@ -38,31 +40,37 @@ GLOBAL_OPTIONS = [
 IGNORED_OPTIONS = [
     '--ignore-length'
 ]
+# short forms of --combine
+COMBINE_OPTIONS = {
+    '-m': 'mix',
+    '-M': 'merge',
+    '-T': 'multiply',
+}
 
 
-# single input, single output
-def sox(args, input_audio=None, sample_rate_in=None):
-    """
-    Main entry point into sox. Parses the arguments.
-    Only works for single input/single output 
-    combination.  Supports numpy arrays that
-    already have the samples loaded via some 
-    other means (e.g. soxbindings.read, soundfile.read),
-    etc. Alternatively, can be read off the command line
-    arguments `args`.
-    
-    Note:
-        Does not implement combine operations, only 
-        effects chains!
+_AVAILABLE_EFFECTS = None
 
-    Args:
-        args (str): Command line arguments to sox.
+def _available_effects():
+    # the effect names are fixed for the lifetime of libsox, so look them up
+    # once rather than on every call
+    global _AVAILABLE_EFFECTS
+    if _AVAILABLE_EFFECTS is None:
+        _AVAILABLE_EFFECTS = frozenset(get_available_effects())
+    return _AVAILABLE_EFFECTS
+
+def _parse_command(args):
+    """
+    Splits command line arguments to sox into the combine method (None
+    for a single input without one), the format flags of every input 
+    file, the format flags of the output file, the input file names, the 
+    output file name and the arguments of each effect.
     """
     if isinstance(args, str):
         args = args.split()
+    args = list(args)
     if args[0] == 'sox':
         args.pop(0)
-    available_fx = get_available_effects()
+    available_fx = _available_effects()
     fx_idx = [a in available_fx for a in args]
     if True in fx_idx:
         fx_idx = fx_idx.index(True)
@@ -71,11 +79,17 @@ def sox(args, input_audio=None, sample_rate_in=None):
 
     io_args = args[:fx_idx]
     fx_args = args[fx_idx:]
+    method = None
     flags = []
     i = 0
     while (i < len(io_args)):
         io_arg = io_args[i]
-        if io_arg != PIPE_CHAR:
+        if io_arg in COMBINE_OPTIONS:
+            method = COMBINE_OPTIONS[io_arg]
+        elif io_arg == '--combine' and i < len(io_args) - 1:
+            method = io_args[i + 1]
+            i += 1
+        elif io_arg != PIPE_CHAR:
             if io_arg.startswith('-'):
                 _flag = [io_arg]
                 if (
@@ -93,10 +107,6 @@ def sox(args, input_audio=None, sample_rate_in=None):
             flags.append(('file', io_arg))
         i += 1
     
-    # check for combine
-    if '--combine' in io_args:
-        raise NotImplementedError("--combine is not implemented!")
-    
     group = []
     groups = []
     for i, flag in enumerate(flags):
@@ -116,57 +126,85 @@ def sox(args, input_audio=None, sample_rate_in=None):
     groups[0] = group0
     
     files = [x[-1][-1] for x in groups]
-    input_file = files[0]
+    input_files = files[:-1]
     output_file = files[-1]
+    if method is None and len(input_files) > 1:
+        # sox's default for several inputs
+        method = 'concatenate'
+    if method is not None and method not in COMBINE_METHODS:
+        raise NotImplementedError(f"--combine {method} is not implemented!")
+
+    for flag in groups[-1]:
+        if flag[0] == '-c':
+            fx_args.extend(['channels', flag[1]])
+
+    fx_group = []
+    fx_groups = []
+    for i, fx_arg in enumerate(fx_args):
+        if fx_arg in available_fx:
+            if fx_group:
+                fx_groups.append(fx_group)
+                fx_group = []
+        fx_group.append(fx_arg)
+        
+    if fx_group:
+        fx_groups.append(fx_group)
+    return (method, groups[:-1], groups[-1], input_files, output_file, 
+            fx_groups)
 
-    # figure out how to modify each file according
-    # to the flags.
+def _parse_args(args):
+    """
+    Same as _parse_command for a single input file: the format flags of 
+    the input file, the format flags of the output file, the two file 
+    names and the arguments of each effect.
+    """
+    method, input_groups, output_flags, input_files, output_file, fx_groups = (
+        _parse_command(args)
+    )
+    if method is not None:
+        raise NotImplementedError(
+            "combining several inputs is only supported by sox()")
+    return input_groups[0], output_flags, input_files[0], output_file, fx_groups
+
+def _input_format(input_flags, sample_rate_in=None):
+    """
+    Reads the channels, precision and sample rate of the input off
+    its format flags, flags take precedence over sample_rate_in.
+    """
     in_channels = None
     in_precision = 32
-    out_channels = None
-    sample_rate_out = None
-    out_precision = None
 
-    for flag in groups[0]:
+    for flag in input_flags:
         if flag[0] == '-c':
             in_channels = int(flag[1])
         if flag[0] == '-b':
             in_precision = int(flag[1])
         if flag[0] == '-r':
             sample_rate_in = float(flag[1])
+    return sample_rate_in, in_channels, in_precision
 
-    if input_audio is None:
-        input_audio, sample_rate_in = read(input_file)
-        read_channels = input_audio.shape[-1]
-        if in_channels is None:
-            in_channels = read_channels
-        elif in_channels != read_channels:
-            input_audio = input_audio.reshape(-1, in_channels)
-    
+def _effects_chain(output_flags, fx_groups, sample_rate_in, in_channels,
+                   in_precision):
+    """
+    Builds the SoxEffect objects for the effect groups and works out the
+    format of the output. Returns the chain and the keyword arguments for
+    build_flow_effects.
+    """
+    out_channels = None
+    sample_rate_out = None
+    out_precision = None
     sox_effects_chain = []
     add_rate = False
 
-    for flag in groups[1]:
+    for flag in output_flags:
         if flag[0] == '-r':
             sample_rate_out = float(flag[1])
             add_rate = True
         if flag[0] == '-c':
-            fx_args.extend(['channels', flag[1]])
             out_channels = int(flag[1])
         if flag[0] == '-b':
             out_precision = int(flag[1])
 
-    fx_group = []
-    fx_groups = []
-    for i, fx_arg in enumerate(fx_args):
-        if fx_arg in available_fx:
-            if fx_group:
-                fx_groups.append(fx_group)
-                fx_group = []
-        fx_group.append(fx_arg)
-        
-    if fx_group:
-        fx_groups.append(fx_group)
     current_sample_rate = sample_rate_in
 
     for fx in fx_groups:
@@ -220,18 +258,199 @@ def sox(args, input_audio=None, sample_rate_in=None):
       
     if out_precision is None:
         out_precision = in_precision
-    
+
+    flow_args = dict(
+        in_channels=in_channels,
+        in_precision=in_precision,
+        out_channels=out_channels,
+        out_precision=out_precision,
+        sample_rate_out=sample_rate_out,
+    )
+    return sox_effects_chain, flow_args
+
+# single input, single output
+def sox(args, input_audio=None, sample_rate_in=None, dtype=np.float64,
+        return_output=True):
+    """
+    Main entry point into sox. Parses the arguments.
+    Works for a single output. Supports numpy arrays that
+    already have the samples loaded via some 
+    other means (e.g. soxbindings.read, soundfile.read),
+    etc. Alternatively, can be read off the command line
+    arguments `args`.
+
+    Several inputs are combined like sox does, with 
+    --combine (concatenate, merge, mix, mix-power or 
+    multiply, or -m, -M and -T), concatenating them by 
+    default. A per input -v sets its volume. The inputs 
+    are decoded and combined block by block inside the 
+    effects chain. --combine sequence is not implemented.
+
+    Args:
+        args (str): Command line arguments to sox.
+        input_audio (np.ndarray): Audio to use for the input file '-'.
+        sample_rate_in (int): Sample rate of input_audio.
+        dtype (np.dtype): dtype of the returned audio, one of float64, 
+            float32, int32 or int16.
+        return_output (bool): Whether to return the output audio when it
+            is also written to a file. If False and both ends are files, 
+            the file is streamed through the effects with constant memory
+            and None is returned in place of the audio.
+    """
+    output_audio, rate, _ = _sox(
+        args, input_audio, sample_rate_in, dtype, return_output)
+    return output_audio, rate
+
+def _sox(args, input_audio=None, sample_rate_in=None, dtype=np.float64,
+         return_output=True):
+    # returns the output audio (or None), its sample rate and its length
+    method, input_groups, output_flags, input_files, output_file, fx_groups = (
+        _parse_command(args)
+    )
+    stream_to_file = not return_output and output_file != PIPE_CHAR
+    if method is not None:
+        return _sox_combine(
+            method, input_groups, output_flags, input_files, output_file,
+            fx_groups, input_audio, sample_rate_in, dtype, stream_to_file)
+    input_flags, input_file = input_groups[0], input_files[0]
+    sample_rate_in, in_channels, in_precision = _input_format(
+        input_flags, sample_rate_in)
+
+    if input_audio is None:
+        from . import _soxbindings
+        reader = _soxbindings.SoxReader(input_file, None, None, None)
+        try:
+            sample_rate_in = reader.sample_rate
+            read_channels = reader.channels
+            if in_channels is None:
+                in_channels = read_channels
+            if in_channels == read_channels:
+                # the chain decodes straight from the file, so it is opened
+                # and decoded once
+                sox_effects_chain, flow_args = _effects_chain(
+                    output_flags, fx_groups, sample_rate_in, in_channels,
+                    in_precision)
+                del flow_args['in_channels']
+                if stream_to_file:
+                    frames, rate = build_flow_effects_file(
+                        reader, sox_effects_chain, output_file=output_file,
+                        **flow_args)
+                    return None, rate, frames
+                output_audio, rate = build_flow_effects_file(
+                    reader, sox_effects_chain, dtype=dtype, **flow_args)
+            else:
+                # the samples are reinterpreted with a different channel
+                # count, int32 are the raw sox samples so nothing is
+                # converted on the way into the effects chain. The header
+                # length can be missing or, for MP3, an estimate, so read
+                # to the end of the file
+                blocks = []
+                while True:
+                    block = reader.read(2 ** 16, np.dtype(np.int32))
+                    if block.size == 0:
+                        break
+                    blocks.append(block)
+                input_audio = np.concatenate(
+                    blocks or [np.zeros(0, np.int32)]).reshape(-1, in_channels)
+        finally:
+            reader.close()
+
     if input_audio is not None:
+        if in_channels is None:
+            in_channels = 1 if input_audio.ndim == 1 else input_audio.shape[-1]
+        sox_effects_chain, flow_args = _effects_chain(
+            output_flags, fx_groups, sample_rate_in, in_channels, 
+            in_precision)
         output_audio, rate = build_flow_effects(
             input_audio,
             sample_rate_in,
             sox_effects_chain,
-            in_channels=in_channels,
-            in_precision=in_precision,
-            out_channels=out_channels,
-            out_precision=out_precision,
-            sample_rate_out=sample_rate_out
+            dtype=dtype,
+            **flow_args
         )
-        if output_file != PIPE_CHAR:
-            write(output_file, output_audio, rate, out_precision)
-        return output_audio, rate
+    if output_file != PIPE_CHAR:
+        write(output_file, output_audio, rate, flow_args['out_precision'])
+    frames = output_audio.shape[0]
+    if stream_to_file:
+        output_audio = None
+    return output_audio, rate, frames
+
+def _sox_combine(method, input_groups, output_flags, input_files, output_file,
+                 fx_groups, input_audio, sample_rate_in, dtype, stream_to_file):
+    # the files are opened once, their format is read off the open readers
+    # and combine decodes from them
+    readers = []
+    with effects._using_sox():
+        try:
+            return _combine_inputs(
+                method, input_groups, output_flags, input_files,
+                output_file, fx_groups, input_audio, sample_rate_in, dtype,
+                stream_to_file, readers)
+        finally:
+            for reader in readers:
+                reader.close()
+
+def _combine_inputs(method, input_groups, output_flags, input_files,
+                    output_file, fx_groups, input_audio, sample_rate_in,
+                    dtype, stream_to_file, readers):
+    # several inputs are combined inside the effects chain, '-' stands for
+    # input_audio. The files are opened into readers
+    from . import _soxbindings
+    inputs, volumes, rates, channels, precisions = [], [], [], [], []
+    user_volume = False
+    for input_flags, input_file in zip(input_groups, input_files):
+        rate, flag_channels, precision = _input_format(
+            input_flags, sample_rate_in)
+        volume = 1.0
+        for flag in input_flags:
+            if flag[0] == '-v':
+                volume = float(flag[1])
+                user_volume = True
+        volumes.append(volume)
+        if input_file == PIPE_CHAR:
+            if input_audio is None:
+                raise ValueError("the input '-' needs input_audio")
+            audio = input_audio
+            if flag_channels is not None:
+                audio = audio.reshape(-1, flag_channels)
+            inputs.append(audio)
+            rates.append(rate)
+            channels.append(1 if audio.ndim == 1 else audio.shape[-1])
+            precisions.append(precision)
+        else:
+            reader = _soxbindings.SoxReader(input_file, None, None, None)
+            readers.append(reader)
+            inputs.append(reader)
+            rates.append(reader.sample_rate)
+            channels.append(reader.channels)
+            precisions.append(reader.signal.precision)
+
+    # the rate of the '-' inputs, read off their -r flags or sample_rate_in
+    array_rates = set(
+        r for r, i in zip(rates, inputs) if isinstance(i, np.ndarray))
+    if None in array_rates:
+        raise ValueError("the input '-' needs a sample rate")
+    if len(array_rates) > 1:
+        raise ValueError("inputs must have the same sample rate")
+    if array_rates:
+        sample_rate_in = array_rates.pop()
+
+    sox_effects_chain, flow_args = _effects_chain(
+        output_flags, fx_groups, rates[0],
+        effects._combined_channels(method, channels), max(precisions))
+    del flow_args['in_channels']
+    # the arrays' precision, files have their own
+    flow_args['in_precision'] = max(
+        [p for p, i in zip(precisions, inputs) if isinstance(i, np.ndarray)],
+        default=flow_args['in_precision'])
+    output_audio, rate = combine(
+        inputs, sample_rate_in, method=method,
+        volumes=volumes if user_volume else None,
+        sox_effects_chain=sox_effects_chain, dtype=dtype,
+        output_file=output_file if stream_to_file else None, **flow_args)
+    if stream_to_file:
+        return None, rate, output_audio
+    if output_file != PIPE_CHAR:
+        write(output_file, output_audio, rate, flow_args['out_precision'])
+    return output_audio, rate, output_audio.shape[0]
+
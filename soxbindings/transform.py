@@ -20,22 +20,20 @@ pysox.transform.VALID_FORMATS = [
 
 from sox.log import logger
 from .sox_cli import sox
-from .audio import get_info
 import numpy as np
 
 class Transformer(BaseTransformer):
-    def build(self, input_filepath=None, output_filepath=None,
-              input_array=None, sample_rate_in=None,
-              extra_args=None, return_output=False):
-        
-        if input_filepath is not None:
-            channels = get_info(input_filepath)[0].channels
-            self.set_input_format(
-                channels=channels
+    def _build_args(self, input_filepath, output_filepath, input_array,
+                    sample_rate_in, extra_args):
+        if input_filepath is not None and input_array is None:
+            # sox() takes the channels from the file when it opens it, so 
+            # skip _parse_inputs, which would look them up with soxi
+            pysox.file_info.validate_input_file(input_filepath)
+            input_format = self.input_format
+        else:
+            input_format, input_filepath = self._parse_inputs(
+                input_filepath, input_array, sample_rate_in
             )
-        input_format, input_filepath = self._parse_inputs(
-            input_filepath, input_array, sample_rate_in
-        )
 
         if output_filepath is None:
             raise ValueError("output_filepath is not specified!")
@@ -52,12 +50,46 @@ class Transformer(BaseTransformer):
             if not isinstance(extra_args, list):
                 raise ValueError("extra_args must be a list.")
             args.extend(extra_args)
-        output_audio, sample_rate_out = sox(args, input_array, sample_rate_in)
+        return args
+
+    def build(self, input_filepath=None, output_filepath=None,
+              input_array=None, sample_rate_in=None,
+              extra_args=None, return_output=False, dtype=np.float64):
+        args = self._build_args(
+            input_filepath, output_filepath, input_array, sample_rate_in,
+            extra_args)
+        output_audio, sample_rate_out = sox(
+            args, input_array, sample_rate_in, dtype=dtype)
         return output_audio, sample_rate_out
 
+    def build_file(self, input_filepath=None, output_filepath=None,
+                   input_array=None, sample_rate_in=None,
+                   extra_args=None, return_output=False):
+        """
+        Writes the output to output_filepath and returns True, like pysox. 
+        A file input is streamed through the effects into the output file, 
+        so memory stays constant however long the file is.
+        """
+        args = self._build_args(
+            input_filepath, output_filepath, input_array, sample_rate_in,
+            extra_args)
+        sox(args, input_array, sample_rate_in, return_output=False)
+        return True
+
     def build_array(self, input_filepath=None, input_array=None,
-                    sample_rate_in=None, extra_args=None):
+                    sample_rate_in=None, extra_args=None, dtype=np.float64,
+                    cache=None):
+        """
+        Returns the output as an array, like pysox. With a TransformCache
+        as cache the output is looked up there first, and added to it 
+        otherwise.
+        """
+        if cache is not None:
+            return cache.build_array(
+                self, input_filepath=input_filepath, input_array=input_array,
+                sample_rate_in=sample_rate_in, extra_args=extra_args,
+                dtype=dtype)
         output_audio, sample_rate_out = self.build(input_filepath=input_filepath, 
             output_filepath='-', input_array=input_array, sample_rate_in=sample_rate_in, 
-            extra_args=extra_args)
+            extra_args=extra_args, dtype=dtype)
         return output_audio
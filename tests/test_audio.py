@@ -2,8 +2,11 @@ import soxbindings
 import soundfile as sf 
 import numpy as np 
 import tempfile
+import os
 import pytest
+import pickle
 import subprocess
+import sys
 from soxbindings import sox_context
 from sox import logger
 
@@ -79,4 +82,681 @@ def test_against_sox(command):
                 with open('tests/failed_.txt', 'a+') as f:
                     f.write(command + '\n')
                 raise(e)
-        
\ No newline at end of file
+        
+def _vol_chain(gain):
+    effect = soxbindings.SoxEffect()
+    effect.effect_name = 'vol'
+    effect.effect_args = [str(gain)]
+    return [effect]
+
+@pytest.mark.parametrize("input_file", INPUT_FILES)
+@pytest.mark.parametrize("dtype", [np.float32, np.int16, np.int32])
+def test_build_flow_effects_input_dtypes(input_file, dtype):
+    data, rate = soxbindings.read(input_file)
+    expected, _ = soxbindings.build_flow_effects(
+        data, rate, _vol_chain(0.5), in_precision=32)
+
+    if np.issubdtype(dtype, np.integer):
+        scale = np.iinfo(dtype).max + 1
+        converted = np.round(data * scale).clip(
+            np.iinfo(dtype).min, np.iinfo(dtype).max).astype(dtype)
+    else:
+        converted = data.astype(dtype)
+    output, out_rate = soxbindings.build_flow_effects(
+        converted, rate, _vol_chain(0.5), in_precision=32)
+
+    assert out_rate == rate
+    assert output.shape == expected.shape
+    assert np.allclose(output, expected, atol=1e-4)
+
+def test_pickled_dtypes():
+    # arrays coming back from multiprocessing workers carry dtypes that are
+    # equal to, but not the same object as, numpy's own
+    data, rate = soxbindings.read(INPUT_FILES[0], dtype=np.float32)
+    pickled = pickle.loads(pickle.dumps(data))
+    assert pickled.dtype is not np.dtype(np.float32)
+    expected, _ = soxbindings.build_flow_effects(
+        data, rate, _vol_chain(0.5), in_precision=32)
+    output, _ = soxbindings.build_flow_effects(
+        pickled, rate, _vol_chain(0.5), in_precision=32)
+    assert np.array_equal(output, expected)
+
+    dtype = pickle.loads(pickle.dumps(np.dtype(np.float32)))
+    output, _ = soxbindings.read(INPUT_FILES[0], dtype=dtype)
+    assert np.array_equal(output, data)
+
+@pytest.mark.parametrize("input_file", INPUT_FILES)
+@pytest.mark.parametrize("dtype", ['float32', 'float64', 'int16', 'int32'])
+def test_read_dtype(input_file, dtype):
+    sox_data, sox_rate = soxbindings.read(input_file, dtype=dtype)
+    sf_data, sf_rate = sf.read(input_file, always_2d=True, dtype=dtype)
+
+    assert sox_data.dtype == np.dtype(dtype)
+    assert np.array_equal(sox_data, sf_data)
+    assert sox_rate == sf_rate
+
+@pytest.mark.parametrize("input_file", INPUT_FILES)
+@pytest.mark.parametrize("dtype", [np.float32, np.int16, np.int32])
+def test_build_flow_effects_output_dtypes(input_file, dtype):
+    data, rate = soxbindings.read(input_file)
+    expected, _ = soxbindings.build_flow_effects(
+        data, rate, _vol_chain(0.5), in_precision=32)
+    output, _ = soxbindings.build_flow_effects(
+        data, rate, _vol_chain(0.5), in_precision=32, dtype=dtype)
+
+    assert output.dtype == dtype
+    assert output.shape == expected.shape
+    if np.issubdtype(dtype, np.integer):
+        output = output / (np.iinfo(dtype).max + 1)
+    assert np.allclose(output, expected, atol=1e-4)
+
+@pytest.mark.parametrize("input_file", INPUT_FILES)
+@pytest.mark.parametrize("block_frames", [1000, 4096, 44100])
+@pytest.mark.parametrize("offset,nframes", [(0, 0), (500, 0), (1000, 20000)])
+def test_stream(input_file, block_frames, offset, nframes):
+    expected, _ = soxbindings.read(input_file, nframes=nframes, offset=offset)
+    blocks = list(soxbindings.stream(
+        input_file, block_frames, offset=offset, nframes=nframes))
+
+    assert all(b.shape[0] == block_frames for b in blocks[:-1])
+    assert 0 < blocks[-1].shape[0] <= block_frames
+    assert np.array_equal(np.concatenate(blocks), expected)
+
+@pytest.mark.parametrize("input_file", INPUT_FILES)
+def test_stream_offset_past_eof(input_file):
+    length = soxbindings.read(input_file)[0].shape[0]
+    assert len(list(soxbindings.stream(input_file, 1000, offset=length))) == 0
+    # same error as read
+    with pytest.raises(RuntimeError, match="Offset past EOF"):
+        soxbindings.read(input_file, offset=length + 1)
+    with pytest.raises(RuntimeError, match="Offset past EOF"):
+        list(soxbindings.stream(input_file, 1000, offset=length + 1))
+
+@pytest.mark.parametrize("input_file", INPUT_FILES)
+def test_stream_into_buffer(input_file):
+    expected, _ = soxbindings.read(input_file, dtype=np.float32)
+    out = np.empty((4096, expected.shape[1]), dtype=np.float32)
+
+    position = 0
+    for block in soxbindings.stream(input_file, 4096, out=out):
+        assert np.shares_memory(block, out)
+        assert np.array_equal(block, expected[position:position + len(block)])
+        position += len(block)
+    assert position == expected.shape[0]
+
+def _effects_chain(*effects):
+    chain = []
+    for name, args in effects:
+        effect = soxbindings.SoxEffect()
+        effect.effect_name = name
+        effect.effect_args = args
+        chain.append(effect)
+    return chain
+
+@pytest.mark.parametrize("input_file", INPUT_FILES)
+@pytest.mark.parametrize("effects", [
+    [('vol', ['0.5'])],
+    [('rate', ['-h', '8000'])],
+    [('reverb', ['50'])],
+    [('highpass', ['300']), ('compand', ['0.3,1', '6:-70,-60,-20', '-5'])],
+])
+def test_streaming_effects(input_file, effects):
+    data, rate = soxbindings.read(input_file)
+    expected, expected_rate = soxbindings.build_flow_effects(
+        data, rate, _effects_chain(*effects), in_precision=32)
+
+    chunk_frames = int(rate * 0.02)
+    with soxbindings.StreamingEffects(
+            rate, _effects_chain(*effects), in_channels=data.shape[1],
+            in_precision=32) as streamer:
+        chunks = [
+            streamer.push(data[i:i + chunk_frames])
+            for i in range(0, data.shape[0], chunk_frames)
+        ]
+        chunks.append(streamer.flush())
+
+    assert streamer.sample_rate == expected_rate
+    assert np.array_equal(np.concatenate(chunks), expected)
+
+@pytest.mark.parametrize("input_file", INPUT_FILES)
+def test_flow_stats(input_file):
+    data, rate = soxbindings.read(input_file)
+    effects = _effects_chain(('gain', ['12']), ('rate', ['16000']))
+    expected, _ = soxbindings.build_flow_effects(
+        data, rate, effects, in_precision=32)
+    output, out_rate, stats = soxbindings.build_flow_effects(
+        data, rate, effects, in_precision=32, return_stats=True)
+
+    assert np.array_equal(output, expected)
+    assert stats.buffer_size > 0
+    names = [effect.name for effect in stats.effects]
+    assert names == ['input_source', 'gain', 'rate', 'output_sink']
+    for before, after in zip(stats.effects, stats.effects[1:]):
+        assert before.samples_out == after.samples_in
+    assert stats.effects[0].samples_out == data.size
+    assert stats.effects[-1].samples_in == output.size
+    assert stats.effects[1].clips > 0
+    assert all(effect.seconds >= 0 for effect in stats.effects)
+
+def test_profile():
+    data, rate = soxbindings.read(INPUT_FILES[0])
+    effects = _effects_chain(('vol', ['0.5']), ('reverb', ['50']))
+    soxbindings.get_profile(reset=True)
+    soxbindings.enable_profiling()
+    try:
+        for _ in range(3):
+            soxbindings.build_flow_effects(data, rate, effects)
+        soxbindings.build_flow_effects_batch([data, data], rate, effects)
+    finally:
+        soxbindings.enable_profiling(False)
+    profile = soxbindings.get_profile(reset=True)
+
+    assert profile['reverb'].chains == 5
+    assert profile['vol'].samples_in == 5 * data.size
+    assert soxbindings.get_profile() == {}
+    soxbindings.build_flow_effects(data, rate, effects)
+    assert soxbindings.get_profile() == {}
+
+@pytest.mark.parametrize("input_file", INPUT_FILES)
+@pytest.mark.parametrize("args", [
+    "- - vol 0.5",
+    "- -r 8000 - highpass 300",
+    "- -c 1 - reverb 50",
+    "- - pitch 200",
+    "- - rate -v 22050 remix 1",
+])
+def test_effects_chain(input_file, args):
+    data, rate = soxbindings.read(input_file)
+    expected, expected_rate = soxbindings.sox(args, data, rate)
+
+    chain = soxbindings.EffectsChain.compile(args)
+    for _ in range(2):
+        output, out_rate = chain.apply(data, rate)
+        assert out_rate == expected_rate
+        assert np.array_equal(output, expected)
+    assert len(chain._chains) == 1
+    assert chain.output_format(rate, data.shape[1]) == (
+        out_rate, output.shape[1])
+
+@pytest.mark.parametrize("input_file", INPUT_FILES)
+def test_effects_chain_from_transformer(input_file):
+    data, rate = soxbindings.read(input_file)
+    tfm = soxbindings.Transformer()
+    tfm.vol(0.5)
+    tfm.reverb()
+    tfm.set_output_format(rate=8000)
+    expected = tfm.build_array(input_array=data, sample_rate_in=rate)
+
+    output, out_rate = soxbindings.EffectsChain.compile(tfm).apply(data, rate)
+    assert out_rate == 8000
+    assert np.array_equal(output, expected)
+
+    with pytest.raises(ValueError):
+        soxbindings.EffectsChain.compile("in.wav - vol 0.5")
+
+@pytest.mark.parametrize("input_file", INPUT_FILES)
+@pytest.mark.parametrize("effects", [
+    "trim 1.5 0.5",
+    "trim 0 1 vol 0.5",
+    "rate 8000 reverb 50",
+])
+def test_sox_file_input(input_file, effects):
+    data, rate = soxbindings.read(input_file, dtype=np.int32)
+    expected, expected_rate = soxbindings.sox(
+        '- - ' + effects, data, rate)
+    output, out_rate = soxbindings.sox(f'{input_file} - {effects}')
+
+    assert out_rate == expected_rate
+    assert np.array_equal(output, expected)
+
+def test_sox_file_input_channels():
+    # reinterpreting the channels reads the whole file, not just the length
+    # in its header, which is only an estimate for MP3
+    mp3 = 'tests/data/mix.mp3'
+    data, rate = soxbindings.read(mp3, dtype=np.int32)
+    expected, _ = soxbindings.sox('-c 1 - - vol 0.5', data.reshape(-1), rate)
+    output, _ = soxbindings.sox(f'-c 1 {mp3} - vol 0.5')
+    assert output.size == data.size
+    assert np.array_equal(output, expected)
+
+@pytest.mark.parametrize("input_file", INPUT_FILES)
+def test_transformer_file_input(input_file):
+    data, rate = soxbindings.read(input_file)
+    tfm = soxbindings.Transformer()
+    tfm.trim(1, 2)
+    expected = tfm.build_array(input_array=data, sample_rate_in=rate)
+    output = tfm.build_array(input_filepath=input_file)
+
+    assert np.array_equal(output, data[rate:2 * rate])
+    assert np.array_equal(output, expected)
+
+@pytest.mark.parametrize("input_file", INPUT_FILES)
+@pytest.mark.parametrize("output_flags,effects", [
+    ("-b 16", "rate 8000"),
+    ("-c 1 -b 24", "trim 1 2 norm"),
+    ("", "highpass 300 reverb 50"),
+])
+def test_sox_file_to_file(input_file, output_flags, effects):
+    with tempfile.NamedTemporaryFile(suffix='.wav') as f1, \
+            tempfile.NamedTemporaryFile(suffix='.wav') as f2:
+        expected, expected_rate = soxbindings.sox(
+            f'{input_file} {output_flags} {f1.name} {effects}')
+        output, rate = soxbindings.sox(
+            f'{input_file} {output_flags} {f2.name} {effects}', 
+            return_output=False)
+        assert output is None
+        assert rate == expected_rate
+
+        expected, _ = soxbindings.read(f1.name, dtype=np.int32)
+        written, written_rate = soxbindings.read(f2.name, dtype=np.int32)
+        assert written_rate == expected_rate
+        assert np.array_equal(written, expected)
+        assert sf.info(f1.name).subtype == sf.info(f2.name).subtype
+
+@pytest.mark.parametrize("input_file", INPUT_FILES)
+def test_transformer_build_file(input_file):
+    tfm = soxbindings.Transformer()
+    tfm.vol(0.5)
+    tfm.set_output_format(rate=16000, bits=16)
+    expected = tfm.build_array(input_filepath=input_file)
+    with tempfile.NamedTemporaryFile(suffix='.wav') as f:
+        assert tfm.build_file(input_file, f.name)
+        written, rate = soxbindings.read(f.name)
+    assert rate == 16000
+    assert np.array_equal(written, expected)
+
+@pytest.mark.parametrize("input_file", INPUT_FILES)
+@pytest.mark.parametrize("dtype", [np.float64, np.float32, np.int32, np.int16])
+@pytest.mark.parametrize("precision", [16, 24])
+def test_sox_writer(input_file, dtype, precision):
+    data, rate = soxbindings.read(input_file, dtype=dtype)
+    with tempfile.NamedTemporaryFile(suffix='.wav') as f1, \
+            tempfile.NamedTemporaryFile(suffix='.wav') as f2:
+        soxbindings.write(f1.name, data, rate, precision)
+        with soxbindings.SoxWriter(
+                f2.name, rate, data.shape[1], precision) as writer:
+            for i in range(0, data.shape[0], 1000):
+                assert writer.write(data[i:i + 1000]) == len(data[i:i + 1000])
+            assert writer.frames_written == data.shape[0]
+            with pytest.raises(ValueError):
+                writer.write(np.zeros((100, data.shape[1] + 1), dtype))
+
+        expected, _ = soxbindings.read(f1.name, dtype=np.int32)
+        written, written_rate = soxbindings.read(f2.name, dtype=np.int32)
+        assert written_rate == rate
+        assert np.array_equal(written, expected)
+        assert sf.info(f2.name).subtype == 'PCM_%d' % precision
+        original, _ = soxbindings.read(input_file, dtype=np.int32)
+        assert np.array_equal(written, original)
+
+@pytest.mark.parametrize("subtype,suffix,dtype", [
+    ('PCM_16', '.wav', np.int16), 
+    ('PCM_32', '.wav', np.int32),
+    ('PCM_16', '.aiff', np.int16), 
+    ('FLOAT', '.wav', np.float32), 
+    ('DOUBLE', '.wav', np.float64),
+])
+def test_read_mmap(subtype, suffix, dtype):
+    data, rate = sf.read(INPUT_FILES[0])
+    with tempfile.NamedTemporaryFile(suffix=suffix) as f:
+        sf.write(f.name, data, rate, subtype=subtype)
+        expected, _ = sf.read(f.name, always_2d=True)
+        for kwargs in [{}, {'offset': 5000, 'nframes': 1000}]:
+            mapped, mapped_rate = soxbindings.read(f.name, mmap=True, **kwargs)
+            assert isinstance(mapped, np.memmap)
+            assert mapped_rate == rate
+            assert mapped.dtype.kind == np.dtype(dtype).kind
+            assert mapped.itemsize == np.dtype(dtype).itemsize
+            start = kwargs.get('offset', 0)
+            stop = start + kwargs['nframes'] if kwargs else None
+            if mapped.dtype.kind == 'f':
+                assert np.array_equal(mapped, expected[start:stop])
+            else:
+                decoded, _ = soxbindings.read(f.name, dtype=dtype, **kwargs)
+                assert np.array_equal(mapped, decoded)
+        mapped, _ = soxbindings.read(f.name, mmap=True, dtype=dtype)
+        assert mapped.dtype.newbyteorder('=') == dtype
+        for other in [np.int32, np.float64]:
+            if other != dtype:
+                with pytest.raises(ValueError):
+                    soxbindings.read(f.name, mmap=True, dtype=other)
+        length = expected.shape[0]
+        assert soxbindings.read(f.name, mmap=True, offset=length)[0].size == 0
+        with pytest.raises(RuntimeError):
+            soxbindings.read(f.name, mmap=True, offset=length + 1)
+
+def test_read_mmap_not_pcm():
+    data, rate = sf.read(INPUT_FILES[0])
+    for subtype, suffix in [('PCM_24', '.wav'), ('PCM_16', '.flac')]:
+        with tempfile.NamedTemporaryFile(suffix=suffix) as f:
+            sf.write(f.name, data, rate, subtype=subtype)
+            with pytest.raises(ValueError):
+                soxbindings.read(f.name, mmap=True)
+
+@pytest.mark.skipif(
+    sys.platform == 'darwin', reason="no in-memory audio on macOS")
+@pytest.mark.parametrize("seek_index", ['memory', 'sidecar'])
+def test_read_seek_index(tmp_path, seek_index):
+    audio_path = str(tmp_path / 'mix.mp3')
+    with open('tests/data/mix.mp3', 'rb') as src, open(audio_path, 'wb') as dst:
+        dst.write(src.read())
+    expected, rate = soxbindings.read(audio_path)
+    with open(audio_path, 'rb') as f:
+        decoded, _ = soxbindings.read_bytes(f.read(), file_type='mp3')
+    assert np.array_equal(decoded, expected)
+
+    rng = np.random.default_rng(0)
+    windows = [(0, 0), (0, 100), (expected.shape[0] - 10, 1000)]
+    windows += [
+        (int(rng.integers(expected.shape[0])), int(rng.integers(3 * rate)))
+        for _ in range(20)
+    ]
+    for offset, nframes in windows:
+        data, data_rate = soxbindings.read(
+            audio_path, nframes, offset, seek_index=seek_index)
+        assert data_rate == rate
+        stop = offset + nframes if nframes else None
+        assert np.array_equal(data, expected[offset:stop])
+    assert (tmp_path / 'mix.mp3.seekidx.npz').exists() == (
+        seek_index == 'sidecar')
+
+    index = soxbindings.get_seek_index(audio_path)
+    assert index.length == expected.shape[0]
+    with pytest.raises(RuntimeError):
+        index.read(audio_path, offset=expected.shape[0])
+
+@pytest.mark.skipif(
+    sys.platform == 'darwin', reason="no in-memory audio on macOS")
+@pytest.mark.parametrize("input_file", INPUT_FILES)
+def test_read_bytes(input_file):
+    with open(input_file, 'rb') as f:
+        encoded = f.read()
+    for kwargs in [{}, {'offset': 5000, 'nframes': 1000}]:
+        expected, expected_rate = soxbindings.read(input_file, **kwargs)
+        for buffer in [encoded, memoryview(encoded), bytearray(encoded)]:
+            data, rate = soxbindings.read_bytes(buffer, **kwargs)
+            assert rate == expected_rate
+            assert np.array_equal(data, expected)
+    with pytest.raises(ValueError):
+        soxbindings.read_bytes(memoryview(encoded)[::2])
+
+    signal, encoding = soxbindings.get_info_bytes(encoded)
+    expected_signal, expected_encoding = soxbindings.get_info(input_file)
+    assert signal.rate == expected_signal.rate
+    assert signal.channels == expected_signal.channels
+    assert signal.length == expected_signal.length
+    assert encoding.bits_per_sample == expected_encoding.bits_per_sample
+
+@pytest.mark.skipif(
+    sys.platform == 'darwin', reason="no in-memory audio on macOS")
+@pytest.mark.parametrize("input_file", INPUT_FILES)
+@pytest.mark.parametrize("file_type", ['wav', 'flac', 'au'])
+def test_write_bytes(input_file, file_type):
+    data, rate = soxbindings.read(input_file, dtype=np.float32)
+    encoded = soxbindings.write_bytes(data, rate, file_type)
+    decoded, decoded_rate = soxbindings.read_bytes(
+        encoded, dtype=np.float32, file_type=file_type)
+    assert decoded_rate == rate
+    assert np.array_equal(decoded, data)
+
+    if file_type == 'wav':
+        with tempfile.NamedTemporaryFile(suffix='.wav') as f:
+            soxbindings.write(f.name, data, rate)
+            with open(f.name, 'rb') as written:
+                assert written.read() == encoded
+
+def test_get_info_many(tmp_path):
+    data, rate = soxbindings.read(INPUT_FILES[0])
+    paths = []
+    for i, (channels, sample_rate) in enumerate([(1, 8000), (2, 16000)]):
+        path = str(tmp_path / f'{i}.wav')
+        soxbindings.write(path, np.tile(data[:1000 * (i + 1)], channels), 
+                          sample_rate, precision=16 + 8 * i)
+        paths.append(path)
+    paths.append(str(tmp_path / 'missing.wav'))
+    paths.append(INPUT_FILES[0])
+
+    def check(info):
+        assert info.ok.tolist() == [True, True, False, True]
+        assert info.rate.tolist() == [8000, 16000, 0, rate]
+        assert info.channels.tolist() == [1, 2, 0, data.shape[1]]
+        assert info.length.tolist() == [1000, 4000, 0, data.size]
+        assert info.precision.tolist()[:2] == [16, 24]
+        signal, encoding = soxbindings.get_info(INPUT_FILES[0])
+        assert info.encoding[3] == encoding.encoding
+        assert info.bits_per_sample[3] == encoding.bits_per_sample
+
+    check(soxbindings.get_info_many(paths, workers=2))
+
+    cache_path = str(tmp_path / 'info.sqlite')
+    check(soxbindings.get_info_many(paths, cache=cache_path))
+    keys = [os.path.abspath(path) for path in paths]
+    with soxbindings.InfoCache(cache_path) as cache:
+        assert sorted(cache._get(keys)) == sorted(
+            [keys[0], keys[1], keys[3]])
+        check(soxbindings.get_info_many(paths, cache=cache))
+        # the absolute path finds the entry made for the relative one
+        check(soxbindings.get_info_many(
+            paths[:3] + [os.path.abspath(paths[3])], cache=cache))
+        assert len(cache._get(keys)) == 3
+
+        # a changed file is read again
+        soxbindings.write(paths[0], data[:500], 8000)
+        info = soxbindings.get_info_many(paths, cache=cache)
+        assert info.length[0] == 500
+        assert cache._get(keys[:1])[keys[0]][5] == 500
+
+@pytest.mark.skipif(
+    sys.version_info < (3, 7), reason="imports eagerly before Python 3.7")
+def test_lazy_import():
+    code = (
+        "import sys, soxbindings\n"
+        "assert 'sox' not in sys.modules\n"
+        "assert 'soxbindings._soxbindings' not in sys.modules\n"
+        "soxbindings.read('tests/data/input.wav')\n"
+        "soxbindings.EffectsChain.compile('- - vol 0.5')\n"
+        "assert 'sox' not in sys.modules\n"
+        "assert 'Transformer' in dir(soxbindings)\n"
+        "soxbindings.Transformer()\n"
+        "assert 'sox' in sys.modules\n"
+    )
+    subprocess.run([sys.executable, '-c', code], check=True)
+    with pytest.raises(AttributeError):
+        soxbindings.not_a_function
+
+def test_transform_cache(tmp_path):
+    input_file = str(tmp_path / 'input.wav')
+    data, rate = soxbindings.read('tests/data/input.wav')
+    soxbindings.write(input_file, data, rate)
+    tfm = soxbindings.Transformer()
+    tfm.rate(16000)
+    tfm.channels(1)
+    expected = tfm.build_array(input_file)
+
+    cache = soxbindings.TransformCache(str(tmp_path / 'cache'))
+    output = tfm.build_array(input_file, cache=cache)
+    assert np.array_equal(output, expected)
+    assert not output.flags.writeable
+    assert tfm.build_array(input_file, cache=cache) is output
+    assert (cache.hits, cache.misses) == (1, 1)
+
+    # another process (or a later run) finds it on disk
+    other = soxbindings.TransformCache(str(tmp_path / 'cache'))
+    assert isinstance(other.build_array(tfm, input_file), np.memmap)
+    assert (other.hits, other.misses) == (1, 0)
+
+    output = tfm.build_array(
+        input_array=data, sample_rate_in=rate, cache=cache)
+    assert np.array_equal(output, expected)
+    assert cache.misses == 2
+    tfm.build_array(input_array=data[:-1], sample_rate_in=rate, cache=cache)
+    tfm.vol(0.5)
+    tfm.build_array(input_file, cache=cache)
+    soxbindings.write(input_file, data[:-1], rate)
+    tfm.build_array(input_file, cache=cache)
+    assert (cache.hits, cache.misses) == (1, 5)
+
+    small = soxbindings.TransformCache(
+        max_memory_bytes=int(1.5 * expected.nbytes))
+    for volume in [0.5, 0.25]:
+        tfm.vol(volume)
+        small.build_array(tfm, input_file)
+    assert small.memory_bytes <= 1.5 * expected.nbytes
+    assert len(small._memory) == 1
+    small.build_array(tfm, input_file)
+    assert small.hits == 1
+
+
+def _rate_effect(rate):
+    effect = soxbindings.SoxEffect()
+    effect.effect_name = 'rate'
+    effect.effect_args = [str(rate)]
+    return effect
+
+@pytest.mark.parametrize("method", soxbindings.effects.COMBINE_METHODS)
+def test_combine(method):
+    rng = np.random.RandomState(0)
+    a = rng.uniform(-0.5, 0.5, (8000, 2)).astype(np.float32)
+    b = rng.uniform(-0.5, 0.5, (6000, 2)).astype(np.float32)
+    output, rate = soxbindings.combine(
+        [a, b], 8000, method=method, volumes=[1.0, 0.5], in_precision=32)
+    assert rate == 8000
+
+    padded = np.zeros_like(a)
+    padded[:len(b)] = b
+    expected = {
+        'concatenate': np.concatenate([a, 0.5 * b]),
+        'merge': np.concatenate([a, 0.5 * padded], axis=1),
+        'mix': a + 0.5 * padded,
+        'mix-power': a + 0.5 * padded,
+        'multiply': a * 0.5 * padded,
+    }[method]
+    assert output.shape == expected.shape
+    assert np.allclose(output, expected, atol=1e-6)
+
+def test_combine_files(tmp_path):
+    rng = np.random.RandomState(0)
+    data, rate = soxbindings.read('tests/data/input.wav')
+    noise = 0.05 * rng.randn(rate, 1)
+    noise_file = str(tmp_path / 'noise.wav')
+    soxbindings.write(noise_file, noise, rate, 32)
+
+    inputs = ['tests/data/input.wav', noise_file]
+    output, _ = soxbindings.combine(inputs)
+    mixed = data.copy()
+    mixed[:rate] += sf.read(noise_file, always_2d=True)[0]
+    assert np.allclose(output, mixed / 2, atol=1e-4)
+
+    # files that are already open are read from and left open
+    from soxbindings import _soxbindings
+    readers = [_soxbindings.SoxReader(f, None, None, None) for f in inputs]
+    try:
+        output, _ = soxbindings.combine(readers)
+        assert np.allclose(output, mixed / 2, atol=1e-4)
+        assert readers[0].channels == data.shape[1]
+    finally:
+        for reader in readers:
+            reader.close()
+
+    # an array, a file, an effects chain and the output written to a file
+    output_file = str(tmp_path / 'output.wav')
+    chain = [_rate_effect(16000)]
+    frames, out_rate = soxbindings.combine(
+        [data, noise_file], rate, method='merge', sox_effects_chain=chain,
+        output_file=output_file)
+    expected, _ = soxbindings.combine(
+        [data, noise_file], rate, method='merge', sox_effects_chain=chain,
+        out_precision=16)
+    written, written_rate = soxbindings.read(output_file)
+    assert (out_rate, written_rate) == (16000, 16000)
+    assert frames == len(written) == len(expected)
+    assert np.allclose(written, expected, atol=1e-4)
+
+    with pytest.raises(ValueError):
+        soxbindings.combine([data, noise_file], rate // 2)
+
+def test_sox_combine(tmp_path):
+    rng = np.random.RandomState(0)
+    data, rate = soxbindings.read('tests/data/input.wav')
+    noise_file = str(tmp_path / 'noise.wav')
+    soxbindings.write(noise_file, 0.05 * rng.randn(rate, 1), rate, 32)
+
+    output, _ = soxbindings.sox(f'-m tests/data/input.wav {noise_file} -')
+    expected, _ = soxbindings.combine(['tests/data/input.wav', noise_file])
+    assert np.array_equal(output, expected)
+
+    output, out_rate = soxbindings.sox(
+        f'--combine merge - -v 0.5 {noise_file} - rate 16000', data, rate)
+    expected, _ = soxbindings.combine(
+        [data, noise_file], rate, method='merge', volumes=[1.0, 0.5],
+        in_precision=16,
+        sox_effects_chain=[_rate_effect(16000)])
+    assert out_rate == 16000
+    assert np.array_equal(output, expected)
+
+    # the rate of array inputs comes from their -r flags
+    output, out_rate = soxbindings.sox('-m -r 8000 - -r 8000 - -', data)
+    expected, _ = soxbindings.combine([data, data], 8000, in_precision=32)
+    assert out_rate == 8000
+    assert np.array_equal(output, expected)
+    with pytest.raises(ValueError):
+        soxbindings.sox('-m -r 8000 - -r 16000 - -', data)
+
+    # no method given: concatenate, like sox
+    output, _ = soxbindings.sox(f'tests/data/input.wav {noise_file} -')
+    assert len(output) == len(data) + rate
+
+    output_file = str(tmp_path / 'output.wav')
+    soxbindings.sox(f'-T tests/data/input.wav {noise_file} {output_file}')
+    assert len(soxbindings.read(output_file)[0]) == len(data)
+
+    with pytest.raises(NotImplementedError):
+        soxbindings.sox(f'--combine sequence tests/data/input.wav - -', data, rate)
+    with pytest.raises(NotImplementedError):
+        soxbindings.EffectsChain.compile('-m - - - vol 0.5')
+
+def test_layouts():
+    rng = np.random.RandomState(0)
+    planar = rng.uniform(-0.5, 0.5, (3, 20000)).astype(np.float32)
+    frames = np.ascontiguousarray(planar.T)
+    chain = [_rate_effect(16000)] + _vol_chain(0.5)
+    expected, _ = soxbindings.build_flow_effects(
+        frames, 44100, chain, in_precision=32)
+
+    output, _ = soxbindings.build_flow_effects(
+        planar, 44100, chain, in_precision=32, layout='channels_first')
+    assert output.shape == expected.T.shape
+    assert np.array_equal(output.T, expected)
+
+    # strided views are read in place
+    wide = np.zeros((20000, 7), dtype=np.float32)
+    wide[:, 1:7:2] = frames
+    for view in [wide[:, 1:7:2], planar.T]:
+        output, _ = soxbindings.build_flow_effects(
+            view, 44100, chain, in_precision=32)
+        assert np.array_equal(output, expected)
+    output, _ = soxbindings.build_flow_effects(
+        frames[::-1], 44100, chain, in_precision=32)
+    reversed_expected, _ = soxbindings.build_flow_effects(
+        np.ascontiguousarray(frames[::-1]), 44100, chain, in_precision=32)
+    assert np.array_equal(output, reversed_expected)
+
+    batch = np.stack([planar, planar[::-1]])
+    outputs, _ = soxbindings.build_flow_effects_batch(
+        batch, 44100, chain, in_precision=32, layout='channels_first')
+    assert np.array_equal(outputs[0], expected.T)
+    assert np.array_equal(outputs[1], expected.T[::-1])
+
+    with soxbindings.StreamingEffects(
+            44100, chain, in_channels=3, in_precision=32,
+            layout='channels_first') as streamer:
+        chunks = [streamer.push(planar[:, i:i + 4096])
+                  for i in range(0, planar.shape[1], 4096)]
+        chunks.append(streamer.flush())
+    assert np.array_equal(np.concatenate(chunks, axis=1), expected.T)
+
+    with pytest.raises(ValueError):
+        soxbindings.build_flow_effects(
+            planar, 44100, chain, layout='channels_middle')
+    with pytest.raises(ValueError):
+        soxbindings.build_flow_effects(batch, 44100, chain, in_precision=32)
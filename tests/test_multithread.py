@@ -1,5 +1,8 @@
 from multiprocessing.dummy import Pool as ThreadPool
+import asyncio
+import os
 import numpy as np
+import pytest
 import soxbindings as sox
 from soxbindings import sox_context
 
@@ -50,6 +53,246 @@ def test_multithreading_with_context_block():
         for a1, a2 in zip(single_thread, multi_thread):
             assert np.allclose(a1, a2)
 
+@sox_context()
+def test_multithreading_long_inputs():
+    num_workers = 4
+    ys = [
+        np.random.randn(44100 * 10, 1) * 0.1
+        for _ in range(num_workers)
+    ]
+
+    def do_transform(y):
+        tfm = sox.Transformer()
+        tfm.reverb()
+        tfm.rate(16000)
+        y_out = tfm.build_array(input_array=y, sample_rate_in=44100)
+        return y_out
+
+    single_thread = [do_transform(y) for y in ys]
+    with ThreadPool(num_workers) as pool:
+        multi_thread = pool.map(do_transform, ys)
+
+    # how well the threads scale is measured by the threads group of
+    # benchmarks/bench.py
+    for a1, a2 in zip(single_thread, multi_thread):
+        assert np.array_equal(a1, a2)
+
+def test_sox_lifecycle():
+    from soxbindings import effects
+    y = np.random.RandomState(0).randn(4000, 1) * 0.1
+    tfm = sox.Transformer()
+    tfm.reverb()
+    expected = tfm.build_array(input_array=y, sample_rate_in=8000)
+
+    sox.close_session()
+    assert not effects.SOX_INITIALIZED
+    with sox_context():
+        with sox_context():
+            assert effects.SOX_INITIALIZED
+        assert effects.SOX_INITIALIZED
+    assert not effects.SOX_INITIALIZED
+
+    # blocks ending on some threads don't shut libsox down while others
+    # are still running chains
+    def run(i):
+        with sox_context():
+            return tfm.build_array(input_array=y, sample_rate_in=8000)
+
+    with ThreadPool(8) as pool:
+        outputs = pool.map(run, range(32))
+    for output in outputs:
+        assert np.array_equal(output, expected)
+
+    # the first call opened the global session, which keeps libsox loaded
+    assert effects.SOX_INITIALIZED
+    with sox_context():
+        pass
+    assert effects.SOX_INITIALIZED
+
+def test_open_readers_and_writers_keep_sox(tmp_path):
+    from soxbindings import effects
+    expected, rate = sox.read('tests/data/input.wav')
+
+    # a stream or writer that is still open keeps libsox initialized when
+    # the session is closed underneath it
+    blocks = sox.stream('tests/data/input.wav', 1024)
+    first = next(blocks)
+    writer = sox.SoxWriter(str(tmp_path / 'out.wav'), rate,
+                           expected.shape[1], precision=32)
+    sox.close_session()
+    assert effects.SOX_INITIALIZED
+    output = np.concatenate([first] + list(blocks))
+    writer.write(output)
+    assert effects.SOX_INITIALIZED
+    writer.close()
+    assert not effects.SOX_INITIALIZED
+
+    assert np.array_equal(output, expected)
+    written, _ = sox.read(str(tmp_path / 'out.wav'))
+    assert np.allclose(written, expected, atol=1e-6)
+
+@pytest.mark.parametrize("num_threads", [1, 3, None])
+def test_build_flow_effects_batch(num_threads):
+    rng = np.random.RandomState(0)
+    arrays = [rng.randn(n, 2) * 0.1 for n in [4000, 3000, 1, 8000, 5000]]
+    effects = []
+    for name, args in [('rate', ['-h', '8000']), ('reverb', ['50'])]:
+        effect = sox.SoxEffect()
+        effect.effect_name = name
+        effect.effect_args = args
+        effects.append(effect)
+
+    outputs, rate = sox.build_flow_effects_batch(
+        arrays, 16000, effects, in_precision=32, num_threads=num_threads)
+
+    assert rate == 8000
+    assert len(outputs) == len(arrays)
+    for y, output in zip(arrays, outputs):
+        expected, _ = sox.build_flow_effects(
+            y, 16000, effects, in_precision=32)
+        assert np.array_equal(output, expected)
+
+@pytest.mark.parametrize("workers", [1, 3])
+def test_sweep(workers):
+    y, rate = sox.read('tests/data/input.wav')
+    y = y[:rate]
+    grid = {'room': [10, 90], 'gain': [-6, 0, 3]}
+    outputs, lengths, out_rate = sox.sweep(
+        y, rate, "- - reverb {room} gain {gain}", grid, workers=workers)
+
+    assert out_rate == rate
+    assert outputs.shape[0] == 6
+    i = 0
+    for room in grid['room']:
+        for gain in grid['gain']:
+            expected, _ = sox.sox(f"- - reverb {room} gain {gain}", y, rate)
+            assert lengths[i] == expected.shape[0]
+            assert np.array_equal(outputs[i, :lengths[i]], expected)
+            i += 1
+
+    def template(shift):
+        tfm = sox.Transformer()
+        tfm.pitch(shift)
+        return tfm
+    outputs, lengths, _ = sox.sweep(
+        y, rate, template, [{'shift': 1}, {'shift': -2}], workers=workers,
+        pad=False, dtype=np.float32)
+    for output, length, shift in zip(outputs, lengths, [1, -2]):
+        tfm = template(shift)
+        expected = tfm.build_array(
+            input_array=y, sample_rate_in=rate, dtype=np.float32)
+        assert output.shape[0] == length
+        assert np.array_equal(output, expected)
+
+    with pytest.raises(ValueError):
+        sox.sweep(y, rate, "- - rate {rate}", {'rate': [8000, 16000]})
+
+def test_process_files(tmp_path):
+    input_file = 'tests/data/input.wav'
+    tfm = sox.Transformer()
+    tfm.vol(0.5)
+    tfm.set_output_format(rate=8000)
+    expected = tfm.build_array(input_filepath=input_file)
+
+    output_file = str(tmp_path / 'output.wav')
+    pairs = [
+        (input_file, None),
+        (str(tmp_path / 'missing.wav'), None),
+        (input_file, output_file),
+        (input_file, None),
+    ]
+    progress = []
+    result = sox.process_files(
+        pairs, tfm, workers=2, callback=lambda c: progress.append(c.done))
+
+    assert list(result.errors) == [1]
+    assert np.array_equal(result.outputs[0], expected)
+    assert np.array_equal(result.outputs[3], expected)
+    assert result.outputs[2] is None
+    assert result.sample_rates[2] == 8000
+    written, rate = sox.read(output_file)
+    assert rate == 8000
+    assert written.shape == expected.shape
+    assert progress == [1, 2, 3, 4]
+    assert result.counters.failed == 1
+    assert result.counters.frames == 3 * expected.shape[0]
+
+    pickled = sox.process_files(
+        pairs[:1], 'vol 0.5 rate 8000', workers=1, use_shared_memory=False)
+    assert np.array_equal(pickled.outputs[0], expected)
+
+    # a callback that raises doesn't leave the workers' segments behind
+    def stop(counters):
+        raise KeyboardInterrupt
+    has_shm = os.path.isdir('/dev/shm')
+    segments = set(os.listdir('/dev/shm')) if has_shm else None
+    with pytest.raises(KeyboardInterrupt):
+        sox.process_files([(input_file, None)] * 6, tfm, workers=2,
+                          callback=stop)
+    if segments is not None:
+        assert set(os.listdir('/dev/shm')) <= segments
+
+def test_aio(tmp_path):
+    from soxbindings import aio
+    input_file = 'tests/data/input.wav'
+    expected, rate = sox.read(input_file)
+    effect = sox.SoxEffect()
+    effect.effect_name = 'vol'
+    effect.effect_args = ['0.5']
+    expected_vol, _ = sox.build_flow_effects(expected, rate, [effect])
+
+    async def run(executor):
+        reads = [
+            executor.read(input_file, nframes=1000 * (i + 1), offset=i)
+            for i in range(8)
+        ]
+        outputs = await asyncio.gather(*reads)
+        for i, (data, data_rate) in enumerate(outputs):
+            assert data_rate == rate
+            assert np.array_equal(data, expected[i:i + 1000 * (i + 1)])
+
+        output_file = str(tmp_path / 'output.wav')
+        await executor.write(output_file, expected, rate)
+        signal, _ = await executor.get_info(output_file)
+        assert signal.length == expected.size
+        vol, _ = await executor.build_flow_effects(expected, rate, [effect])
+        assert np.array_equal(vol, expected_vol)
+
+    async def run_limited():
+        # each read holds 8000 bytes, at most two fit
+        async with aio.SoxExecutor(4, max_inflight_bytes=16000) as executor:
+            peak = []
+            async def read(i):
+                data, _ = await executor.read(input_file, nframes=1000)
+                peak.append(executor.inflight_bytes)
+                return data
+            tasks = [asyncio.ensure_future(read(i)) for i in range(20)]
+            await asyncio.sleep(0)
+            tasks[-1].cancel()
+            results = await asyncio.gather(*tasks, return_exceptions=True)
+            assert isinstance(results[-1], asyncio.CancelledError)
+            for data in results[:-1]:
+                assert np.array_equal(data, expected[:1000])
+            assert max(peak) <= 16000
+            await asyncio.sleep(0.1)
+            assert executor.inflight_bytes == 0
+
+    async def run_default():
+        data, _ = await aio.read(input_file, nframes=10)
+        assert np.array_equal(data, expected[:10])
+
+    async def run_all():
+        async with aio.SoxExecutor(3) as executor:
+            await run(executor)
+        await run_limited()
+        await run_default()
+
+    # asyncio.run needs Python 3.7
+    loop = asyncio.new_event_loop()
+    try:
+        loop.run_until_complete(run_all())
+    finally:
+        loop.close()
+
 if __name__ == "__main__":
     test_multithreading()
-    
\ No newline at end of file